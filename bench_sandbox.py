@@ -0,0 +1,212 @@
+"""
+샌드박스 성능 벤치마크 / 스트레스 테스트.
+
+- tester (기본): tool_tester_node와 같은 패턴(정의 확인 → 유닛 테스트, 매번 cleanup_test_kernel)으로
+  Tester 커널 루프의 wall time을 격리 방식별로 비교한다.
+  reset 방식에서 초기화가 실패해 restart로 fallback하면 측정이 무의미하므로 실패로 보고한다.
+- stress: 여러 샌드박스를 동시에 띄워(스레드 + 프로세스) 작업 폴더/Tester 폴더/커널 상태가
+  서로 섞이지 않는지 검사한다.
+
+    python bench_sandbox.py
+    python bench_sandbox.py stress --sandboxes 16 --procs 2
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from src.config import TEST_DIR
+from src.logger import get_logger
+from src.utils.jupyter_sandbox import AgentSandbox
+from src.utils.kernel_pool import KernelPool
+
+logger = get_logger("SandboxBench")
+
+N_TOOLS = 5  # 한 번의 tester 루프에서 검사할 도구 수
+
+TOOL_CODE = """
+def calculate_mean(numbers):
+    if not numbers:
+        return 0
+    return sum(numbers) / len(numbers)
+"""
+
+TEST_CODE = TOOL_CODE + """
+import unittest
+
+class TestMean(unittest.TestCase):
+    def test_mean(self):
+        self.assertEqual(calculate_mean([1, 2, 3]), 2)
+
+unittest.main(argv=[''], exit=False)
+"""
+
+
+def run_tester_loop(sandbox):
+    """tool_tester_node의 실행 패턴을 그대로 재현 (LLM 호출 제외)."""
+    sandbox.run_code(TOOL_CODE, mode="temporary")
+    sandbox.cleanup_test_kernel()
+    for _ in range(N_TOOLS):
+        result = sandbox.run_code(TEST_CODE, mode="temporary")
+        sandbox.cleanup_test_kernel()
+        assert "OK" in result["stderr"], result
+
+
+def bench_tester_loop():
+    configs = [
+        ("restart (baseline)", dict(test_isolation="restart"), False),
+        ("restart + pool", dict(test_isolation="restart"), True),
+        ("reset", dict(test_isolation="reset"), False),
+        ("forkserver", dict(test_backend="forkserver"), False),
+    ]
+
+    rows = []
+    ok = True
+    for label, kwargs, use_pool in configs:
+        pool = KernelPool(size=2) if use_pool else None
+        if pool:
+            # 풀이 다 찰 때까지 대기 (cold start는 측정에서 제외)
+            while pool.report()["ready"] < pool.size:
+                time.sleep(0.5)
+
+        with AgentSandbox(work_dir="./", pool=pool, **kwargs) as sandbox:
+            start = time.time()
+            run_tester_loop(sandbox)
+            elapsed = time.time() - start
+            fallbacks = sandbox.reset_fallbacks
+
+        rows.append((label, elapsed, fallbacks))
+        logger.info(f"  {label}: {elapsed:.2f}s")
+        if fallbacks:
+            logger.error(f"  ❌ {label}: reset failed {fallbacks} time(s) and fell back to restart")
+            ok = False
+        if pool:
+            pool.shutdown()
+
+    base = rows[0][1]
+    logger.info(f"\n{'='*60}")
+    logger.info(f"📊 Tester loop ({N_TOOLS} tools + definition check)")
+    logger.info(f"{'='*60}")
+    for label, elapsed, fallbacks in rows:
+        note = f"  ⚠️ {fallbacks} reset fallback(s)" if fallbacks else ""
+        logger.info(f"  {label:<22} {elapsed:7.2f}s  (x{base / elapsed:.1f}){note}")
+    return ok
+
+
+# ----------------------------------------------------------------------
+# 동시 샌드박스 스트레스 테스트
+# ----------------------------------------------------------------------
+STRESS_ROUNDS = 3  # 샌드박스마다 temporary 실행 / cleanup_test_kernel 반복 횟수
+
+
+def run_isolated_sandbox(tag):
+    """
+    샌드박스 하나를 띄워 다른 샌드박스와 섞일 수 있는 모든 경로를 점검.
+    실패 항목 목록을 반환 (비어 있으면 통과).
+    """
+    errors = []
+    work_dir = tempfile.mkdtemp(prefix=f"stress_{tag}_")
+    with open(os.path.join(work_dir, "owner.txt"), "w") as f:
+        f.write(tag)
+
+    try:
+        with AgentSandbox(work_dir=work_dir) as sandbox:
+            # Main 커널: 자기 작업 폴더의 파일을 읽고 상태를 유지해야 함
+            sandbox.run_code(f"owner = open('owner.txt').read()\ntoken = {tag!r}", mode="permanent")
+
+            for i in range(STRESS_ROUNDS):
+                # Tester 커널: 비어 있는 전용 폴더에서 시작하고 Main 상태가 보이면 안 됨
+                result = sandbox.run_code(
+                    "import os\n"
+                    "print(sorted(os.listdir('.')))\n"
+                    "print('token' in globals())\n"
+                    f"open('scratch_{tag}.txt', 'w').write('x')",
+                    mode="temporary",
+                )
+                lines = result["stdout"].strip().splitlines()
+                if result["stderr"] or lines[:2] != ["[]", "False"]:
+                    errors.append(f"round {i}: tester not isolated: {result}")
+                if not os.path.exists(os.path.join(sandbox.test_dir, f"scratch_{tag}.txt")):
+                    errors.append(f"round {i}: scratch file not in own test_dir")
+                sandbox.cleanup_test_kernel()
+
+            # cleanup_test_kernel 뒤에도 reset 모드의 Tester 커널은 재시작 없이 초기화되어야 함
+            if sandbox.test_isolation == "reset" and not sandbox.test_kernel.reset():
+                errors.append("tester reset failed after cleanup_test_kernel")
+            if sandbox.reset_fallbacks:
+                errors.append(f"tester reset fell back to restart {sandbox.reset_fallbacks} time(s)")
+
+            result = sandbox.run_code("print(owner, token)", mode="permanent")
+            if result["stdout"].split() != [tag, tag]:
+                errors.append(f"main state clobbered: {result}")
+            test_dir = sandbox.test_dir
+
+        if os.path.exists(test_dir):
+            errors.append(f"test_dir not removed: {test_dir}")
+    except Exception as e:
+        errors.append(f"{type(e).__name__}: {e}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return errors
+
+
+def run_sandbox_batch(tags):
+    """한 프로세스 안에서 샌드박스 여러 개를 스레드로 동시에 실행"""
+    with ThreadPoolExecutor(max_workers=len(tags)) as executor:
+        return dict(zip(tags, executor.map(run_isolated_sandbox, tags)))
+
+
+def stress_concurrent_sandboxes(n_sandboxes=16, n_procs=2):
+    env_before = os.environ.get("JUPYTER_RUNTIME_DIR")
+    leftovers_before = set(os.listdir(TEST_DIR)) if os.path.isdir(TEST_DIR) else set()
+
+    tags = [f"sb{i:02d}" for i in range(n_sandboxes)]
+    batches = [tags[i::n_procs] for i in range(n_procs)]
+
+    start = time.time()
+    results = {}
+    if n_procs > 1:
+        # 여러 러너 프로세스가 한 호스트에서 동시에 도는 상황 재현
+        with ProcessPoolExecutor(max_workers=n_procs) as executor:
+            for batch_result in executor.map(run_sandbox_batch, batches):
+                results.update(batch_result)
+    else:
+        results = run_sandbox_batch(tags)
+    elapsed = time.time() - start
+
+    failed = {tag: errs for tag, errs in results.items() if errs}
+    leftovers = (set(os.listdir(TEST_DIR)) if os.path.isdir(TEST_DIR) else set()) - leftovers_before
+    if os.environ.get("JUPYTER_RUNTIME_DIR") != env_before:
+        failed["<process>"] = ["JUPYTER_RUNTIME_DIR was modified"]
+    if leftovers:
+        failed["<test_dir>"] = [f"leftover scratch dirs: {sorted(leftovers)}"]
+
+    logger.info(f"\n{'='*60}")
+    logger.info(f"🧨 Stress: {n_sandboxes} sandboxes x {STRESS_ROUNDS} rounds across {n_procs} process(es) in {elapsed:.1f}s")
+    logger.info(f"{'='*60}")
+    for tag, errs in failed.items():
+        for err in errs:
+            logger.error(f"  ❌ {tag}: {err}")
+    if failed:
+        logger.error(f"  {len(failed)} failure(s)")
+        return False
+    logger.info("  ✅ All sandboxes isolated")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sandbox benchmark / stress test")
+    parser.add_argument("mode", nargs="?", default="tester", choices=["tester", "stress"])
+    parser.add_argument("--sandboxes", type=int, default=16, help="stress: 동시에 띄울 샌드박스 수")
+    parser.add_argument("--procs", type=int, default=2, help="stress: 샌드박스를 나눠 실행할 프로세스 수")
+    args = parser.parse_args()
+
+    if args.mode == "stress":
+        sys.exit(0 if stress_concurrent_sandboxes(args.sandboxes, args.procs) else 1)
+    sys.exit(0 if bench_tester_loop() else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,11 @@ import langchain
 from dotenv import load_dotenv
 from langfuse.langchain import CallbackHandler
 from src.agent.graph import build_graph
+from src.utils.graph_runtime import sandbox_config
 from src.logger import get_logger
 from src.utils.jupyter_sandbox import AgentSandbox
-from src.config import RESULT_DIR
+from src.utils.kernel_pool import KernelPool
+from src.config import RESULT_DIR, KERNEL_POOL_SIZE
 
 # Load environment variables
 load_dotenv()
@@ -39,6 +41,10 @@ def main():
         logger.error(f"Failed to load dataset: {e}")
         return
 
+    pool = KernelPool(size=KERNEL_POOL_SIZE)
+    # 그래프는 한 번만 compile (샌드박스는 invoke config로 전달)
+    app = build_graph()
+
     for i in FAILURE_INDICES:
         try:
             if i >= len(dataset):
@@ -58,8 +64,7 @@ def main():
 
             # Initialize Sandbox and build graph
             # Math tasks don't have a specific work_dir, so we use current dir or a temp dir
-            with AgentSandbox(work_dir="./") as sandbox:
-                app = build_graph(sandbox)
+            with AgentSandbox(work_dir="./", pool=pool) as sandbox:
 
                 # inputs
                 inputs = {
@@ -77,7 +82,7 @@ def main():
                 }
 
                 # Run graph
-                result = app.invoke(inputs, config={"recursion_limit": 100, "callbacks": [langfuse_handler]})
+                result = app.invoke(inputs, config=sandbox_config(sandbox, recursion_limit=100, callbacks=[langfuse_handler]))
                 
                 final_answer = result.get("final_answer")
                 if final_answer:
@@ -92,5 +97,7 @@ def main():
             import traceback
             traceback.print_exc()
 
+    pool.shutdown()
+
 if __name__ == "__main__":
     main()
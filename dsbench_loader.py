@@ -1,6 +1,7 @@
 import json
 import os
 import glob
+import functools
 import pandas as pd
 
 
@@ -18,6 +19,11 @@ def find_excel_files(directory):
     return excel_files if excel_files else None
 
 def read_excel(file_path):
+    # 같은 폴더의 질문들이 같은 엑셀을 반복해서 파싱하지 않도록 (경로, 수정 시각) 기준으로 캐시
+    return _read_excel_cached(os.path.abspath(file_path), os.stat(file_path).st_mtime_ns)
+
+@functools.lru_cache(maxsize=16)
+def _read_excel_cached(file_path, mtime_ns):
     xls = pd.ExcelFile(file_path)
     sheets = {}
     for sheet_name in xls.sheet_names:
@@ -117,6 +123,21 @@ class DSBenchLoader:
         else:
             return self._parse_modeling_problem(item)
 
+    def get_task_key(self, index):
+        """파일을 읽지 않고 (id, question_id, target_dir)만 계산 (스케줄링/resume 확인용)"""
+        entry = self.dataset[index]
+        item = entry["task_item"]
+        if self.mode == "analysis":
+            p_id = item.get('id', '')
+            try:
+                folder_name = f"{int(p_id):08d}"
+            except:
+                folder_name = str(p_id)
+            target_dir = os.path.join(self.data_source_dir, folder_name)
+            return f"{p_id}_{entry['question_id']}", entry["question_id"], os.path.abspath(target_dir)
+        task_name = item.get('name')
+        return task_name, None, os.path.abspath(os.path.join(self.data_resplit_dir, task_name))
+
     def _read_file_content(self, filepath):
         if os.path.exists(filepath):
             with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
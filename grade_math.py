@@ -2,19 +2,41 @@ import os
 import sys
 import re
 import json
-import openai
+import time
+import argparse
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from sympy import parse_expr
-from sympy.parsing.latex import parse_latex
 from tenacity import retry, stop_after_attempt, wait_fixed
+from src.utils.math_equivalence import is_equivalent
+from src.utils.math_parse_cache import get_parse_cache
+from src.utils.llm_gateway import get_chat_model, usage_report
 
 # It seems RESULT_DIR is not defined in this script. 
 # I will assume it's in the current directory for now.
 # If src.config exists, this should work, otherwise, it needs to be created.
 try:
-    from src.config import RESULT_DIR
+    from src.config import RESULT_DIR, GRADER_CONCURRENCY
 except ImportError:
     RESULT_DIR = "."
+    GRADER_CONCURRENCY = 16
+
+load_dotenv()
+
+JUDGE_MODEL = "openai/gpt-4o"
+# 채점 규칙(math_equivalence) / judge 프롬프트 / 모델을 바꾸면 올릴 것. 다른 버전으로 채점된 결과는 다시 채점함
+GRADER_VERSION = 2
+
+
+def is_current_grade(record):
+    """저장된 채점 결과가 현재 GRADER_VERSION으로 채점된 것인지"""
+    return record is not None and record.get("grader_version") == GRADER_VERSION
+
+
+@lru_cache(maxsize=None)
+def get_judge_llm():
+    """LLM judge용 ChatOpenAI (공유 LLM 게이트웨이: 커넥션 풀 / 429 대기 / 응답 캐시 / 호출 장부 공유)"""
+    return get_chat_model("grade_math.judge", lane="high", model=JUDGE_MODEL, temperature=0)
 
 
 def extract_answer(text: str) -> str:
@@ -55,47 +77,17 @@ def extract_answer(text: str) -> str:
 def approx_equal(a, b, tol=1e-3):
     return abs(a - b) <= tol
 
-def math_grading_function(ground_truth: str, answer: str):
-    load_dotenv()
-
-    # Initialize OpenRouter client
-    client = openai.OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=os.getenv("OPENROUTER_API_KEY"),
-    )
 
-    ground_truth_converted = None
-    answer_converted = None
+def rule_based_grade(ground_truth: str, answer: str):
+    """규칙 기반 판정 (math_equivalence). True, 양쪽이 평범한 숫자이고 값이 다르면 False, 그 외에는 None (LLM judge)"""
     try:
-        try:
-            answer_converted = int(answer)
-        except (ValueError, TypeError):
-            try:
-                answer_converted = float(answer)
-            except (ValueError, TypeError):
-                try:
-                    answer_converted = parse_latex(answer).evalf()
-                except Exception:
-                    raise Exception('Rule-based evluation failed: model answer')
-
-        try:
-            ground_truth_converted = int(ground_truth)
-        except (ValueError, TypeError):
-            try:
-                ground_truth_converted = float(ground_truth)
-            except (ValueError, TypeError):
-                try:
-                    ground_truth_converted = parse_latex(ground_truth).evalf()
-                except Exception:
-                    raise Exception('Rule-based evluation failed: ground truth')
-        
-        if ground_truth_converted is not None and answer_converted is not None:
-            if approx_equal(ground_truth_converted, answer_converted):
-                return True, answer_converted
+        return is_equivalent(ground_truth, answer)
     except Exception as e:
         print(f"Rule-based evaluation failed: {e}")
+        return None
+
 
-    llm_as_a_judge_prompt = """You are a grading assistant evaluating whether a LLM-generated answer is equivalent to a reference answer.
+LLM_AS_A_JUDGE_PROMPT = """You are a grading assistant evaluating whether a LLM-generated answer is equivalent to a reference answer.
 You are provided with:
 - A reference answer (ground truth)
 - A generated answer from a model
@@ -125,19 +117,16 @@ Your goal is to judge whether the generated answer is **acceptable and correct**
 ```
 Only output valid JSON. Do not include any other text."""
 
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(1), reraise=True)
-    def get_llm_judge():
-        response = client.chat.completions.create(
-            model="openai/gpt-4o",
-            messages=[
-                {"role": "user", "content": llm_as_a_judge_prompt.format(REFERENCE_ANSWER=ground_truth, GENERATED_ANSWER=answer)}
-            ],
-            temperature=0,
-        )
-        return response.choices[0].message.content
 
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(1), reraise=True)
+def _call_llm_judge(ground_truth: str, answer: str):
+    prompt = LLM_AS_A_JUDGE_PROMPT.format(REFERENCE_ANSWER=ground_truth, GENERATED_ANSWER=answer)
+    return get_judge_llm().invoke(prompt).content
+
+
+def llm_judge_grade(ground_truth: str, answer: str):
     try:
-        response_text = get_llm_judge()
+        response_text = _call_llm_judge(ground_truth, answer)
         # Extract JSON from the response
         json_match = re.search(r"```json\n(.*?)\n```", response_text, re.DOTALL)
         if json_match:
@@ -151,7 +140,54 @@ Only output valid JSON. Do not include any other text."""
         return False, answer
 
 
+def math_grading_function(ground_truth: str, answer: str):
+    """답 하나 채점: 규칙으로 판정되면 LLM을 호출하지 않음. (is_correct, answer) 반환"""
+    verdict = rule_based_grade(ground_truth, answer)
+    if verdict is not None:
+        return verdict, answer
+    return llm_judge_grade(ground_truth, answer)
+
+
+def grade_batch(items, on_graded, max_workers=GRADER_CONCURRENCY):
+    """
+    여러 답을 한 번에 채점.
+    items: [(key, ground_truth, answer)]
+    on_graded(key, is_correct, justification, method): 채점이 끝나는 대로 호출 (호출한 스레드에서만 호출됨)
+    1) 모든 답을 규칙 기반으로 먼저 판정하고 (LLM 호출 없음)
+    2) 판정하지 못한 답만 LLM judge에 max_workers개씩 동시에 요청
+    방법별 개수, 걸린 시간, 파싱 캐시 통계를 dict로 반환.
+    """
+    start = time.time()
+    pending = []
+    stats = {"rule_based": 0, "llm": 0}
+    for key, ground_truth, answer in items:
+        verdict = rule_based_grade(ground_truth, answer)
+        if verdict is None:
+            pending.append((key, ground_truth, answer))
+            continue
+        stats["rule_based"] += 1
+        on_graded(key, verdict, answer, "rule_based")
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="judge") as executor:
+            futures = {executor.submit(llm_judge_grade, gt, ans): key for key, gt, ans in pending}
+            for future in as_completed(futures):
+                is_correct, justification = future.result()
+                stats["llm"] += 1
+                on_graded(futures[future], is_correct, justification, "llm")
+
+    stats["elapsed_s"] = round(time.time() - start, 2)
+    stats["parse_cache"] = get_parse_cache().report()
+    stats["llm_usage"] = usage_report()
+    return stats
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MATH 결과 채점")
+    parser.add_argument("--regrade", action="store_true",
+                        help="저장된 채점 결과를 무시하고 전부 다시 채점 (기본: 현재 GRADER_VERSION으로 채점된 문제만 건너뜀)")
+    args = parser.parse_args()
+
     # Assuming math_100_result.json is in the RESULT_DIR
     input_filepath = os.path.join(RESULT_DIR, "math_100_result.json")
     output_filepath = os.path.join(RESULT_DIR, "math_100_graded.json")
@@ -184,35 +220,45 @@ if __name__ == "__main__":
             json.dump(dummy_data, f, indent=4)
         results = dummy_data
 
-    graded_results = {}
-    for i, data in results.items():
+    # 채점 결과는 문제마다 바로 저장 (LLM judge 호출 중 중단돼도 다시 채점하지 않음)
+    from src.utils.result_store import ResultStore
+    graded_results = ResultStore(os.path.splitext(output_filepath)[0] + ".db")
+
+    # 1. Extract the answer from the model's output
+    items = [
+        (i, data["answer"], extract_answer(data["model_answer"]))
+        for i, data in results.items() if args.regrade or not is_current_grade(graded_results.get(i))
+    ]
+
+    # 2. Grade the extracted answers (규칙 기반 먼저, 나머지만 LLM judge 동시 호출)
+    def on_graded(i, is_correct, justification, method):
+        data = results[i]
         ground_truth = data["answer"]
         model_output = data["model_answer"]
-        
-        # 1. Extract the answer from the model's output
         extracted_ans = extract_answer(model_output)
-        
-        # 2. Grade the extracted answer
-        is_correct, justification = math_grading_function(ground_truth, extracted_ans)
-        
-        graded_results[i] = {
+
+        graded_results.put(i, {
             "domain": data["domain"],
             "ground_truth": ground_truth,
             "model_output": model_output,
             "extracted_answer": extracted_ans,
             "is_correct": is_correct,
-            "justification": justification
-        }
+            "justification": justification,
+            "grader_version": GRADER_VERSION,
+        })
         
         print(f"ID: {i}")
         print(f"  Domain: {data['domain']}")
         print(f"  Model Output: {model_output}")
         print(f"  Extracted Answer: {extracted_ans}")
         print(f"  Ground Truth: {ground_truth}")
-        print(f"  Is Correct: {is_correct}")
+        print(f"  Is Correct: {is_correct} ({method})")
         print("-" * 20)
 
-    with open(output_filepath, 'w') as f:
-        json.dump(graded_results, f, indent=4)
+    stats = grade_batch(items, on_graded)
+    print(f"Graded {len(items)} answers: {stats}")
+
+    graded_results.export_json(output_filepath, indent=4)
+    graded_results.close()
         
     print(f"Grading complete. Results saved to {output_filepath}")
\ No newline at end of file
@@ -1,25 +1,30 @@
 """
 Reasoning Pipeline 결과 채점 스크립트.
 reasoning_full_results.json → reasoning_graded.json
+(채점 결과는 문제마다 reasoning_graded.db에 바로 저장되고, 끝나면 JSON으로 내보냄)
+규칙 기반(sympy)으로 먼저 판정하고, 판정하지 못한 답만 LLM judge를 동시에 호출한다.
 """
 import json
-import os
-from grade_math import math_grading_function, extract_answer
+import argparse
+from grade_math import grade_batch, extract_answer, is_current_grade, GRADER_VERSION
+from src.utils.result_store import ResultStore
 
 INPUT_FILE = "reasoning_full_results.json"
 OUTPUT_FILE = "reasoning_graded.json"
+OUTPUT_DB = "reasoning_graded.db"
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Reasoning Pipeline 결과 채점")
+    parser.add_argument("--regrade", action="store_true",
+                        help="저장된 채점 결과를 무시하고 전부 다시 채점 (기본: 현재 GRADER_VERSION으로 채점된 문제만 건너뜀)")
+    args = parser.parse_args()
+
     with open(INPUT_FILE) as f:
         results = json.load(f)
 
     # Load existing graded results for resume
-    if os.path.exists(OUTPUT_FILE):
-        with open(OUTPUT_FILE) as f:
-            graded = json.load(f)
-    else:
-        graded = {}
+    graded = ResultStore(OUTPUT_DB, legacy_json=OUTPUT_FILE)
 
     total = len(results)
     already = len(graded)
@@ -29,50 +34,56 @@ def main():
     domain_correct = Counter()
     domain_total = Counter()
 
+    items = []
     for idx_str, data in sorted(results.items(), key=lambda x: int(x[0])):
         domain = data.get("domain", "Unknown")
-        gt = data.get("ground_truth", "")
-        final_answer = data.get("final_answer", "")
         
-        if idx_str in graded:
+        prev = graded.get(idx_str)
+        if not args.regrade and is_current_grade(prev):
             # Already graded
             domain_total[domain] += 1
-            if graded[idx_str].get("is_correct"):
+            if prev.get("is_correct"):
                 domain_correct[domain] += 1
             continue
 
         # Extract answer from final_answer (may contain boxed)
+        final_answer = data.get("final_answer", "")
         extracted = extract_answer(final_answer) if final_answer else ""
+        items.append((idx_str, data.get("ground_truth", ""), extracted))
 
-        # Grade
-        is_correct, _ = math_grading_function(gt, extracted)
-
-        graded[idx_str] = {
+    def on_graded(idx_str, is_correct, _, method):
+        data = results[idx_str]
+        domain = data.get("domain", "Unknown")
+        final_answer = data.get("final_answer", "")
+        record = {
             "domain": domain,
-            "ground_truth": gt,
+            "ground_truth": data.get("ground_truth", ""),
             "final_answer": final_answer,
-            "extracted_answer": extracted,
+            "extracted_answer": extract_answer(final_answer) if final_answer else "",
             "is_correct": is_correct,
             "attempts": data.get("attempts", 0),
             "cot_answer": data.get("cot_answer", ""),
             "code_result": data.get("code_result", ""),
+            "grader_version": GRADER_VERSION,
         }
+        graded.put(idx_str, record)
 
         domain_total[domain] += 1
         if is_correct:
             domain_correct[domain] += 1
 
-        i = int(idx_str)
-        if (i + 1) % 50 == 0:
-            with open(OUTPUT_FILE, 'w') as f:
-                json.dump(graded, f, indent=2, default=str)
-            done = len(graded)
-            correct_so_far = sum(1 for v in graded.values() if v.get("is_correct"))
+        done = sum(domain_total.values())
+        if done % 50 == 0:
+            correct_so_far = sum(domain_correct.values())
             print(f"  [{done}/{total}] Correct so far: {correct_so_far} ({correct_so_far/done*100:.1f}%)")
 
-    # Final save
-    with open(OUTPUT_FILE, 'w') as f:
-        json.dump(graded, f, indent=2, default=str)
+    stats = grade_batch(items, on_graded)
+    print(f"Graded {len(items)} answers: {stats['rule_based']} rule-based, {stats['llm']} by LLM judge "
+          f"({stats['elapsed_s']}s)")
+    print(f"Parse cache: {stats['parse_cache']}")
+
+    # Final export (기존 JSON 모양)
+    graded.export_json(OUTPUT_FILE)
 
     # Print summary
     correct = sum(1 for v in graded.values() if v.get("is_correct"))
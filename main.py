@@ -1,75 +1,117 @@
 import os
+import glob
 import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from src.agent.graph import build_graph
 from src.logger import get_logger
 from dsbench_loader import DSBenchLoader
 import langchain
 from langfuse.langchain import CallbackHandler
-from src.config import RESULT_DIR
+from src.config import RESULT_DIR, DSBENCH_WORKERS, LLM_LEDGER_DIR
 from src.utils.jupyter_sandbox import AgentSandbox
+from src.utils.kernel_pool import KernelPool
+from src.utils.result_store import ResultStore
+from src.utils.graph_checkpoint import get_checkpointer, thread_config, invoke_resumable, clear_thread
+from src.utils.graph_runtime import sandbox_config
+from src.utils.llm_cache import llm_cache_report
+from src.utils.llm_gateway import usage_report
+from src.utils.llm_ledger import LLMLedger, get_ledger
 
 logger = get_logger("MainExecutor")
 
 langchain.debug = True
 
-def main():
-    # 1. 설정
-    # 실행 모드 선택: "analysis" 또는 "modeling"
-    MODE = "analysis" 
-    DSBENCH_ROOT = "/c1/geonju/toolgen_langgraph/data/dataset/DSBench"
-    
-    logger.info(f"Starting DSBench Execution | Mode: {MODE}")
+GROUP_BASELINE = "task_dir_baseline"  # 같은 폴더의 질문 사이에 Main 커널을 되돌릴 체크포인트 이름
 
-    langfuse_handler = CallbackHandler()
-    
-    # 2. 로더 초기화
-    try:
-        loader = DSBenchLoader(DSBENCH_ROOT, mode=MODE)
-    except Exception as e:
-        logger.error(f"Failed to initialize loader: {e}")
-        return
-    
-    # 4. 전체 데이터셋 순회 (Question 단위 실행)
-    total_tasks = len(loader)
-    logger.info(f"Total tasks to process: {total_tasks}")
+RESULT_FILE = os.path.join(RESULT_DIR, "result.json")
+RESULT_DB = os.path.join(RESULT_DIR, "result.db")
 
 
-    # 중간결과가 존재하면 로드
-    if os.path.exists(os.path.join(RESULT_DIR, "result.json")):
-        with open(os.path.join(RESULT_DIR, "result.json"), 'r') as f:
-            final_answer_dict = json.load(f)
-    else:
-        final_answer_dict = {}
-        
-    for i in range(total_tasks):
-        # 4-1. 문제 가져오기 (Flattened Question)
-        task_data = loader.get_problem(i)
-        
-        t_id = task_data['id']
+def open_result_store():
+    # {t_id: {question_id: final_answer}} 모양. 예전 result.json이 있으면 처음 한 번 가져옴
+    return ResultStore(RESULT_DB, legacy_json=RESULT_FILE, nested=True)
 
-        # 결과가 이미 존재하면 continue
-        if t_id in final_answer_dict and task_data["question_id"] in final_answer_dict[t_id]:
-            continue
-        
-        if not t_id in final_answer_dict:
-            final_answer_dict[t_id] = {}
 
-        prompt = task_data['prompt']
-        target_dir = task_data['target_dir']
-        
-        logger.info(f"\n{'='*60}")
-        logger.info(f"🚀 Processing Task [{i+1}/{total_tasks}] ID: {t_id}")
-        logger.info(f"📂 Work Dir: {target_dir}")
-        logger.info(f"{'='*60}")
+def _question_key(question_id):
+    # modeling 태스크는 question_id가 None -> 예전 result.json(json.dump)과 같은 "null" 키 사용
+    return "null" if question_id is None else question_id
+
+
+# ----------------------------------------------------------------------
+# 워커 프로세스
+# ----------------------------------------------------------------------
+_worker = {}
 
-        with AgentSandbox(work_dir=target_dir) as sandbox:        
 
-            app = build_graph(sandbox)
+def _init_worker(dsbench_root, mode, run_name):
+    """워커 프로세스마다 로더 / 커널 풀 / 콜백을 한 번만 만든다."""
+    _worker["mode"] = mode
+    # 워커별 LLM 호출 장부 (그룹이 끝날 때마다 덮어쓰고, 부모가 마지막에 합침)
+    _worker["ledger_name"] = f"{run_name}_pid{os.getpid()}"
+    _worker["loader"] = DSBenchLoader(dsbench_root, mode=mode)
+    # main + tester 커널 + 다음 그룹용 여유 1개
+    _worker["pool"] = KernelPool(size=3)
+    _worker["callbacks"] = [CallbackHandler()]
+    # 워커마다 자기 커넥션으로 같은 DB에 기록 (SQLite WAL이 동시 쓰기를 직렬화)
+    _worker["store"] = open_result_store()
+    # 태스크 중간 상태 저장 (죽은 태스크는 다음 실행 때 마지막 노드 다음부터 재개)
+    _worker["checkpointer"] = get_checkpointer()
+    # 그래프는 워커당 한 번만 compile (샌드박스는 invoke config로 전달)
+    _worker["app"] = build_graph(checkpointer=_worker["checkpointer"])
+
+
+def _open_group_sandbox(target_dir):
+    """그룹용 샌드박스를 만들고, 질문마다 되돌아갈 기준 상태를 체크포인트"""
+    sandbox = AgentSandbox(work_dir=target_dir, pool=_worker["pool"])
+    has_baseline = sandbox.checkpoint_main(GROUP_BASELINE)
+    return sandbox, has_baseline
+
+
+def _replay_kernel_state(sandbox, values):
+    """체크포인트에서 재개할 때, 이전 실행에서 성공한 Solver 코드를 다시 실행해 Main 커널 상태를 복구 (LLM 호출 없음)"""
+    codes = values.get("executed_code", [])
+    logger.info(f"♻️ Replaying {len(codes)} solver step(s) into MAIN kernel")
+    for code in codes:
+        res = sandbox.run_code(code, mode="permanent")
+        if res["stderr"]:
+            logger.warning(f"⚠️ Replay step failed: {res['stderr'][:200]}")
+
+
+def run_task_group(target_dir, indices):
+    """
+    같은 target_dir을 쓰는 질문들을 하나의 warm 샌드박스에서 차례로 푼다.
+    - 데이터 파일은 샌드박스 생성 시 한 번만 파싱되어 공유 캐시에 올라감
+    - 질문 사이에는 Main 커널을 기준 체크포인트로 되돌리고 Tester 폴더를 비워 상태가 섞이지 않게 함
+    (done, total) 반환.
+    """
+    loader = _worker["loader"]
+    app = _worker["app"]
+    sandbox = None
+    done = 0
+
+    try:
+        for n, i in enumerate(indices):
+            task_data = loader.get_problem(i)
+            t_id = task_data['id']
 
-            # 4-2. 초기 상태 설정 (State Injection)
+            if sandbox is None:
+                sandbox, has_baseline = _open_group_sandbox(target_dir)
+            elif not (has_baseline and sandbox.restore_main(GROUP_BASELINE)):
+                # 이전 질문의 상태를 되돌릴 수 없으면 샌드박스를 새로 만듦
+                logger.warning(f"⚠️ Could not restore baseline for {target_dir}. Recreating sandbox.")
+                sandbox.cleanup()
+                sandbox, has_baseline = _open_group_sandbox(target_dir)
+            sandbox.cleanup_test_kernel()
+
+            logger.info(f"🚀 [{os.path.basename(target_dir)} {n+1}/{len(indices)}] Processing Task [{i}] ID: {t_id}")
+
+            # 초기 상태 설정 (State Injection)
             inputs = {
-                "problem": prompt,          # Stuffed Prompt (Intro + Excel Path + Question)
-                "work_dir": target_dir,     # (중요) 에이전트가 작업할 절대 경로
+                "problem": task_data['prompt'],   # Stuffed Prompt (Intro + Excel Path + Question)
+                "work_dir": target_dir,           # (중요) 에이전트가 작업할 절대 경로
                 "plan": [],
                 "current_step_index": 0,
                 "decision": "",
@@ -79,30 +121,119 @@ def main():
                 "tool_retrieved": [],
                 "tool_generated": [],
                 "feedback_history": [],
+                "executed_code": [],
                 "error": None
             }
-            
-            # 4-3. 그래프 실행
-            try:
-                # recursion_limit: 복잡한 문제일수록 높게 잡아야 함 (50~100)
-                result = app.invoke(inputs, config={"recursion_limit": 100, "callbacks": [langfuse_handler]})
 
+            thread_id = f"dsbench_{_worker['mode']}_{t_id}"
+            # recursion_limit: 복잡한 문제일수록 높게 잡아야 함 (50~100)
+            config = thread_config(thread_id, **sandbox_config(sandbox, recursion_limit=100, callbacks=_worker["callbacks"]))
+
+            final_answer = None
+            try:
+                result = invoke_resumable(
+                    app, inputs, config,
+                    before_resume=lambda values: _replay_kernel_state(sandbox, values),
+                )
+                # 끝까지 실행된 태스크는 체크포인트 정리 (예외로 멈춘 태스크만 남겨 다음 실행에서 재개)
+                clear_thread(_worker["checkpointer"], thread_id)
                 final_answer = result.get("final_answer")
                 if final_answer:
                     logger.info(f"✅ Task {t_id} Completed.")
-                    final_answer_dict[t_id][task_data["question_id"]] = final_answer
-                    
-                
-                # (선택) 결과 확인 로직
-                # Analysis: result['context_log'] 마지막 내용 확인
-                # Modeling: target_dir에 submission.csv 생겼는지 확인
-                
+                    done += 1
             except Exception as e:
                 logger.error(f"❌ Task {t_id} Failed: {e}")
                 # 에러가 나도 다음 문제로 계속 진행 (Continue)
 
-        with open(os.path.join(RESULT_DIR, "result.json"), 'w') as f:
-            json.dump(final_answer_dict, f, indent=4)
+            if final_answer:
+                _worker["store"].put(t_id, final_answer, sub_key=_question_key(task_data["question_id"]))
+    finally:
+        if sandbox is not None:
+            sandbox.cleanup()
+
+    logger.info(f"🏊 KernelPool stats (pid {os.getpid()}): {_worker['pool'].report()}")
+    logger.info(f"💾 LLM cache stats (pid {os.getpid()}): {llm_cache_report()}")
+    logger.info(f"📡 LLM usage (pid {os.getpid()}): {usage_report()}")
+    get_ledger().export(_worker["ledger_name"])
+    return done, len(indices)
+
+
+def main():
+    # 1. 설정
+    parser = argparse.ArgumentParser(description="DSBench parallel executor")
+    # 실행 모드 선택: "analysis" 또는 "modeling"
+    parser.add_argument("--mode", default="analysis", choices=["analysis", "modeling"])
+    parser.add_argument("--root", default="/c1/geonju/toolgen_langgraph/data/dataset/DSBench")
+    parser.add_argument("--workers", type=int, default=DSBENCH_WORKERS, help="동시에 실행할 워커 프로세스 수")
+    args = parser.parse_args()
+    MODE = args.mode
+    DSBENCH_ROOT = args.root
+    
+    logger.info(f"Starting DSBench Execution | Mode: {MODE} | Workers: {args.workers}")
+    
+    # 2. 로더 초기화
+    try:
+        loader = DSBenchLoader(DSBENCH_ROOT, mode=MODE)
+    except Exception as e:
+        logger.error(f"Failed to initialize loader: {e}")
+        return
+    
+    total_tasks = len(loader)
+    logger.info(f"Total tasks to process: {total_tasks}")
+
+    # 3. 중간결과가 존재하면 로드하고, 남은 질문을 target_dir 기준으로 묶음
+    store = open_result_store()
+    groups = {}
+    for i in range(total_tasks):
+        t_id, question_id, target_dir = loader.get_task_key(i)
+        # 결과가 이미 존재하면 continue
+        if store.has(t_id, _question_key(question_id)):
+            continue
+        groups.setdefault(target_dir, []).append(i)
+
+    pending = sum(len(v) for v in groups.values())
+    logger.info(f"Pending: {pending} questions in {len(groups)} task directories")
+
+    # 질문이 많은 그룹부터 배정해서 마지막에 긴 그룹 하나만 남는 상황을 줄임
+    ordered = sorted(groups.items(), key=lambda kv: -len(kv[1]))
+
+    # 4. 그룹 단위로 워커 프로세스에 분배
+    start_time = time.time()
+    run_name = f"dsbench_{MODE}_{time.strftime('%Y%m%d_%H%M%S')}"
+    finished = solved = 0
+    with ProcessPoolExecutor(
+        max_workers=max(1, args.workers),
+        mp_context=multiprocessing.get_context("spawn"),  # 커널/스레드를 가진 부모를 fork하지 않음
+        initializer=_init_worker,
+        initargs=(DSBENCH_ROOT, MODE, run_name),
+    ) as executor:
+        futures = {executor.submit(run_task_group, d, idx): d for d, idx in ordered}
+        for future in as_completed(futures):
+            target_dir = futures[future]
+            try:
+                done, n = future.result()
+            except Exception as e:
+                logger.error(f"❌ Group {target_dir} crashed: {e}")
+                done, n = 0, len(groups[target_dir])
+            finished += n
+            solved += done
+            elapsed = time.time() - start_time
+            logger.info(
+                f"📈 [{finished}/{pending}] {os.path.basename(target_dir)}: {done}/{n} answered | "
+                f"{finished / (elapsed / 60):.1f} questions/min"
+            )
+
+    logger.info(f"🏁 Done: {solved}/{pending} answered in {(time.time() - start_time) / 60:.1f} min")
+    store.export_json(RESULT_FILE, indent=4)
+    logger.info(f"💾 Results exported to {RESULT_FILE}")
+    store.close()
+
+    # 워커별 LLM 호출 장부를 합쳐 노드별 시간 / 토큰 순위 출력
+    worker_ledgers = sorted(glob.glob(os.path.join(LLM_LEDGER_DIR, f"{run_name}_pid*.csv")))
+    if worker_ledgers:
+        ledger = LLMLedger.from_csv(worker_ledgers)
+        csv_path, json_path = ledger.export(run_name)
+        logger.info(f"📒 LLM ledger ({len(ledger)} calls) saved to {csv_path}, {json_path}\n{ledger.summary_table()}")
 
 
 
@@ -164,13 +295,13 @@ def test_single():
     # 4-3. 그래프 실행
     try:
         # recursion_limit: 복잡한 문제일수록 높게 잡아야 함 (50~100)
-        for state in app.stream(
-            inputs,
-            config={
-                "recursion_limit": 50,
-                "callbacks": [langfuse_handler]},
-            stream_mode="values"
-        ):
+        with AgentSandbox(work_dir=target_dir) as sandbox:
+            states = list(app.stream(
+                inputs,
+                config=sandbox_config(sandbox, recursion_limit=50, callbacks=[langfuse_handler]),
+                stream_mode="values"
+            ))
+        for state in states:
             # logger.info(f"현재 상태: {state}")
             # print(f"현재 상태: {state}")
 
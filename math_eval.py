@@ -1,11 +1,14 @@
 import os
 import json
 from src.agent.graph import build_graph
+from src.utils.graph_runtime import sandbox_config
 from src.logger import get_logger
 import langchain
 from langfuse.langchain import CallbackHandler
-from src.config import RESULT_DIR
+from src.config import RESULT_DIR, KERNEL_POOL_SIZE
 from src.utils.jupyter_sandbox import AgentSandbox
+from src.utils.kernel_pool import KernelPool
+from src.utils.result_store import ResultStore
 
 logger = get_logger("MainExecutor")
 
@@ -14,7 +17,9 @@ langchain.debug = True
 def main():
     # 1. 설정
     dataset_path = "/c1/geonju/toolgen/datasets/math/math_100.json"
-    final_answer_dict = {}
+    result_file = os.path.join(RESULT_DIR, "math_100_result.json")
+    # 문제마다 바로 저장되는 결과 저장소 (중단 후 재실행하면 끝난 문제는 건너뜀)
+    final_answer_dict = ResultStore(os.path.join(RESULT_DIR, "math_100_result.db"))
     
     with open(dataset_path, 'r') as f:
         _json = json.load(f)['test']
@@ -30,9 +35,15 @@ def main():
     # 4. 전체 데이터셋 순회 (Question 단위 실행)
     total_tasks = len(dataset)
     logger.info(f"Total tasks to process: {total_tasks}")
+
+    pool = KernelPool(size=KERNEL_POOL_SIZE)
+    # 그래프는 한 번만 compile (샌드박스는 invoke config로 전달)
+    app = build_graph()
         
     for i in range(total_tasks):
         # 4-1. 문제 가져오기 (Flattened Question)
+        if final_answer_dict.has(i):
+            continue
         task = dataset[i]
         question = task['question']
         answer = task['answer']
@@ -42,9 +53,7 @@ def main():
         logger.info(f"🚀 Processing Task [{i+1}/{total_tasks}]")
         logger.info(f"{'='*60}")
 
-        with AgentSandbox() as sandbox:        
-
-            app = build_graph(sandbox)
+        with AgentSandbox(pool=pool) as sandbox:        
 
             # 4-2. 초기 상태 설정 (State Injection)
             inputs = {
@@ -64,17 +73,17 @@ def main():
             # 4-3. 그래프 실행
             try:
                 # recursion_limit: 복잡한 문제일수록 높게 잡아야 함 (50~100)
-                result = app.invoke(inputs, config={"recursion_limit": 100, "callbacks": [langfuse_handler]})
+                result = app.invoke(inputs, config=sandbox_config(sandbox, recursion_limit=100, callbacks=[langfuse_handler]))
 
                 final_answer = result.get("final_answer")
                 if final_answer:
                     logger.info(f"✅ Task {i} Completed.")
-                    final_answer_dict[i] = {
+                    final_answer_dict.put(i, {
                         "question": question,
                         "answer": answer,
                         "domain": domain,
                         "model_answer": final_answer
-                    }
+                    })
                     
                 
                 # (선택) 결과 확인 로직
@@ -85,8 +94,12 @@ def main():
                 logger.error(f"❌ Task {i} Failed: {e}")
                 # 에러가 나도 다음 문제로 계속 진행 (Continue)
 
-        with open(os.path.join(RESULT_DIR, "math_100_result.json"), 'w') as f:
-            json.dump(final_answer_dict, f, indent=4)
+    # grade_math.py 입력 (기존 JSON 모양)
+    final_answer_dict.export_json(result_file, indent=4)
+    final_answer_dict.close()
+
+    logger.info(f"🏊 KernelPool stats: {pool.report()}")
+    pool.shutdown()
 
 
 if __name__ == "__main__":
@@ -1,21 +1,44 @@
-import os
 import json
 import time
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from langfuse.langchain import CallbackHandler
 from src.reasoning.graph import build_reasoning_graph
+from src.reasoning.nodes import judge_report
+from src.utils.math_equivalence import is_equivalent
+from src.utils.llm_cache import llm_cache_report
+from src.utils.llm_gateway import usage_report
+from src.utils.llm_ledger import get_ledger
 from src.logger import get_logger
 from src.utils.jupyter_sandbox import AgentSandbox
+from src.utils.kernel_pool import KernelPool
+from src.utils.result_store import ResultStore
+from src.utils.graph_checkpoint import (
+    get_checkpointer, thread_config, invoke_resumable, clear_thread,
+    open_async_checkpointer, close_async_checkpointer, ainvoke_resumable, aclear_thread,
+)
+from src.utils.graph_runtime import sandbox_config
 
 load_dotenv()
 
 logger = get_logger("ReasoningPipeline")
 
-from src.config import MODEL_NAME
+from src.config import (
+    MODEL_NAME, KERNEL_POOL_SIZE, PIPELINE_CONCURRENCY, PIPELINE_ASYNC_CONCURRENCY, SELF_CONSISTENCY_K,
+    RULE_CHECK_TIMEOUT_S,
+)
 
 # 모델명에서 파일명 안전한 부분만 추출
 _model_tag = MODEL_NAME.split("/")[-1].replace(".", "_")
 RESULT_FILE = f"reasoning_results_{_model_tag}.json"
+RESULT_DB = f"reasoning_results_{_model_tag}.db"
+
+
+def _run_tag(k):
+    # self-consistency 실행은 결과 파일 / 체크포인트 thread를 따로 써서 기본 모드와 섞이지 않게 함
+    return f"{_model_tag}_sc{k}" if k > 1 else _model_tag
 
 
 def load_dataset(dataset_path):
@@ -29,23 +52,181 @@ def load_dataset(dataset_path):
     return dataset
 
 
-def load_existing_results():
-    """이미 완료된 결과를 로드하여 중단 후 재개를 지원."""
-    if os.path.exists(RESULT_FILE):
-        with open(RESULT_FILE, 'r') as f:
-            return json.load(f)
-    return {}
+def load_existing_results(result_db=RESULT_DB, result_file=RESULT_FILE):
+    """완료된 결과 저장소를 열어 중단 후 재개를 지원 (예전 JSON 결과가 있으면 처음 한 번 가져옴)."""
+    return ResultStore(result_db, legacy_json=result_file)
+
+
+def _initial_inputs(question):
+    return {
+        "problem": question,
+        "cot_reasoning": "",
+        "cot_answer": "",
+        "code": "",
+        "code_result": "",
+        "code_error": None,
+        "verified": False,
+        "attempt": 0,
+        "judge_reasoning": "",
+        "final_answer": None,
+        "samples": [],
+    }
+
+
+def _thread_id(i, run_tag=_model_tag):
+    # 문제 index별 thread: 중간에 죽으면 다음 실행에서 마지막으로 끝난 노드 다음부터 재개
+    return f"math_{run_tag}_{i}"
+
+
+def _rule_correct(task, result):
+    # 규칙 기반 정답 여부 (판정 불가면 None, 최종 채점은 grade_reasoning.py)
+    return is_equivalent(task['answer'], result.get("final_answer", ""))
+
+
+async def _rule_correct_async(task, result):
+    """_rule_correct를 스레드에서 (sympy simplify가 이벤트 루프를 막지 않도록). 시간 초과면 None"""
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(_rule_correct, task, result), RULE_CHECK_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        logger.warning(f"  ⏱️ Rule-based check timed out after {RULE_CHECK_TIMEOUT_S}s (GT: {task['answer']})")
+        return None
+
+
+def _task_record(i, task, result, elapsed, correct):
+    final_answer = result.get("final_answer", "")
+    attempts = result.get("attempt", 0)
+
+    logger.info(
+        f"  ✅ Task [{i}] Answer: {final_answer[:40]} | GT: {task['answer']} | Attempts: {attempts} | "
+        f"{elapsed:.1f}s | Correct: {correct}"
+    )
+    record = {
+        "domain": task['domain'],
+        "ground_truth": task['answer'],
+        "final_answer": final_answer,
+        "attempts": attempts,
+        "cot_answer": result.get("cot_answer", ""),
+        "code_result": result.get("code_result", ""),
+        "elapsed_s": round(elapsed, 2),
+        "rule_correct": correct,
+    }
+    if result.get("samples"):
+        record["samples"] = result["samples"]
+    return record
+
+
+def _error_record(i, task, e, elapsed):
+    logger.error(f"  ❌ Task [{i}] Failed: {e}")
+    return {
+        "domain": task['domain'],
+        "ground_truth": task['answer'],
+        "error": str(e),
+        "elapsed_s": round(elapsed, 2),
+    }
+
+
+def _timing_report(values):
+    """문제당 소요 시간과 규칙 기반 정답률 (모드별 실행 결과를 비교할 때 사용)"""
+    times = sorted(v["elapsed_s"] for v in values if "elapsed_s" in v)
+    decided = [v["rule_correct"] for v in values if v.get("rule_correct") is not None]
+    if not times:
+        return {}
+    return {
+        "mean_s": round(sum(times) / len(times), 2),
+        "p50_s": times[len(times) // 2],
+        "p95_s": times[min(len(times) - 1, int(len(times) * 0.95))],
+        "max_s": times[-1],
+        "rule_accuracy": round(sum(decided) / len(decided), 3) if decided else None,
+        "rule_decided": len(decided),
+    }
+
+
+def solve_task(i, task, app, pool, callbacks, run_tag=_model_tag):
+    """문제 하나를 전용 샌드박스에서 풀고 결과 레코드를 반환 (워커 스레드에서 실행)."""
+    logger.info(f"🚀 Task [{i}] Domain: {task['domain']} | Q: {task['question'][:80]}...")
+    started = time.perf_counter()
+
+    try:
+        with AgentSandbox(work_dir="./", pool=pool) as sandbox:
+            thread_id = _thread_id(i, run_tag)
+            result = invoke_resumable(
+                app, _initial_inputs(task['question']),
+                thread_config(thread_id, **sandbox_config(sandbox, recursion_limit=20, callbacks=callbacks)),
+            )
+            clear_thread(app.checkpointer, thread_id)
+            return _task_record(i, task, result, time.perf_counter() - started, _rule_correct(task, result))
+
+    except Exception as e:
+        return _error_record(i, task, e, time.perf_counter() - started)
+
+
+async def solve_task_async(i, task, app, pool, callbacks, semaphore, run_tag=_model_tag):
+    """
+    solve_task()의 async 버전 (이벤트 루프 하나에서 여러 문제를 동시에 진행).
+    semaphore로 동시에 열려 있는 샌드박스 수(= 커널 수)를 제한한다. (i, 결과 레코드) 반환.
+    """
+    async with semaphore:
+        logger.info(f"🚀 Task [{i}] Domain: {task['domain']} | Q: {task['question'][:80]}...")
+        started = time.perf_counter()
+        sandbox = None
+        try:
+            # 커널 시작/반납은 블로킹이므로 스레드에서
+            sandbox = await asyncio.to_thread(AgentSandbox, work_dir="./", pool=pool)
+            thread_id = _thread_id(i, run_tag)
+            result = await ainvoke_resumable(
+                app, _initial_inputs(task['question']),
+                thread_config(thread_id, **sandbox_config(sandbox, recursion_limit=20, callbacks=callbacks)),
+            )
+            await aclear_thread(app.checkpointer, thread_id)
+            elapsed = time.perf_counter() - started
+            return i, _task_record(i, task, result, elapsed, await _rule_correct_async(task, result))
+
+        except Exception as e:
+            return i, _error_record(i, task, e, time.perf_counter() - started)
+
+        finally:
+            if sandbox is not None:
+                await asyncio.to_thread(sandbox.cleanup)
 
 
-def save_results(results):
-    with open(RESULT_FILE, 'w') as f:
-        json.dump(results, f, indent=2, default=str)
+async def run_async(dataset, pending, pool, callbacks, concurrency, on_done, self_consistency_k=0):
+    """app.ainvoke로 pending 문제를 최대 concurrency개씩 동시에 진행"""
+    checkpointer = await open_async_checkpointer()
+    try:
+        # async 노드 그래프는 이벤트 루프 안에서 한 번만 compile
+        app = build_reasoning_graph(checkpointer=checkpointer, async_nodes=True, self_consistency_k=self_consistency_k)
+        semaphore = asyncio.Semaphore(concurrency)
+        run_tag = _run_tag(self_consistency_k)
+        tasks = [solve_task_async(i, dataset[i], app, pool, callbacks, semaphore, run_tag) for i in pending]
+        for next_done in asyncio.as_completed(tasks):
+            i, record = await next_done
+            on_done(i, record)
+    finally:
+        await close_async_checkpointer(checkpointer)
 
 
 def main():
-    dataset_path = "/c1/geonju/toolgen/datasets/math/math_100.json"
-
-    logger.info("Starting Reasoning Pipeline — FULL DATASET")
+    parser = argparse.ArgumentParser(description="Reasoning Pipeline (MATH)")
+    parser.add_argument("--dataset", default="/c1/geonju/toolgen/datasets/math/math_100.json")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="동시에 푸는 문제 수 (문제마다 별도 샌드박스, LLM 클라이언트/rate limiter는 공유). "
+                             f"기본값: 스레드 {PIPELINE_CONCURRENCY}, --async {PIPELINE_ASYNC_CONCURRENCY}")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="스레드 풀 대신 app.ainvoke + asyncio로 실행 (한 프로세스에서 수십 개 문제를 동시에 진행)")
+    parser.add_argument("--self-consistency", dest="self_consistency_k", type=int, nargs="?",
+                        const=SELF_CONSISTENCY_K, default=0, metavar="K",
+                        help="CoT k개 + 검증 코드 k개를 동시에 실행해 다수결, 합의가 없을 때만 judge 호출 "
+                             f"(K 생략 시 {SELF_CONSISTENCY_K}). 결과는 *_sc<K> 파일에 따로 저장")
+    args = parser.parse_args()
+    if args.concurrency is None:
+        args.concurrency = PIPELINE_ASYNC_CONCURRENCY if args.use_async else PIPELINE_CONCURRENCY
+    dataset_path = args.dataset
+    k = args.self_consistency_k
+    run_tag = _run_tag(k)
+    result_file = f"reasoning_results_{run_tag}.json"
+    mode = f"self-consistency k={k}" if k > 1 else "single"
+
+    logger.info(f"Starting Reasoning Pipeline — FULL DATASET ({mode})")
 
     langfuse_handler = CallbackHandler()
 
@@ -54,85 +235,55 @@ def main():
     total = len(dataset)
     logger.info(f"Loaded {total} tasks from {dataset_path}")
 
-    # Load existing results (for resume)
-    results = load_existing_results()
+    # Load existing results (for resume) — 문제 하나가 끝날 때마다 바로 저장됨
+    results = load_existing_results(f"reasoning_results_{run_tag}.db", result_file)
     already_done = len(results)
     if already_done > 0:
         logger.info(f"Resuming: {already_done} tasks already completed")
 
-    start_time = time.time()
-    correct_count = 0
-
-    for i in range(total):
-        idx_str = str(i)
-
-        # Skip already completed
-        if idx_str in results:
-            if results[idx_str].get("final_answer"):
-                correct_count += 1 if results[idx_str].get("is_correct", False) else 0
-            continue
-
-        task = dataset[i]
-        question = task['question']
-        answer = task['answer']
-        domain = task['domain']
-
-        logger.info(f"\n[{i+1}/{total}] 🚀 Task [{i}] Domain: {domain}")
-        logger.info(f"  Q: {question[:80]}...")
+    # Skip already completed (resume는 문제 index 기준)
+    pending = [i for i in range(total) if not results.has(str(i))]
+    concurrency = max(1, min(args.concurrency, len(pending) or 1))
+    logger.info(f"Running {len(pending)} tasks with concurrency={concurrency} ({'async' if args.use_async else 'threads'})")
 
-        try:
-            with AgentSandbox(work_dir="./") as sandbox:
-                app = build_reasoning_graph(sandbox)
-
-                inputs = {
-                    "problem": question,
-                    "cot_reasoning": "",
-                    "cot_answer": "",
-                    "code": "",
-                    "code_result": "",
-                    "code_error": None,
-                    "verified": False,
-                    "attempt": 0,
-                    "judge_reasoning": "",
-                    "final_answer": None,
-                }
-
-                result = app.invoke(
-                    inputs,
-                    config={"recursion_limit": 20, "callbacks": [langfuse_handler]}
-                )
-
-                final_answer = result.get("final_answer", "")
-                attempts = result.get("attempt", 0)
-
-                results[idx_str] = {
-                    "domain": domain,
-                    "ground_truth": answer,
-                    "final_answer": final_answer,
-                    "attempts": attempts,
-                    "cot_answer": result.get("cot_answer", ""),
-                    "code_result": result.get("code_result", ""),
-                }
-
-                logger.info(f"  ✅ Answer: {final_answer[:40]} | GT: {answer} | Attempts: {attempts}")
+    # 샌드박스당 커널 2개(main + tester)를 쓰므로 동시 실행 수에 맞춰 풀 크기를 늘림
+    pool = KernelPool(size=max(KERNEL_POOL_SIZE, 2 * concurrency))
 
-        except Exception as e:
-            logger.error(f"  ❌ Failed: {e}")
-            results[idx_str] = {
-                "domain": domain,
-                "ground_truth": answer,
-                "error": str(e),
+    start_time = time.time()
+    finished = 0
+
+    def on_done(i, record):
+        nonlocal finished
+        results.put(str(i), record)
+        finished += 1
+
+        elapsed = time.time() - start_time
+        rate = finished / (elapsed / 60) if elapsed > 0 else 0.0
+        remaining = len(pending) - finished
+        eta = remaining / rate if rate > 0 else float("inf")
+        logger.info(
+            f"[{already_done + finished}/{total}] Task [{i}] done | "
+            f"{rate:.1f} problems/min | ETA {eta:.1f}min"
+        )
+
+    if args.use_async:
+        asyncio.run(run_async(dataset, pending, pool, [langfuse_handler], concurrency, on_done, k))
+    else:
+        # 그래프는 한 번만 compile해서 모든 워커가 공유 (문제마다 샌드박스만 config로 전달)
+        app = build_reasoning_graph(checkpointer=get_checkpointer(), self_consistency_k=k)
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="task") as executor:
+            futures = {
+                executor.submit(solve_task, i, dataset[i], app, pool, [langfuse_handler], run_tag): i
+                for i in pending
             }
+            # 결과 저장은 메인 스레드에서만 (레코드마다 바로 commit)
+            for future in as_completed(futures):
+                on_done(futures[future], future.result())
 
-        # 매 10문제마다 중간 저장
-        if (i + 1) % 10 == 0:
-            save_results(results)
-            elapsed = time.time() - start_time
-            done = sum(1 for k, v in results.items() if "final_answer" in v or "error" in v)
-            logger.info(f"  💾 Saved ({done}/{total} done, {elapsed/60:.1f}min elapsed)")
-
-    # 최종 저장
-    save_results(results)
+    # 기존 JSON 모양으로 내보내기 (grade_reasoning.py 입력)
+    results.export_json(result_file)
+    values = results.values()
 
     # 결과 요약
     elapsed = time.time() - start_time
@@ -140,10 +291,20 @@ def main():
     logger.info(f"📊 FULL DATASET RESULTS")
     logger.info(f"{'=' * 60}")
     logger.info(f"Total: {total}")
-    logger.info(f"Completed: {sum(1 for v in results.values() if 'final_answer' in v)}")
-    logger.info(f"Errors: {sum(1 for v in results.values() if 'error' in v)}")
-    logger.info(f"Time: {elapsed/60:.1f} min")
-    logger.info(f"Results saved to {RESULT_FILE}")
+    logger.info(f"Completed: {sum(1 for v in values if 'final_answer' in v)}")
+    logger.info(f"Errors: {sum(1 for v in values if 'error' in v)}")
+    logger.info(f"Time: {elapsed/60:.1f} min ({finished / (elapsed / 60) if elapsed > 0 else 0.0:.1f} problems/min, concurrency={concurrency})")
+    logger.info(f"Per-problem ({mode}): {_timing_report(values)}")
+    logger.info(f"Judge: {judge_report()}")
+    logger.info(f"LLM cache: {llm_cache_report()}")
+    logger.info(f"LLM usage: {usage_report()}")
+    ledger = get_ledger()
+    csv_path, json_path = ledger.export(f"reasoning_{run_tag}_{time.strftime('%Y%m%d_%H%M%S')}")
+    logger.info(f"LLM ledger ({len(ledger)} calls) saved to {csv_path}, {json_path}\n{ledger.summary_table()}")
+    logger.info(f"Results saved to {result_file}")
+    logger.info(f"KernelPool: {pool.report()}")
+    pool.shutdown()
+    results.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+"""
+context_log를 프롬프트에 넣을 때 쓰는 토큰 예산 관리자.
+
+context_log는 계획 단계마다 항목이 쌓이는 operator.add 리스트라서 그대로 넣으면
+Creator / Solver / Reasoner / Final Answer 프롬프트가 단계가 늘수록 계속 커진다.
+render()는 항상 예산 안의 텍스트를 돌려준다.
+- 같은 내용의 항목은 마지막 것만 남김
+- 최근 항목(최대 keep_recent개)은 그대로, 그보다 오래된 항목은 요약 하나로 접음
+- 요약은 접힌 항목 목록별로 캐시하고, 바로 앞 요약이 있으면 새로 접힌 항목만 덧붙여 다시 요약 (단계마다 요약 호출 1회 이하)
+"""
+import hashlib
+import asyncio
+import threading
+from collections import OrderedDict
+
+
+def estimate_tokens(text):
+    # 토크나이저 없이 대략적인 토큰 수 (영문 기준 4글자 ≈ 1토큰)
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text, max_tokens):
+    """앞부분과 끝부분만 남기고 가운데를 생략"""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    return f"{text[:head]}\n...(truncated)...\n{text[-tail:]}"
+
+
+def extractive_summary(entries, max_tokens):
+    """LLM 없이 쓰는 기본 요약: 항목마다 앞부분만 남김"""
+    per_entry = max(16, max_tokens // max(1, len(entries)))
+    return "\n".join(f"- {truncate_to_tokens(' '.join(e.split()), per_entry)}" for e in entries)
+
+
+class ContextManager:
+    def __init__(self, budget_tokens, keep_recent=4, summary_tokens=400, summarize=None, cache_size=256):
+        """
+        budget_tokens: render() 결과의 최대 토큰 수 (요약 포함)
+        keep_recent: 그대로 남길 최근 항목 수 (예산을 넘으면 더 적게 남김)
+        summary_tokens: 오래된 항목 요약의 최대 토큰 수
+        summarize(entries, max_tokens) -> str: 요약 함수 (None이면 extractive_summary)
+        """
+        self.budget_tokens = budget_tokens
+        self.keep_recent = keep_recent
+        self.summary_tokens = min(summary_tokens, budget_tokens // 2)
+        self.summarize = summarize or extractive_summary
+        self.cache_size = cache_size
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"summaries": 0, "summary_hits": 0}
+
+    @staticmethod
+    def dedupe(entries):
+        """같은 내용(공백 무시)의 항목은 마지막 것만 남김"""
+        seen = set()
+        kept = []
+        for entry in reversed(entries):
+            key = " ".join(str(entry).split())
+            if key in seen:
+                continue
+            seen.add(key)
+            kept.append(str(entry))
+        return kept[::-1]
+
+    def split(self, entries):
+        """(요약할 오래된 항목, 그대로 둘 최근 항목)"""
+        entries = self.dedupe(entries)
+        total = sum(estimate_tokens(e) for e in entries)
+        needs_summary = len(entries) > self.keep_recent or total > self.budget_tokens
+        recent_budget = self.budget_tokens - (self.summary_tokens if needs_summary else 0)
+        recent = []
+        used = 0
+        for entry in reversed(entries):
+            cost = estimate_tokens(entry)
+            if len(recent) >= self.keep_recent or (recent and used + cost > recent_budget):
+                break
+            recent.append(entry)
+            used += cost
+        recent.reverse()
+        return entries[:len(entries) - len(recent)], recent
+
+    @staticmethod
+    def _key(entries):
+        return hashlib.sha256("\x00".join(entries).encode()).hexdigest()
+
+    def _cached(self, key):
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+            return summary
+
+    def _store(self, key, summary):
+        with self._lock:
+            self._summaries[key] = summary
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+
+    def summary_of(self, older):
+        key = self._key(older)
+        summary = self._cached(key)
+        if summary is not None:
+            self.stats["summary_hits"] += 1
+            return summary
+
+        # 보통 바로 앞 단계에서 older[:-k]까지 요약해 두었으므로 그 요약 + 새로 접힌 항목만 요약
+        inputs = older
+        for cut in range(len(older) - 1, 0, -1):
+            previous = self._cached(self._key(older[:cut]))
+            if previous is not None:
+                inputs = [f"Summary of earlier steps:\n{previous}"] + older[cut:]
+                break
+        summary = truncate_to_tokens(self.summarize(inputs, self.summary_tokens), self.summary_tokens)
+        self.stats["summaries"] += 1
+        self._store(key, summary)
+        return summary
+
+    def render(self, entries):
+        """프롬프트에 넣을 context 텍스트 (예산 안)"""
+        if not entries:
+            return "(none)"
+        older, recent = self.split(entries)
+        parts = []
+        if older:
+            parts.append(f"[Summary of {len(older)} earlier entries]\n{self.summary_of(older)}")
+        # 최근 항목 하나가 예산보다 크면 잘라서 넣음
+        recent_budget = self.budget_tokens - (self.summary_tokens if older else 0)
+        parts += [truncate_to_tokens(entry, recent_budget) for entry in recent]
+        return "\n\n".join(parts)
+
+    async def aprepare(self, entries):
+        """async 노드용: 요약(LLM 호출일 수 있음)을 스레드에서 미리 만들어 두어 render()가 캐시만 읽게 함"""
+        if entries:
+            await asyncio.to_thread(self.render, entries)
+
+    def report(self):
+        with self._lock:
+            return dict(self.stats, cached=len(self._summaries))
@@ -1,23 +1,29 @@
 from langgraph.graph import StateGraph, END
 from src.agent.state import AgentState
-from src.agent.nodes import (
-    grounding_node, planner_node, tool_manager_node, tool_creator_node, 
-    tool_tester_node, solver_node, reasoner_node, final_answer_node
-)
-from functools import partial
+from src.agent import nodes
+from src.utils.graph_runtime import with_sandbox
 
-def build_graph(sandbox):
+def build_graph(checkpointer=None, async_nodes=False):
+    """
+    그래프는 프로세스당 한 번 compile해서 재사용 (동시 실행 워커끼리 공유 가능).
+    샌드박스는 invoke 시 sandbox_config(sandbox)로 넘긴다.
+    checkpointer를 주면 노드마다 상태가 저장되어 중단된 태스크를 이어서 실행할 수 있음
+    async_nodes=True면 async 노드(*_async)로 구성되어 app.ainvoke로만 실행 (checkpointer도 async 지원 필요)
+    """
     workflow = StateGraph(AgentState)
 
+    def node(name):
+        return getattr(nodes, f"{name}_async" if async_nodes else name)
+
     # 노드 추가
-    workflow.add_node("grounding", partial(grounding_node, sandbox=sandbox))
-    workflow.add_node("planner", planner_node)
-    workflow.add_node("manager", tool_manager_node)
-    workflow.add_node("creator", tool_creator_node)
-    workflow.add_node("tester", partial(tool_tester_node, sandbox=sandbox))
-    workflow.add_node("solver", partial(solver_node, sandbox=sandbox))
-    workflow.add_node("reasoner", reasoner_node)
-    workflow.add_node("final_answer", partial(final_answer_node, sandbox=sandbox))
+    workflow.add_node("grounding", with_sandbox(node("grounding_node")))
+    workflow.add_node("planner", node("planner_node"))
+    workflow.add_node("manager", node("tool_manager_node"))
+    workflow.add_node("creator", node("tool_creator_node"))
+    workflow.add_node("tester", with_sandbox(node("tool_tester_node")))
+    workflow.add_node("solver", with_sandbox(node("solver_node")))
+    workflow.add_node("reasoner", node("reasoner_node"))
+    workflow.add_node("final_answer", with_sandbox(node("final_answer_node")))
 
     # 엣지 연결
     workflow.set_entry_point("grounding")
@@ -119,4 +125,4 @@ def build_graph(sandbox):
 
     workflow.add_edge("final_answer", END)
 
-    return workflow.compile()
\ No newline at end of file
+    return workflow.compile(checkpointer=checkpointer)
\ No newline at end of file
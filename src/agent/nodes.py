@@ -1,14 +1,21 @@
-from langchain_openai import ChatOpenAI
 import json
-from src.config import BASE_URL, API_KEY, MODEL_NAME
+from src.config import (
+    PARALLEL_TOOL_TESTING,
+    AGENT_CONTEXT_BUDGET_TOKENS, AGENT_CONTEXT_KEEP_RECENT, AGENT_CONTEXT_SUMMARY_TOKENS, AGENT_CONTEXT_LLM_SUMMARY,
+)
+from src.agent.context_manager import ContextManager, extractive_summary
 from src.agent.state import AgentState
 from src.memory.tool_memory import ToolMemory
 from src.logger import get_logger
 from src.utils.jupyter_sandbox import AgentSandbox
 from src.utils.code_parser import parse_tools_from_code
+from src.utils.llm_gateway import get_chat_model
+from src.utils.llm_stream import invoke_until, ainvoke_until, batch_until, abatch_until
+from src.utils.llm_cache import LLMCacheMiss
 import pprint
 from textwrap import dedent
 import re
+import asyncio
 import traceback
 
 logger = get_logger(__name__)
@@ -18,26 +25,48 @@ memory = ToolMemory()
 # TODO: tool reusability 향상
 # TODO: 이미 retrieve된 tool을 고치려 하는 경우가 있나? 고치는 게 맞나?
 
-# vLLM 연동
-llm = ChatOpenAI(
-    base_url=BASE_URL,
-    api_key=API_KEY,
-    model=MODEL_NAME,
-    temperature=1,
-    max_retries=2,
-    request_timeout=120,
+# 공유 LLM 게이트웨이 (커넥션 풀 / rate limiter / 응답 캐시)
+llm = get_chat_model("agent", temperature=1)
+
+
+def _summarize_context(entries, max_tokens):
+    """context_log의 오래된 항목 요약 (실패하면 LLM 없이 앞부분만 남김)"""
+    notes = "\n\n".join(f"- {e}" for e in entries)
+    prompt = (
+        f"Summarize the following notes from earlier steps of a data analysis plan in at most {max_tokens * 3 // 4} words.\n"
+        f"Keep every concrete number, variable name, column name, file name and conclusion. Drop repetition.\n\n"
+        f"{notes}"
+    )
+    try:
+        return llm.invoke(prompt).content
+    except LLMCacheMiss:
+        # replay 모드: 다른 요약으로 조용히 바꾸면 이후 프롬프트가 모두 달라지므로 그대로 올림
+        raise
+    except Exception as e:
+        logger.warning(f"⚠️ Context summary failed, falling back to truncation: {e}")
+        return extractive_summary(entries, max_tokens)
+
+
+# context_log를 프롬프트에 넣을 때 토큰 예산 안으로 (최근 항목은 그대로, 오래된 항목은 요약)
+context_manager = ContextManager(
+    budget_tokens=AGENT_CONTEXT_BUDGET_TOKENS,
+    keep_recent=AGENT_CONTEXT_KEEP_RECENT,
+    summary_tokens=AGENT_CONTEXT_SUMMARY_TOKENS,
+    summarize=_summarize_context if AGENT_CONTEXT_LLM_SUMMARY else None,
 )
 
 
-def grounding_node(state: AgentState, sandbox: AgentSandbox):
-    """Context Grounding: 실행 환경을 코드로 탐색하여 Planner에게 맥락을 제공한다."""
+# ----------------------------------------------------------------------
+# 노드별 프롬프트 / 결과 처리는 _helper로 분리해 sync 노드와 async 노드(*_async)가 공유
+# ----------------------------------------------------------------------
+def _grounding_prompt(state: AgentState):
     problem = state["problem"]
     work_dir = state.get("work_dir", "./")
 
     logger.info(f"🔍 Grounding: Exploring environment in {work_dir}...")
 
     # Step 1: LLM에게 탐색 코드 생성 요청
-    prompt = f"""You are an environment analyst. Before solving a problem, you need to understand the available resources.
+    return f"""You are an environment analyst. Before solving a problem, you need to understand the available resources.
 
 Given a problem description and a working directory, write Python code to explore and summarize the environment.
 
@@ -61,7 +90,9 @@ Given a problem description and a working directory, write Python code to explor
 ```
 """
 
-    response = llm.invoke(prompt).content
+
+def _grounding_code(state: AgentState, response):
+    work_dir = state.get("work_dir", "./")
 
     # 코드 추출
     code_match = re.search(r'```python(.*?)```', response, re.DOTALL)
@@ -77,10 +108,10 @@ for f in sorted(os.listdir('{work_dir}')):
     size = os.path.getsize(fpath) if os.path.isfile(fpath) else 'DIR'
     print(f"  {{f}} ({{size}})")
 """
+    return code
 
-    # Step 2: 코드 실행
-    result = sandbox.run_code(code, mode="permanent")
 
+def _grounding_update(result):
     grounding_context = ""
     if result["stdout"]:
         grounding_context = result["stdout"][:3000]  # 토큰 절약
@@ -96,7 +127,17 @@ for f in sorted(os.listdir('{work_dir}')):
     return {"grounding_context": grounding_context}
 
 
-def planner_node(state: AgentState):
+def grounding_node(state: AgentState, sandbox: AgentSandbox):
+    """Context Grounding: 실행 환경을 코드로 탐색하여 Planner에게 맥락을 제공한다."""
+    response = llm.invoke(_grounding_prompt(state)).content
+    code = _grounding_code(state, response)
+
+    # Step 2: 코드 실행
+    result = sandbox.run_code(code, mode="permanent")
+    return _grounding_update(result)
+
+
+def _planner_prompt(state: AgentState):
     logger.info(f"Planning task...")
 
 
@@ -199,24 +240,36 @@ Respond **strictly** in the following **JSON format**:
 ```
 """
     # prompt = dedent(prompt)
-    while True:
-        try:
-            grounding = state.get('grounding_context', 'No environment context available.')
-            filled = prompt.replace('===query===', state['problem']).replace('===grounding===', grounding)
-            plan = llm.invoke(filled).content
+    grounding = state.get('grounding_context', 'No environment context available.')
+    return prompt.replace('===query===', state['problem']).replace('===grounding===', grounding)
+
+
+def _parse_plan(plan):
+    if '```json' in plan:
+        plan = plan.split('```json')[1].split('```')[0]
+    return json.loads(plan)
 
-            if '```json' in plan:
-                plan = plan.split('```json')[1].split('```')[0]
 
-            plan = json.loads(plan)
+PLANNER_MAX_ATTEMPT = 5
+
+
+def planner_node(state: AgentState):
+    filled = _planner_prompt(state)
+    for attempt in range(PLANNER_MAX_ATTEMPT):
+        try:
+            plan = _parse_plan(llm.invoke(filled).content)
             break
-        except:
+        except LLMCacheMiss:
+            raise
+        except Exception:
             # try:
             #     plan = eval(plan)
             #     break
             # except:
             #     logger.error(f"{'='*20} [Plan Parse Error] {'='*20}\n")
             logger.error(f"{'='*20} [Plan Parse Error] {'='*20}\n")
+            if attempt == PLANNER_MAX_ATTEMPT - 1:
+                raise
 
     # print(f"\n{'='*20} [LLM RAW OUTPUT] {'='*20}")
     # pprint.pp(plan)
@@ -225,7 +278,8 @@ Respond **strictly** in the following **JSON format**:
     return {"plan": plan, "current_step_index": 0, "context_log": []}
 
 
-def tool_manager_node(state: AgentState):
+def _manager_precheck(state: AgentState):
+    """Reasoning 스텝이면 바로 결정 dict를, 아니면 None을 반환 (도구 검색 필요)"""
     plan = state['plan']
     idx = state['current_step_index']
     current_task = plan[idx]
@@ -239,23 +293,24 @@ def tool_manager_node(state: AgentState):
             "tool_generated": [],
             "decision": "reason"
         }
+    return None
 
-    # 1. 벡터 DB에서 검색
-    candidates = memory.search_tools(current_task['description'], k=5)
 
-    if not candidates:
-        logger.info("❌ No candidates found in DB.")
-        return {
-            "tool_retrieved": [],
-            "decision": "create"
-        }
+def _no_candidates_update():
+    logger.info("❌ No candidates found in DB.")
+    return {
+        "tool_retrieved": [],
+        "decision": "create"
+    }
+
 
+def _manager_prompt(current_task, candidates):
     candidates_info = "\n".join([
         f"[{i}] Name: {c['name']}\n    Description: {c['docstring']}\n    Code: {c['code']}"
         for i, c in enumerate(candidates)
     ])
 
-    prompt = (
+    return (
         f"You are a Tool Manager. Your goal is to decide whether tools are necessary or not, and if necessary, to reuse an existing tool or create a new one.\n\n"
         f"🎯 **Current Task**: {current_task['description']}\n"
         f"🔎 **Candidate Tools found in Memory**:\n"
@@ -269,7 +324,9 @@ def tool_manager_node(state: AgentState):
         f"Answer ONLY with the index number, 'CREATE' or 'NO TOOL'."
     )
 
-    response = llm.invoke(prompt).content.strip()
+
+def _manager_update(response, candidates):
+    response = response.strip()
 
     if response.upper() == "CREATE":
         logger.info("🤔 Candidates rejected. Creating new tool.")
@@ -300,9 +357,24 @@ def tool_manager_node(state: AgentState):
                 "tool_generated": [],
                 "decision": "create"
             }
+
+
+def tool_manager_node(state: AgentState):
+    update = _manager_precheck(state)
+    if update is not None:
+        return update
+    current_task = state['plan'][state['current_step_index']]
+
+    # 1. 벡터 DB에서 검색
+    candidates = memory.search_tools(current_task['description'], k=5)
+    if not candidates:
+        return _no_candidates_update()
+
+    response = llm.invoke(_manager_prompt(current_task, candidates)).content
+    return _manager_update(response, candidates)
     
 
-def tool_creator_node(state: AgentState):
+def _creator_prompt(state: AgentState):
     plan = state['plan']
     idx = state['current_step_index']
     current_task = plan[idx]
@@ -314,13 +386,7 @@ def tool_creator_node(state: AgentState):
         logger.info(f"🔧 Fixing tool based on {len(history)} past failures...")
         
         # 히스토리를 텍스트로 예쁘게 포맷팅
-        history_summary = ""
-        for item in history:
-            history_summary += f"=== ❌ ATTEMPT (Source: {item['source'].upper()}) ===\n"
-            history_summary += f"[Tool Code Used]:\n{item.get('tool_code', 'N/A')}\n\n"
-            history_summary += f"[Test/Exec Code]:\n{item.get('test_code') or item.get('execution_code')}\n\n"
-            history_summary += f"[Error Log]:\n{item['error_log']}\n"
-            history_summary += f"==========================================================\n"
+        history_summary = _format_feedback_history(history)
     
         prompt = f"""You are a Senior Python Data Engineer & Debugging Expert.
             Your goal is to fix a broken tool based on the provided error log.
@@ -331,7 +397,7 @@ def tool_creator_node(state: AgentState):
             {current_task}
             
             **Reasoning Context:**
-            {json.dumps(context_log, indent=2, default=str)}
+            {context_manager.render(context_log)}
 
             **Previous Attempts & Failures:**
             {history_summary}
@@ -398,7 +464,7 @@ def tool_creator_node(state: AgentState):
             f"Task to solve:\n"
             f"{json.dumps(current_task, indent=2)}\n\n"
             f"Context from previous reasoning steps:\n"
-            f"{json.dumps(context_log, indent=2, default=str)}\n\n"
+            f"{context_manager.render(context_log)}\n\n"
             f"Requirements:\n"
             f"1. Create a Python function for the task.\n"
             f"2. The function must be independent and self-contained.\n"
@@ -412,35 +478,38 @@ def tool_creator_node(state: AgentState):
             f"# your code\n"
             f"```"
         )
+    return prompt
+
+
+CREATOR_MAX_ATTEMPT = 3
+
+
+def _parse_tool(response):
+    """Creator 응답에서 (name, description, code) 추출. 형식이 맞지 않으면 ValueError"""
+    analysis_match = re.search(r"<analysis>(.*?)</analysis>", response, re.DOTALL)
+    desc_match = re.search(r"<description>(.*?)</description>", response, re.DOTALL)
+    func_match = re.search(r"<main_func>(.*?)</main_func>", response, re.DOTALL)
+    code_match = re.search(r"```python(.*?)```", response, re.DOTALL)
     
-    max_attempt = 3
-    for attempt in range(max_attempt):
-        try:
-            response = llm.invoke(prompt).content
+    if not desc_match or not func_match or not code_match:
+        raise ValueError("Failed to extract tool information")
+    
+    description = desc_match.group(1).strip()
+    name = func_match.group(1).strip()
+    code = code_match.group(1).strip()
+    return name, description, code
 
-            analysis_match = re.search(r"<analysis>(.*?)</analysis>", response, re.DOTALL)
-            desc_match = re.search(r"<description>(.*?)</description>", response, re.DOTALL)
-            func_match = re.search(r"<main_func>(.*?)</main_func>", response, re.DOTALL)
-            code_match = re.search(r"```python(.*?)```", response, re.DOTALL)
-            
-            if not desc_match or not func_match or not code_match:
-                raise ValueError("Failed to extract tool information")
-            
-            description = desc_match.group(1).strip()
-            name = func_match.group(1).strip()
-            code = code_match.group(1).strip()
 
-        except Exception as e:
-            if attempt == max_attempt - 1:
-                logger.error(f"Tool generation failed: {e}")
-                return {
-                    # decision?
-                    "tool_generated": [],
-                    "error": "Parsing Failed"
-                }
-            else:
-                continue
+def _creator_failed_update(e):
+    logger.error(f"Tool generation failed: {e}")
+    return {
+        # decision?
+        "tool_generated": [],
+        "error": "Parsing Failed"
+    }
 
+
+def _creator_update(name, description, code):
     logger.info(f"✅ Generated a new tool.")
     
     return {
@@ -454,13 +523,89 @@ def tool_creator_node(state: AgentState):
     }
 
 
+def tool_creator_node(state: AgentState):
+    prompt = _creator_prompt(state)
+
+    for attempt in range(CREATOR_MAX_ATTEMPT):
+        try:
+            name, description, code = _parse_tool(invoke_until(llm, prompt, "tool"))
+            break
+        except LLMCacheMiss:
+            raise
+        except Exception as e:
+            if attempt == CREATOR_MAX_ATTEMPT - 1:
+                return _creator_failed_update(e)
+
+    return _creator_update(name, description, code)
+
+
+
+def _format_feedback_history(history):
+    """feedback_history를 프롬프트용 텍스트로 포맷팅"""
+    history_summary = ""
+    for item in history:
+        history_summary += f"=== ❌ ATTEMPT (Source: {item['source'].upper()}) ===\n"
+        history_summary += f"[Tool Code Used]:\n{item.get('tool_code', 'N/A')}\n\n"
+        history_summary += f"[Test/Exec Code]:\n{item.get('test_code') or item.get('execution_code')}\n\n"
+        history_summary += f"[Error Log]:\n{item['error_log']}\n"
+        history_summary += f"==========================================================\n"
+    return history_summary
+
+
+def _build_test_prompt(tool, history_summary=""):
+    """도구 하나에 대한 유닛 테스트 생성 프롬프트"""
+    prompt = f"""
+        Write a Python Unit Test for the function: `{tool['name']}`.
+        The unit tests should test whether the function is logically correct as intended, not only the syntax.
+        Function Code:
+        {tool['code']}
+
+
+        REQUIREMENTS:
+        1. Create minimal dummy data to verify logic.
+        2. Use `assert` statements.
+        3. Include necessary imports.
+        4. Include the tool code as is. Just call the function and assert the result.
+        5. You MUST run the test with: `unittest.main(argv=[''], exit=False)`
+    """
+
+    if history_summary:
+        prompt += f"\n\nPrevious Attempts & Failures:\n{history_summary}"
+
+    prompt += """
+    
+        OUTPUT FORMAT:
+        <thought>rationale on the test case</thought>
+        ```python
+        # your code
+        ```
+        """
+
+    return dedent(prompt)
+
+
+def _extract_code_block(response):
+    if '```python' in response:
+        return response.split('```python')[1].split('```')[0]
+    elif '```' in response: # fallback
+        return response.split('```')[1].split('```')[0]
+    return response
+
+
+def _test_passed(result):
+    # unittest는 결과를 stderr에 출력하므로 "OK" 여부로 판정
+    if not result['stderr']:
+        return True
+    return "OK" in result['stderr'] and "FAILED" not in result['stderr']
+
 
 def tool_tester_node(state: AgentState, sandbox: AgentSandbox):
     tools = state['tool_generated']
     work_dir = state['work_dir']
     history = state.get("feedback_history", [])
     
-    logger.info(f"🧪 Starting Sequential Testing for {len(tools)} tools...")
+    mode = "Parallel" if PARALLEL_TOOL_TESTING else "Sequential"
+    logger.info(f"🧪 Starting {mode} Testing for {len(tools)} tools...")
     
     # ---------------------------------------------------------
     # 1단계: 모든 함수 정의(Definition) 로드
@@ -472,65 +617,22 @@ def tool_tester_node(state: AgentState, sandbox: AgentSandbox):
     def_result = sandbox.run_code(all_defs, mode="temporary")
     sandbox.cleanup_test_kernel()
     if def_result['stderr']:
-        logger.error(f"❌ Syntax Error in Definitions: {def_result['stderr']}")
-        return {
-            "error": f"Syntax Error during function definition:\n{def_result['stderr']}",
-            "decision": "retry_create"
-        }
+        return _definition_error_update(def_result)
+
+    history_summary = _format_feedback_history(history) if history else ""
+
+    if PARALLEL_TOOL_TESTING:
+        return _run_unit_tests_parallel(state, sandbox, tools, history_summary)
 
     # ---------------------------------------------------------
-    # 2단계: 하나씩 순회하며 유닛 테스트 실행
+    # 2단계: 하나씩 순회하며 유닛 테스트 실행 (첫 실패에서 바로 Creator로 반려)
     # ---------------------------------------------------------
-    failed_reports = []
-    max_attempt = 3
-
-    if history:
-        history_summary = ""
-        for item in history:
-            history_summary += f"=== ❌ ATTEMPT (Source: {item['source'].upper()}) ===\n"
-            history_summary += f"[Tool Code Used]:\n{item.get('tool_code', 'N/A')}\n\n"
-            history_summary += f"[Test/Exec Code]:\n{item.get('test_code') or item.get('execution_code')}\n\n"
-            history_summary += f"[Error Log]:\n{item['error_log']}\n"
-            history_summary += f"==========================================================\n"
-    
     for tool in tools:
         logger.info(f"   👉 Testing individual tool: {tool['name']}")
         
         # (A) 테스트 코드 생성 (이 도구 하나에만 집중)
-        prompt = f"""
-            Write a Python Unit Test for the function: `{tool['name']}`.
-            The unit tests should test whether the function is logically correct as intended, not only the syntax.
-            Function Code:
-            {tool['code']}
-
-
-            REQUIREMENTS:
-            1. Create minimal dummy data to verify logic.
-            2. Use `assert` statements.
-            3. Include necessary imports.
-            4. Include the tool code as is. Just call the function and assert the result.
-            5. You MUST run the test with: `unittest.main(argv=[''], exit=False)`
-        """
-
-        if history:
-            prompt += f"\n\nPrevious Attempts & Failures:\n{history_summary}"
-
-        prompt += """
-        
-            OUTPUT FORMAT:
-            <thought>rationale on the test case</thought>
-            ```python
-            # your code
-            ```
-            """
-        
-        prompt = dedent(prompt)
-        test_code = llm.invoke(prompt).content
-
-        if '```python' in test_code:
-            test_code = test_code.split('```python')[1].split('```')[0]
-        elif '```' in test_code: # fallback
-            test_code = test_code.split('```')[1].split('```')[0]
+        prompt = _build_test_prompt(tool, history_summary)
+        test_code = _extract_code_block(invoke_until(llm, prompt, "python_block"))
 
         # print(f"\n{'='*20} [LLM RAW OUTPUT] {'='*20}")
         # print(test_code)
@@ -541,71 +643,222 @@ def tool_tester_node(state: AgentState, sandbox: AgentSandbox):
             result = sandbox.run_code(test_code, mode="temporary")
             sandbox.cleanup_test_kernel()
         except Exception as e:
-            error_msg = traceback.format_exc()
-            logger.error(f"FATAL ERROR: {error_msg}")
-            return {
-                "decision": "retry_create",
-                "error": error_msg
-            }
+            return _tester_fatal_update()
         
         # (C) 결과 기록
-        if result['stderr']:
-            if "OK" in result['stderr'] and "FAILED" not in result['stderr']:
-                logger.info(f"      ✅ Passed: {tool['name']}")
-            else:
-                history = state.get("feedback_history", [])
-                current_feedback = {
-                    "source": "tester",
-                    "tool_code": tool['code'],
-                    "test_code": test_code,
-                    "error_log": result['stderr']
-                }
-
-                new_history = history + [current_feedback]
-
-                if len(new_history) > 3:
-                    new_history = new_history[-3:]
-
-                logger.warning(f"      ❌ Failed: {tool['name']}")
-
-                logger.debug(
-                    f"--- Tool: {tool['name']} ---\n"
-                    f"Error: {result['stderr']}\n"
-                    f"Test Code Used:\n{test_code}\n"
-                )
-                failed_reports.append(
-                    f"--- Tool: {tool['name']} ---\n"
-                    f"Error: {result['stderr']}\n"
-                    f"Test Code Used:\n{test_code}\n"
-                )
-
-                return {
-                    "decision": "retry_create",
-                    "feedback_history": new_history,
-                    "error": result['stderr']
-                }
-        else:
+        if _test_passed(result):
             logger.info(f"      ✅ Passed: {tool['name']}")
+        else:
+            return _tester_failure_update(state, tool, test_code, result)
 
     # ---------------------------------------------------------
-    # 3단계: 결과 취합 및 결정
+    # 3단계: 모두 통과
     # ---------------------------------------------------------
-    if failed_reports:
-        # 하나라도 실패하면 반려
-        error_summary = "\n".join(failed_reports)
-        return {
-            "error": f"Unit Tests Failed for the following tools:\n{error_summary}",
-            "decision": "retry_create",
-            # 실패 로그를 컨텍스트에 추가
-            "context_log": state['context_log'] + [f"Test Failures:\n{error_summary}"]
-        }
-    else:
-        # 모두 통과!
+    return {
+        "error": None,
+        "decision": "solve"
+    }
+
+
+def _definition_error_update(def_result):
+    logger.error(f"❌ Syntax Error in Definitions: {def_result['stderr']}")
+    return {
+        "error": f"Syntax Error during function definition:\n{def_result['stderr']}",
+        "decision": "retry_create"
+    }
+
+
+def _tester_fatal_update():
+    error_msg = traceback.format_exc()
+    logger.error(f"FATAL ERROR: {error_msg}")
+    return {
+        "decision": "retry_create",
+        "error": error_msg
+    }
+
+
+def _tester_failure_update(state, tool, test_code, result):
+    """[순차 모드] 도구 하나의 테스트 실패를 feedback_history에 기록하고 Creator로 반려"""
+    history = state.get("feedback_history", [])
+    current_feedback = {
+        "source": "tester",
+        "tool_code": tool['code'],
+        "test_code": test_code,
+        "error_log": result['stderr']
+    }
+
+    new_history = history + [current_feedback]
+
+    if len(new_history) > 3:
+        new_history = new_history[-3:]
+
+    logger.warning(f"      ❌ Failed: {tool['name']}")
+
+    logger.debug(
+        f"--- Tool: {tool['name']} ---\n"
+        f"Error: {result['stderr']}\n"
+        f"Test Code Used:\n{test_code}\n"
+    )
+
+    return {
+        "decision": "retry_create",
+        "feedback_history": new_history,
+        "error": result['stderr']
+    }
+
+
+def _run_unit_tests_parallel(state, sandbox, tools, history_summary):
+    """
+    [병렬 모드]
+    1. 모든 도구의 테스트 코드를 LLM에 동시에 요청 (llm.batch)
+    2. 격리된 커널 여러 개에서 동시에 실행 (sandbox.run_codes_async)
+    3. 모든 실패를 feedback_history 항목 하나로 묶어 Creator에게 한 번에 전달
+    """
+    prompts = [_build_test_prompt(tool, history_summary) for tool in tools]
+    responses = batch_until(llm, prompts, "python_block")
+    test_codes = [_extract_code_block(r) for r in responses]
+
+    try:
+        results = asyncio.run(sandbox.run_codes_async(test_codes, mode="temporary"))
+        sandbox.cleanup_test_kernel()
+    except Exception:
+        return _tester_fatal_update()
+
+    return _parallel_tests_update(state, tools, test_codes, results)
+
+
+def _parallel_tests_update(state, tools, test_codes, results):
+    failures = []
+    for tool, test_code, result in zip(tools, test_codes, results):
+        if _test_passed(result):
+            logger.info(f"      ✅ Passed: {tool['name']}")
+        else:
+            logger.warning(f"      ❌ Failed: {tool['name']}")
+            failures.append((tool, test_code, result['stderr']))
+
+    if not failures:
         return {
             "error": None,
             "decision": "solve"
         }
 
+    # 실패한 도구들을 하나의 피드백으로 통합
+    current_feedback = {
+        "source": "tester",
+        "tool_code": "\n\n".join(t['code'] for t, _, _ in failures),
+        "test_code": "\n\n".join(f"# --- Test for {t['name']} ---\n{code}" for t, code, _ in failures),
+        "error_log": "\n".join(f"--- Tool: {t['name']} ---\n{err}" for t, _, err in failures),
+    }
+
+    new_history = state.get("feedback_history", []) + [current_feedback]
+    if len(new_history) > 3:
+        new_history = new_history[-3:]
+
+    return {
+        "decision": "retry_create",
+        "feedback_history": new_history,
+        "error": current_feedback["error_log"]
+    }
+
+
+SOLVER_MAX_RETRIES = 3
+INSPECT_EXPR = "{k: type(v).__name__ for k, v in globals().items() if not k.startswith('_')}"
+
+
+def _solver_tools(state: AgentState):
+    tools = state.get("tool_generated", []) + state.get("tool_retrieved", [])
+    # 1. 정의 로드 (이미 Tester나 이전 단계에서 했겠지만 안전하게 다시)
+    all_defs = "\n\n".join([t['code'] for t in tools])
+    tool_desc = "\n".join([f"- {t['name']}: {t['docstring']}" for t in tools])
+    return all_defs, tool_desc
+
+
+def _solver_prompt(state: AgentState, tool_desc, temp_history):
+    current_task = state['plan'][state['current_step_index']]
+    inventory = state.get("variable_inventory", {})
+    context_log = state.get("context_log", [])
+
+    # 2. 실전 실행 코드 생성
+    prompt = (
+        f"Task: {current_task}\nTools:\n{tool_desc}\nVariables currently in memory: {inventory}\n"
+        f"Reasoning Context: {context_manager.render(context_log)}\n"
+        f"Write code to solve the task using real data variables.\n"
+        f"Save result to new variable."
+        f"Include necessary imports."
+    )
+
+    # solver 내부 loop; 이전 실패 로그 추가
+    if temp_history:
+        prompt += "\n\n🚫 PREVIOUS FAILED ATTEMPTS (LEARN FROM MISTAKES):\n"
+        for h in temp_history:
+            prompt += f"- Code:\n{h['exec_code']}\n"
+            prompt += f"- Error:\n{h['error']}\n\n"
+        prompt += "🚨 ERROR ANALYSIS: The tool code is fixed. Focus on fixing YOUR calling arguments or logic."
+    return prompt
+
+
+def _solver_attempt_failed(exec_code, res, temp_history):
+    logger.error(f"❌ Solver Execution Failed: {res['stderr']}")
+    logger.error(f"   Code used:\n{exec_code}")
+
+    temp_history.append({
+        "exec_code": exec_code,
+        "error": res['stderr']
+    })
+
+
+def _solver_failed_update(state: AgentState, all_defs, exec_code, res):
+    logger.error("Solver max retries exceeded")
+
+    history = state.get("feedback_history", [])
+    current_feedback = {
+        "source": "solver",
+        "tool_code": all_defs,
+        "execution_code": exec_code,
+        "error_log": res['stderr']
+    }
+
+    new_history = history + [current_feedback]
+
+    if len(new_history) > 3:
+        new_history = new_history[-3:]
+    
+    return {
+        "decision": "retry_create", 
+        "feedback_history": new_history,
+        "error": f"Runtime Error: {res['stderr']}"
+    }
+
+
+def _save_generated_tools(state: AgentState):
+    # 5. 성공 시 도구 저장 (생성된 경우만)
+    if state.get("tool_generated"):
+        for t in state.get("tool_generated"):
+            try:
+                memory.add_tool({
+                    "name":t['name'],
+                    "code":t['code'],
+                    "docstring":t['docstring']
+                })
+            except Exception as e:
+                logger.error(f"Failed to add tool to memory: {e}")
+
+
+def _solver_success_update(state: AgentState, new_inv, full_code):
+    # 6. 다음 스텝 판별
+    next_idx = state['current_step_index'] + 1
+    
+    return {
+        "decision": "continue", 
+        "current_step_index": next_idx, 
+        "variable_inventory": new_inv,
+        "executed_code": [full_code],
+        "tool_generated": [],
+        "tool_retrieved": [],
+        "feedback_history": [],
+        "error": None
+    }
+
 
 def solver_node(state: AgentState, sandbox: AgentSandbox):
     logger.info("Running solver...")
@@ -613,119 +866,52 @@ def solver_node(state: AgentState, sandbox: AgentSandbox):
     [Solver]
     실행 결과를 보고 다음 단계를 결정합니다.
     """
-    plan = state['plan']
-    current_idx = state['current_step_index']
-    current_task = plan[current_idx]
     inventory = state.get("variable_inventory", {})
     final_context = sandbox.get_final_context()
-    tools = state.get("tool_generated", []) + state.get("tool_retrieved", [])
-    context_log = state.get("context_log", [])
-    
-    # 1. 정의 로드 (이미 Tester나 이전 단계에서 했겠지만 안전하게 다시)
-    all_defs = "\n\n".join([t['code'] for t in tools])
-    tool_desc = "\n".join([f"- {t['name']}: {t['docstring']}" for t in tools])
-
-    max_retries = 3
+    all_defs, tool_desc = _solver_tools(state)
     temp_history = []
 
-    for attempt in range(max_retries):    
-        # 2. 실전 실행 코드 생성
-        prompt = (
-            f"Task: {current_task}\nTools:\n{tool_desc}\nVariables currently in memory: {inventory}\n"
-            f"Reasoning Context: {json.dumps(context_log, indent=2, default=str)}\n"
-            f"Write code to solve the task using real data variables.\n"
-            f"Save result to new variable."
-            f"Include necessary imports."
-        )
+    # 실패한 시도가 Main 커널에 남긴 부작용을 되돌리기 위한 체크포인트
+    has_checkpoint = sandbox.checkpoint_main("solver")
 
-        # solver 내부 loop; 이전 실패 로그 추가
-        if temp_history:
-            prompt += "\n\n🚫 PREVIOUS FAILED ATTEMPTS (LEARN FROM MISTAKES):\n"
-            for h in temp_history:
-                prompt += f"- Code:\n{h['exec_code']}\n"
-                prompt += f"- Error:\n{h['error']}\n\n"
-            prompt += "🚨 ERROR ANALYSIS: The tool code is fixed. Focus on fixing YOUR calling arguments or logic."
-
-        exec_code = llm.invoke(prompt).content
-
-        if '```python' in exec_code:
-            exec_code = exec_code.split('```python')[1].split('```')[0]
-        elif '```' in exec_code: # fallback
-            exec_code = exec_code.split('```')[1].split('```')[0]
+    for attempt in range(SOLVER_MAX_RETRIES):    
+        exec_code = _extract_code_block(invoke_until(llm, _solver_prompt(state, tool_desc, temp_history), "python_block"))
         
         # 3. 실행
         full_code = f"{all_defs}\n\n# Execution\n{exec_code}"
         res = sandbox.run_code(full_code, mode="permanent")
     
         if res['stderr']:
-            logger.error(f"❌ Solver Execution Failed: {res['stderr']}")
-            logger.error(f"   Code used:\n{exec_code}")
-
-            temp_history.append({
-                "exec_code": exec_code,
-                "error": res['stderr']
-            })
-
-            if attempt == max_retries - 1:
-                logger.error("Solver max retries exceeded")
-
-                history = state.get("feedback_history", [])
-                current_feedback = {
-                    "source": "solver",
-                    "tool_code": all_defs,
-                    "execution_code": exec_code,
-                    "error_log": res['stderr']
-                }
-
-                new_history = history + [current_feedback]
-
-                if len(new_history) > 3:
-                    new_history = new_history[-3:]
-                
-                return {
-                    "decision": "retry_create", 
-                    "feedback_history": new_history,
-                    "error": f"Runtime Error: {res['stderr']}"
-                }
+            _solver_attempt_failed(exec_code, res, temp_history)
+
+            # 커널이 재시작됐으면 체크포인트도 함께 사라졌으므로 롤백할 수 없음
+            if res.get("restarted"):
+                has_checkpoint = False
+            # 데이터 재로드 없이 스텝 시작 시점 상태로 롤백
+            if has_checkpoint:
+                sandbox.restore_main("solver")
+
+            if attempt == SOLVER_MAX_RETRIES - 1:
+                if has_checkpoint:
+                    sandbox.drop_main_checkpoint("solver")
+                return _solver_failed_update(state, all_defs, exec_code, res)
             
             continue
         
         # 4. 변수 업데이트 (Inspection)
         logger.info("✅Solver Execution Succeeded")
-        inspect_code = "import json; print(json.dumps({k:type(v).__name__ for k,v in globals().items() if not k.startswith('_')}))"
-        try:
-            insp_res = sandbox.run_code(inspect_code, mode="permanent")
-            new_inv = json.loads(insp_res['stdout'])
-        except:
+        # 스텝이 끝났으니 체크포인트는 버림 (남겨 두면 스냅샷이 커널 메모리 / spill 파일을 계속 차지)
+        if has_checkpoint:
+            sandbox.drop_main_checkpoint("solver")
+        new_inv = sandbox.inspect_main(INSPECT_EXPR)
+        if new_inv is None:
             new_inv = inventory
 
-        # 5. 성공 시 도구 저장 (생성된 경우만)
-        if state.get("tool_generated"):
-            for t in state.get("tool_generated"):
-                try:
-                    memory.add_tool({
-                        "name":t['name'],
-                        "code":t['code'],
-                        "docstring":t['docstring']
-                    })
-                except Exception as e:
-                    logger.error(f"Failed to add tool to memory: {e}")
-
-        # 6. 다음 스텝 판별
-        next_idx = state['current_step_index'] + 1
-        
-        return {
-            "decision": "continue", 
-            "current_step_index": next_idx, 
-            "variable_inventory": new_inv,
-            "tool_generated": [],
-            "tool_retrieved": [],
-            "feedback_history": [],
-            "error": None
-        }
+        _save_generated_tools(state)
+        return _solver_success_update(state, new_inv, full_code)
 
 
-def reasoner_node(state: AgentState):
+def _reasoner_prompt(state: AgentState):
     plan = state['plan']
     idx = state['current_step_index']
     current_task = plan[idx]
@@ -745,35 +931,40 @@ def reasoner_node(state: AgentState):
     {json.dumps(inventory, indent=2, default=str)}
 
     ### Previous Reasoning/Context:
-    {json.dumps(context_log, indent=2, default=str)}
+    {context_manager.render(context_log)}
 
     ---
     Based on the above, provide the result or conclusion for the current task.
     Be concise and specific.
     If you calculate a value, state it clearly.
     """
+    return prompt
 
-    response = llm.invoke(prompt).content
-    logger.info(f"💡 Reasoning Result: {response}")
 
-    # Log update
-    new_log = context_log + [f"Step {idx+1} [Reasoning]: {response}"]
+def _reasoner_update(state: AgentState, response):
+    idx = state['current_step_index']
+    logger.info(f"💡 Reasoning Result: {response}")
 
     return {
         "decision": "continue",
         "current_step_index": idx + 1,
-        "context_log": new_log,
+        # operator.add reducer라 새 항목만 반환 (기존 로그를 다시 붙이면 매 단계 중복됨)
+        "context_log": [f"Step {idx+1} [Reasoning]: {response}"],
         "tool_generated": [],
         "tool_retrieved": [],
         "error": None
     }
 
 
-def final_answer_node(state: AgentState, sandbox: AgentSandbox):
+def reasoner_node(state: AgentState):
+    response = llm.invoke(_reasoner_prompt(state)).content
+    return _reasoner_update(state, response)
+
+
+def _final_answer_prompt(state: AgentState, final_context):
     query = state['problem']
     inventory = state['variable_inventory'] # Solver들이 열심히 모은 결과값들
     context_log = state.get("context_log", [])
-    final_context = sandbox.get_final_context()
     
     logger.info("🏁 Generating Final Answer...")
 
@@ -785,7 +976,7 @@ def final_answer_node(state: AgentState, sandbox: AgentSandbox):
         f"Here are the collected variables and their values:\n"
         f"{json.dumps(final_context, indent=2, default=str)}\n\n"
         f"Here is the reasoning log from non-coding steps:\n"
-        f"{json.dumps(context_log, indent=2, default=str)}\n\n"
+        f"{context_manager.render(context_log)}\n\n"
         f"MISSION:\n"
         f"1. Synthesize the information from the variables AND reasoning log to answer the Original Question.\n"
         f"2. Be direct and concise.\n"
@@ -807,7 +998,7 @@ def final_answer_node(state: AgentState, sandbox: AgentSandbox):
                 {json.dumps(final_context, indent=2, default=str)}
 
                 ## Here is the reasoning log from non-coding steps:
-                {json.dumps(context_log, indent=2, default=str)}
+                {context_manager.render(context_log)}
 
                 ## Reasoning:
                 <Your step-by-step explanation>
@@ -816,10 +1007,167 @@ def final_answer_node(state: AgentState, sandbox: AgentSandbox):
                 <Your answer>
             """
     
-    prompt = dedent(prompt)
-    
-    response = llm.invoke(prompt).content
+    return dedent(prompt)
+
+
+def final_answer_node(state: AgentState, sandbox: AgentSandbox):
+    final_context = sandbox.get_final_context()
+    response = llm.invoke(_final_answer_prompt(state, final_context)).content
 
     print(response)
     
-    return {"final_answer": response}
\ No newline at end of file
+    return {"final_answer": response}
+
+# ----------------------------------------------------------------------
+# async 노드 (build_graph(async_nodes=True) + app.ainvoke 용)
+# 프롬프트/결과 처리는 위 sync 노드와 같은 헬퍼를 쓰고, LLM은 ainvoke, 코드는 run_code_async로 실행.
+# 블로킹 호출(벡터 DB, 커널 체크포인트)은 스레드로 넘겨 이벤트 루프가 다른 태스크를 계속 진행하게 함
+# ----------------------------------------------------------------------
+async def grounding_node_async(state: AgentState, sandbox: AgentSandbox):
+    response = (await llm.ainvoke(_grounding_prompt(state))).content
+    code = _grounding_code(state, response)
+    result = await sandbox.run_code_async(code, mode="permanent")
+    return _grounding_update(result)
+
+
+async def planner_node_async(state: AgentState):
+    filled = _planner_prompt(state)
+    for attempt in range(PLANNER_MAX_ATTEMPT):
+        try:
+            plan = _parse_plan((await llm.ainvoke(filled)).content)
+            break
+        except LLMCacheMiss:
+            raise
+        except Exception:
+            logger.error(f"{'='*20} [Plan Parse Error] {'='*20}\n")
+            if attempt == PLANNER_MAX_ATTEMPT - 1:
+                raise
+    return {"plan": plan, "current_step_index": 0, "context_log": []}
+
+
+async def tool_manager_node_async(state: AgentState):
+    update = _manager_precheck(state)
+    if update is not None:
+        return update
+    current_task = state['plan'][state['current_step_index']]
+
+    candidates = await asyncio.to_thread(memory.search_tools, current_task['description'], k=5)
+    if not candidates:
+        return _no_candidates_update()
+
+    response = (await llm.ainvoke(_manager_prompt(current_task, candidates))).content
+    return _manager_update(response, candidates)
+
+
+async def tool_creator_node_async(state: AgentState):
+    await context_manager.aprepare(state.get("context_log", []))
+    prompt = _creator_prompt(state)
+
+    for attempt in range(CREATOR_MAX_ATTEMPT):
+        try:
+            name, description, code = _parse_tool(await ainvoke_until(llm, prompt, "tool"))
+            break
+        except LLMCacheMiss:
+            raise
+        except Exception as e:
+            if attempt == CREATOR_MAX_ATTEMPT - 1:
+                return _creator_failed_update(e)
+
+    return _creator_update(name, description, code)
+
+
+async def tool_tester_node_async(state: AgentState, sandbox: AgentSandbox):
+    tools = state['tool_generated']
+    history = state.get("feedback_history", [])
+
+    mode = "Parallel" if PARALLEL_TOOL_TESTING else "Sequential"
+    logger.info(f"🧪 Starting {mode} Testing for {len(tools)} tools (async)...")
+
+    all_defs = "\n\n".join([t['code'] for t in tools])
+    def_result = await sandbox.run_code_async(all_defs, mode="temporary")
+    # sync 버전과 같이 테스트마다 Tester 폴더 / 커널 정리 (이전 테스트가 쓴 파일이 다음 테스트에 보이지 않도록)
+    await asyncio.to_thread(sandbox.cleanup_test_kernel)
+    if def_result['stderr']:
+        return _definition_error_update(def_result)
+
+    history_summary = _format_feedback_history(history) if history else ""
+
+    if PARALLEL_TOOL_TESTING:
+        prompts = [_build_test_prompt(tool, history_summary) for tool in tools]
+        responses = await abatch_until(llm, prompts, "python_block")
+        test_codes = [_extract_code_block(r) for r in responses]
+        try:
+            results = await sandbox.run_codes_async(test_codes, mode="temporary")
+            await asyncio.to_thread(sandbox.cleanup_test_kernel)
+        except Exception:
+            return _tester_fatal_update()
+        return _parallel_tests_update(state, tools, test_codes, results)
+
+    for tool in tools:
+        logger.info(f"   👉 Testing individual tool: {tool['name']}")
+        test_code = _extract_code_block(await ainvoke_until(llm, _build_test_prompt(tool, history_summary), "python_block"))
+        try:
+            result = await sandbox.run_code_async(test_code, mode="temporary")
+            await asyncio.to_thread(sandbox.cleanup_test_kernel)
+        except Exception:
+            return _tester_fatal_update()
+        if not _test_passed(result):
+            return _tester_failure_update(state, tool, test_code, result)
+        logger.info(f"      ✅ Passed: {tool['name']}")
+
+    return {
+        "error": None,
+        "decision": "solve"
+    }
+
+
+async def solver_node_async(state: AgentState, sandbox: AgentSandbox):
+    logger.info("Running solver (async)...")
+    await context_manager.aprepare(state.get("context_log", []))
+    inventory = state.get("variable_inventory", {})
+    all_defs, tool_desc = _solver_tools(state)
+    temp_history = []
+
+    has_checkpoint = await asyncio.to_thread(sandbox.checkpoint_main, "solver")
+
+    for attempt in range(SOLVER_MAX_RETRIES):
+        response = await ainvoke_until(llm, _solver_prompt(state, tool_desc, temp_history), "python_block")
+        exec_code = _extract_code_block(response)
+
+        full_code = f"{all_defs}\n\n# Execution\n{exec_code}"
+        res = await sandbox.run_code_async(full_code, mode="permanent")
+
+        if res['stderr']:
+            _solver_attempt_failed(exec_code, res, temp_history)
+            if res.get("restarted"):
+                has_checkpoint = False
+            if has_checkpoint:
+                await asyncio.to_thread(sandbox.restore_main, "solver")
+            if attempt == SOLVER_MAX_RETRIES - 1:
+                if has_checkpoint:
+                    await asyncio.to_thread(sandbox.drop_main_checkpoint, "solver")
+                return _solver_failed_update(state, all_defs, exec_code, res)
+            continue
+
+        logger.info("✅Solver Execution Succeeded")
+        if has_checkpoint:
+            await asyncio.to_thread(sandbox.drop_main_checkpoint, "solver")
+        new_inv = await sandbox.inspect_main_async(INSPECT_EXPR)
+        if new_inv is None:
+            new_inv = inventory
+
+        await asyncio.to_thread(_save_generated_tools, state)
+        return _solver_success_update(state, new_inv, full_code)
+
+
+async def reasoner_node_async(state: AgentState):
+    await context_manager.aprepare(state.get("context_log", []))
+    response = (await llm.ainvoke(_reasoner_prompt(state))).content
+    return _reasoner_update(state, response)
+
+
+async def final_answer_node_async(state: AgentState, sandbox: AgentSandbox):
+    await context_manager.aprepare(state.get("context_log", []))
+    final_context = await asyncio.to_thread(sandbox.get_final_context)
+    response = (await llm.ainvoke(_final_answer_prompt(state, final_context))).content
+    return {"final_answer": response}
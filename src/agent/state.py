@@ -17,6 +17,7 @@ class AgentState(TypedDict):
     tool_generated: List[Dict[str, str]]
     tool_retrieved: List[Dict[str, str]]
     feedback_history: List[Dict[str, Any]]
+    executed_code: Annotated[List[str], operator.add]  # Main 커널에서 성공한 Solver 코드 (체크포인트 재개 시 커널 복구용)
     
     # --- Output/Eval ---
     final_answer: Optional[str] # 최종 답변 (Analysis용)
@@ -8,6 +8,11 @@ DB_DIR = os.path.join(BASE_DIR, "data", "tool_db")
 DATASET_DIR = os.path.join(BASE_DIR, "data", "dataset")
 RESULT_DIR = os.path.join(BASE_DIR, "data", "result")
 TEST_DIR = os.path.join(BASE_DIR, "test_env")
+SHARED_DATA_DIR = os.path.join(BASE_DIR, "data", "shared_cache")  # 파싱된 데이터 파일 캐시 (Arrow/pickle)
+GRAPH_CHECKPOINT_DB = os.path.join(BASE_DIR, "data", "checkpoints.db")  # LangGraph 상태 체크포인트 (태스크 중간 재개용)
+MATH_PARSE_CACHE_DB = os.path.join(BASE_DIR, "data", "math_parse_cache.db")  # 채점용 답 파싱 결과 캐시
+LLM_CACHE_DB = os.path.join(BASE_DIR, "data", "llm_cache.db")  # LLM 응답 캐시 (모든 노드 공유)
+LLM_LEDGER_DIR = os.path.join(BASE_DIR, "data", "llm_ledger")  # 실행별 LLM 호출 장부 (CSV + 노드별 요약 JSON)
 
 # 디렉토리 자동 생성
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -25,4 +30,60 @@ load_dotenv(os.path.join(BASE_DIR, ".env"))
 BASE_URL = "https://openrouter.ai/api/v1"
 API_KEY = os.environ.get("OPENROUTER_API_KEY")
 # MODEL_NAME = "meta-llama/llama-3.3-70b-instruct"
-MODEL_NAME = "google/gemini-2.5-flash"
\ No newline at end of file
+MODEL_NAME = "google/gemini-2.5-flash"
+
+# 샌드박스 설정
+KERNEL_POOL_SIZE = 4  # 미리 띄워둘 Jupyter 커널 수 (샌드박스당 main+tester 2개, tester는 테스트마다 교체)
+TEST_ISOLATION = "reset"  # Tester 커널 격리 방식: "reset" (네임스페이스 초기화) | "restart" (프로세스 재시작)
+TEST_BACKEND = "kernel"  # Tester 실행 백엔드: "kernel" (Jupyter) | "forkserver" (zygote fork, 무거운 라이브러리 preload)
+FORK_SERVER_PRELOAD = ["numpy", "pandas", "sympy", "sklearn"]  # forkserver zygote가 미리 import할 모듈
+# 실행 출력 제한: head/tail만 보관하고 중간은 버림, 전체 출력이 MAX_OUTPUT_CHARS를 넘으면 interrupt
+OUTPUT_HEAD_CHARS = 20000
+OUTPUT_TAIL_CHARS = 20000
+MAX_OUTPUT_CHARS = 10_000_000
+# 실행 1회당 자원 예산 (None이면 제한 없음). 넘으면 커널을 interrupt
+EXEC_WALL_S = 600        # 총 실행 시간 (초)
+EXEC_CPU_S = None        # 커널 프로세스 CPU 시간 (초)
+EXEC_RSS_MB = None       # 커널 프로세스 RSS 상한 (MB)
+KERNEL_MEMORY_LIMIT_MB = None  # 커널 프로세스 RLIMIT_AS (하드 상한, MB)
+# Solver 체크포인트 저장 위치: None이면 커널 메모리, 경로를 주면 해당 폴더(tmpfs 권장)에 pickle 파일로 저장
+CHECKPOINT_SPILL_DIR = None  # 예: "/dev/shm/toolgen_ckpt"
+# 체크포인트 / 복구 코드가 출력 없이 기다릴 수 있는 시간 (초). 큰 변수를 pickle하는 동안은 출력이 없음
+CHECKPOINT_TIMEOUT_S = 600
+SHARE_DATA = True  # 작업 폴더의 CSV/Excel을 한 번만 파싱해 Main/Tester 커널이 memory map으로 공유
+
+# LLM 게이트웨이 (src/utils/llm_gateway.py, 프로세스 전체 공유, 동시 실행 러너에서 429 방지). None이면 제한 없음
+LLM_REQUESTS_PER_SECOND = 8     # 429를 받으면 자동으로 낮췄다가 성공이 이어지면 이 값까지 회복
+LLM_MAX_BURST = 16
+LLM_TOKENS_PER_MINUTE = None    # 분당 토큰 (prompt + completion) 상한
+LLM_MAX_RETRIES = 5             # 429 / 5xx 재시도 횟수 (Retry-After 존중)
+LLM_REQUEST_TIMEOUT = 120
+LLM_HTTP_MAX_CONNECTIONS = 64   # 공유 keep-alive 커넥션 풀 크기
+LLM_HTTP_MAX_KEEPALIVE = 32
+# 모델별 단가 (USD / 1M 토큰, (prompt, completion)). 있으면 LLM 호출 장부에 비용도 기록
+LLM_PRICES_PER_MTOK = {}  # 예: {"google/gemini-2.5-flash": (0.30, 2.50)}
+# LLM 응답 캐시: "off" | "readwrite" (없으면 호출 후 저장) | "replay" (캐시에 없으면 에러, 네트워크 호출 없음)
+# 새 샘플이 필요하면 LLM_CACHE_MODE=off, 디버깅 재현은 LLM_CACHE_MODE=replay 로 실행
+LLM_CACHE_MODE = os.environ.get("LLM_CACHE_MODE", "readwrite")
+LLM_CACHE_MAX_MB = 2048  # 저장된 응답 크기 합의 상한 (넘으면 오래 안 쓴 것부터 삭제)
+# 코드를 만드는 호출(code_verifier, Solver, Tester, Creator)은 스트리밍으로 받고 코드 블록 / 태그가 닫히면 생성을 멈춤
+LLM_EARLY_STOP = True
+
+# 동시 실행 러너 설정
+PIPELINE_CONCURRENCY = 8  # reasoning_pipeline.py에서 동시에 푸는 문제 수 (문제마다 별도 샌드박스)
+PIPELINE_ASYNC_CONCURRENCY = 32  # reasoning_pipeline.py --async: 한 프로세스의 이벤트 루프에서 동시에 진행하는 문제 수
+SELF_CONSISTENCY_K = 5  # reasoning_pipeline.py --self-consistency (값 생략 시): 동시에 샘플링하는 CoT/검증 코드 branch 수
+RULE_CHECK_TIMEOUT_S = 10  # reasoning_pipeline.py --async: 문제마다 규칙 기반 정답 확인(sympy) 시간 상한, 넘으면 판정 불가(None)
+DSBENCH_WORKERS = 4  # main.py에서 task 폴더 그룹을 나눠 실행할 워커 프로세스 수
+
+# 에이전트 설정
+PARALLEL_TOOL_TESTING = True  # Tester: 모든 도구의 테스트를 동시에 생성/실행하고 실패를 한 번에 보고
+# context_log를 프롬프트에 넣을 때의 토큰 예산 (최근 항목은 그대로, 오래된 항목은 요약 하나로 접음)
+AGENT_CONTEXT_BUDGET_TOKENS = 2000
+AGENT_CONTEXT_KEEP_RECENT = 4      # 그대로 남길 최근 항목 수
+AGENT_CONTEXT_SUMMARY_TOKENS = 400
+AGENT_CONTEXT_LLM_SUMMARY = True   # False면 LLM 호출 없이 오래된 항목의 앞부분만 남김
+
+# 채점 설정
+GRADER_CONCURRENCY = 16  # grade_math / grade_reasoning: 규칙으로 판정하지 못한 답의 LLM judge 동시 호출 수
+MATH_PARSE_CACHE_SIZE = 100_000  # 파싱 캐시에 남길 최대 답 수 (넘으면 오래 안 쓴 것부터 삭제)
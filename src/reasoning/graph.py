@@ -1,11 +1,14 @@
 from langgraph.graph import StateGraph, END
-from functools import partial
+from src.utils.graph_runtime import with_sandbox
 from src.reasoning.state import ReasoningState
-from src.reasoning.nodes import cot_reasoner, code_verifier, judge
-from src.utils.jupyter_sandbox import AgentSandbox
+from src.reasoning.nodes import (
+    cot_reasoner, code_verifier, judge,
+    cot_reasoner_async, code_verifier_async, judge_async,
+    self_consistency, self_consistency_async,
+)
 
 
-def build_reasoning_graph(sandbox: AgentSandbox):
+def build_reasoning_graph(checkpointer=None, async_nodes=False, self_consistency_k=0):
     """
     Reason → Code Verify → Judge 파이프라인을 구축한다.
 
@@ -13,16 +16,51 @@ def build_reasoning_graph(sandbox: AgentSandbox):
         cot_reasoner → code_verifier → judge
               ↑                          |
               └── (불일치 시 재시도) ←───┘
+
+    self_consistency_k > 1이면 첫 단계를 self_consistency 노드로 바꾼다
+    (CoT k개 + 검증 코드 k개를 동시에 실행해 다수결, 합의가 없을 때만 judge로):
+        self_consistency ─(합의)→ END
+              └─(합의 없음)→ judge → (불일치 시) cot_reasoner → code_verifier → judge
+
+    그래프는 프로세스당 한 번 compile해서 재사용하고, 샌드박스는 invoke 시 sandbox_config(sandbox)로 넘긴다.
+    checkpointer를 주면 노드마다 상태가 저장되어 중단된 문제를 이어서 실행할 수 있다.
+    async_nodes=True면 async 노드로 구성되어 app.ainvoke로만 실행한다 (checkpointer도 async 지원 필요).
     """
     workflow = StateGraph(ReasoningState)
 
     # 노드 등록
-    workflow.add_node("cot_reasoner", cot_reasoner)
-    workflow.add_node("code_verifier", partial(code_verifier, sandbox=sandbox))
-    workflow.add_node("judge", judge)
+    if async_nodes:
+        workflow.add_node("cot_reasoner", cot_reasoner_async)
+        workflow.add_node("code_verifier", with_sandbox(code_verifier_async))
+        workflow.add_node("judge", judge_async)
+    else:
+        workflow.add_node("cot_reasoner", cot_reasoner)
+        workflow.add_node("code_verifier", with_sandbox(code_verifier))
+        workflow.add_node("judge", judge)
+
+    if self_consistency_k > 1:
+        sampler = self_consistency_async if async_nodes else self_consistency
+        if async_nodes:
+            async def self_consistency_node(state, sandbox):
+                return await sampler(state, sandbox, k=self_consistency_k)
+        else:
+            def self_consistency_node(state, sandbox):
+                return sampler(state, sandbox, k=self_consistency_k)
+        workflow.add_node("self_consistency", with_sandbox(self_consistency_node))
 
     # 엣지 연결
-    workflow.set_entry_point("cot_reasoner")
+    if self_consistency_k > 1:
+        workflow.set_entry_point("self_consistency")
+        workflow.add_conditional_edges(
+            "self_consistency",
+            lambda state: "end" if state.get("verified", False) else "judge",
+            {
+                "end": END,
+                "judge": "judge",
+            }
+        )
+    else:
+        workflow.set_entry_point("cot_reasoner")
     workflow.add_edge("cot_reasoner", "code_verifier")
     workflow.add_edge("code_verifier", "judge")
 
@@ -42,4 +80,4 @@ def build_reasoning_graph(sandbox: AgentSandbox):
         }
     )
 
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
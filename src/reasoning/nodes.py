@@ -1,34 +1,53 @@
-from langchain_openai import ChatOpenAI
 import json
 import re
-from src.config import BASE_URL, API_KEY, MODEL_NAME
+import asyncio
+import threading
+from src.config import SELF_CONSISTENCY_K
 from src.reasoning.state import ReasoningState
 from src.logger import get_logger
 from src.utils.jupyter_sandbox import AgentSandbox
+from src.utils.llm_gateway import get_chat_model
+from src.utils.llm_stream import invoke_until, ainvoke_until, batch_until
+from src.utils.math_equivalence import is_equivalent, group_equivalent, normalize_answer, is_plain_number
 
 logger = get_logger(__name__)
 
-llm = ChatOpenAI(
-    base_url=BASE_URL,
-    api_key=API_KEY,
-    model=MODEL_NAME,
+_llm_kwargs = dict(
     temperature=0.7,
-    max_retries=2,
-    request_timeout=120,
     model_kwargs={
         "extra_body": {
             "reasoning": {"effort": "none"}
         }
     },
 )
+llm = get_chat_model("reasoning", **_llm_kwargs)
+# Judge는 짧은 호출이므로 긴 CoT 호출 뒤에 줄 서지 않도록 high lane
+judge_llm = get_chat_model("reasoning.judge", lane="high", **_llm_kwargs)
 
 
-def cot_reasoner(state: ReasoningState):
-    """
-    Step 1: CoT 추론
-    LLM에게 문제를 단계별로 풀게 한다.
-    재시도 시에는 이전 코드 검증 결과를 힌트로 제공한다.
-    """
+# Judge 판정 방법 통계 (프로세스 전체, 동시 실행 러너에서 공유)
+_judge_stats = {"fast_path": 0, "llm": 0}
+_judge_stats_lock = threading.Lock()
+
+
+def _count_judge(method):
+    with _judge_stats_lock:
+        _judge_stats[method] += 1
+
+
+def judge_report():
+    """Judge가 LLM 없이(fast path) 판정한 비율"""
+    with _judge_stats_lock:
+        stats = dict(_judge_stats)
+    total = stats["fast_path"] + stats["llm"]
+    stats["fast_path_share"] = round(stats["fast_path"] / total, 3) if total else 0.0
+    return stats
+
+
+# ----------------------------------------------------------------------
+# 노드별 프롬프트 / 결과 처리 (sync, async 노드가 공유)
+# ----------------------------------------------------------------------
+def _cot_prompt(state: ReasoningState):
     problem = state["problem"]
     attempt = state.get("attempt", 0)
 
@@ -71,29 +90,32 @@ def cot_reasoner(state: ReasoningState):
 
 ## Corrected Solution:
 """
-
-    response = llm.invoke(prompt).content
+    return prompt
+
+
+def _extract_boxed(text):
+    """\boxed{} 안의 내용을 추출. 중첩 중괄호도 처리."""
+    results = []
+    for m in re.finditer(r'\\boxed\{', text):
+        start = m.end()
+        depth = 1
+        i = start
+        while i < len(text) and depth > 0:
+            if text[i] == '{':
+                depth += 1
+            elif text[i] == '}':
+                depth -= 1
+            i += 1
+        if depth == 0:
+            results.append(text[start:i-1])
+    return results
+
+
+def _cot_update(state: ReasoningState, response):
     logger.info(f"   CoT output length: {len(response)} chars")
 
     # boxed answer 추출 (nested braces 처리)
-    def extract_boxed(text):
-        """\boxed{} 안의 내용을 추출. 중첩 중괄호도 처리."""
-        results = []
-        for m in re.finditer(r'\\boxed\{', text):
-            start = m.end()
-            depth = 1
-            i = start
-            while i < len(text) and depth > 0:
-                if text[i] == '{':
-                    depth += 1
-                elif text[i] == '}':
-                    depth -= 1
-                i += 1
-            if depth == 0:
-                results.append(text[start:i-1])
-        return results
-
-    boxed_match = extract_boxed(response)
+    boxed_match = _extract_boxed(response)
     cot_answer = boxed_match[-1] if boxed_match else ""
 
     if not cot_answer:
@@ -106,15 +128,11 @@ def cot_reasoner(state: ReasoningState):
     return {
         "cot_reasoning": response,
         "cot_answer": cot_answer,
-        "attempt": attempt + 1,
+        "attempt": state.get("attempt", 0) + 1,
     }
 
 
-def code_verifier(state: ReasoningState, sandbox: AgentSandbox):
-    """
-    Step 2: 코드 검증
-    CoT 추론 결과를 검증하는 Python 코드를 생성하고 실행한다.
-    """
+def _verifier_prompt(state: ReasoningState):
     problem = state["problem"]
     cot_reasoning = state["cot_reasoning"]
     cot_answer = state["cot_answer"]
@@ -143,9 +161,10 @@ def code_verifier(state: ReasoningState, sandbox: AgentSandbox):
 # Your verification code here
 ```
 """
+    return prompt
 
-    response = llm.invoke(prompt).content
 
+def _extract_verifier_code(response):
     # 코드 추출
     code_match = re.search(r'```python(.*?)```', response, re.DOTALL)
     if code_match:
@@ -155,43 +174,39 @@ def code_verifier(state: ReasoningState, sandbox: AgentSandbox):
         code = response.strip()
 
     logger.info(f"   Code length: {len(code)} chars")
+    return code
 
-    # 코드 실행
-    try:
-        result = sandbox.run_code(code, mode="temporary")
-        sandbox.cleanup_test_kernel()
-
-        if result["stderr"]:
-            logger.warning(f"   ⚠️ Code Error: {result['stderr'][:200]}")
-            return {
-                "code": code,
-                "code_result": "",
-                "code_error": result["stderr"],
-            }
-
-        code_result = result["stdout"].strip()
-        logger.info(f"   Code Result: {code_result}")
 
-        return {
-            "code": code,
-            "code_result": code_result,
-            "code_error": None,
-        }
-
-    except Exception as e:
-        logger.error(f"   ❌ Code execution failed: {e}")
+def _verifier_update(code, result):
+    if result["stderr"]:
+        logger.warning(f"   ⚠️ Code Error: {result['stderr'][:200]}")
         return {
             "code": code,
             "code_result": "",
-            "code_error": str(e),
+            "code_error": result["stderr"],
         }
 
+    code_result = result["stdout"].strip()
+    logger.info(f"   Code Result: {code_result}")
 
-def judge(state: ReasoningState):
-    """
-    Step 3: Judge
-    CoT 답과 코드 결과를 비교하여 최종 답을 결정한다.
-    """
+    return {
+        "code": code,
+        "code_result": code_result,
+        "code_error": None,
+    }
+
+
+def _verifier_error(code, e):
+    logger.error(f"   ❌ Code execution failed: {e}")
+    return {
+        "code": code,
+        "code_result": "",
+        "code_error": str(e),
+    }
+
+
+def _judge_shortcut(state: ReasoningState):
+    """LLM 없이 판정할 수 있으면 결과 dict를, 아니면 None을 반환"""
     cot_answer = state["cot_answer"]
     code_result = state.get("code_result", "")
     code_error = state.get("code_error")
@@ -218,9 +233,49 @@ def judge(state: ReasoningState):
             "final_answer": final,
             "judge_reasoning": "Max attempts reached. Adopting code result.",
         }
+    return None
+
+
+def _judge_fast_path(state: ReasoningState):
+    """
+    CoT 답과 코드 결과를 LLM 없이 비교.
+    정규화한 문자열이 같거나, 양쪽이 모두 평범한 숫자(정수 / 소수)일 때만 MATCH / MISMATCH 결과 dict를 반환하고
+    그 외(분수, 근호, 식, 구간 등)는 None (표기 차이를 잘못 읽을 수 있으므로 LLM judge로).
+    """
+    cot_answer = state["cot_answer"]
+    code_result = state.get("code_result", "")
+    try:
+        cot_norm, code_norm = normalize_answer(cot_answer), normalize_answer(code_result)
+        if cot_norm != code_norm and not (is_plain_number(cot_norm) and is_plain_number(code_norm)):
+            return None
+        verdict = is_equivalent(cot_answer, code_result)
+    except Exception as e:
+        logger.warning(f"   ⚠️ Fast equivalence check failed: {e}")
+        return None
+    if verdict is None:
+        return None
+
+    _count_judge("fast_path")
+    if verdict:
+        logger.info("   ⚡ Fast path: MATCH")
+        return {
+            "verified": True,
+            "final_answer": cot_answer,
+            "judge_reasoning": "CoT and code agree.",
+        }
+    logger.info("   ⚡ Fast path: MISMATCH. Will retry reasoning.")
+    return {
+        "verified": False,
+        "judge_reasoning": f"CoT={cot_answer}, Code={code_result}. The two answers have different values.",
+    }
+
+
+def _judge_prompt(state: ReasoningState):
+    cot_answer = state["cot_answer"]
+    code_result = state.get("code_result", "")
 
     # LLM에게 비교 판단 요청
-    prompt = f"""You are a math judge. Compare two answers to a math problem and determine if they are equivalent.
+    return f"""You are a math judge. Compare two answers to a math problem and determine if they are equivalent.
 
 ## CoT Answer: {cot_answer}
 ## Code Result: {code_result}
@@ -233,7 +288,12 @@ def judge(state: ReasoningState):
   - "MISMATCH: <brief explanation of the difference>"
 """
 
-    response = llm.invoke(prompt).content.strip()
+
+def _judge_update(state: ReasoningState, response):
+    _count_judge("llm")
+    cot_answer = state["cot_answer"]
+    code_result = state.get("code_result", "")
+    response = response.strip()
     logger.info(f"   Judge verdict: {response}")
 
     if response.startswith("MATCH"):
@@ -250,3 +310,189 @@ def judge(state: ReasoningState):
             "verified": False,
             "judge_reasoning": f"CoT={cot_answer}, Code={code_result}. {mismatch_reason}",
         }
+
+
+def _branch_update(code, result):
+    """self-consistency branch 하나의 코드 실행 결과 (gather가 돌려준 예외도 처리)"""
+    if isinstance(result, BaseException):
+        return _verifier_error(code, result)
+    return _verifier_update(code, result)
+
+
+def _sample_summary(branch):
+    return {
+        "cot_answer": branch["cot_answer"],
+        "code_result": branch["code_result"],
+        "code_error": branch["code_error"],
+    }
+
+
+def _branch_fields(branch):
+    return {k: branch[k] for k in ("cot_reasoning", "cot_answer", "attempt", "code", "code_result", "code_error")}
+
+
+def _vote(branches):
+    """
+    branch들의 CoT 답과 코드 결과를 정규화된 답(math_equivalence)으로 묶어 다수결.
+    - 가장 많은 답이 전체 표의 과반이면 바로 확정 (judge 생략)
+    - 아니면 최다 득표 CoT와 가장 많이 나온 코드 결과를 state에 넣어 judge에 넘김
+    """
+    votes = []  # (답, branch index, "cot" | "code")
+    for j, branch in enumerate(branches):
+        if branch["cot_answer"]:
+            votes.append((branch["cot_answer"], j, "cot"))
+        if not branch["code_error"] and branch["code_result"]:
+            votes.append((branch["code_result"], j, "code"))
+    samples = [_sample_summary(b) for b in branches]
+
+    if not votes:
+        logger.info(f"   🗳️ No usable answers from {len(branches)} branches. Escalating to judge.")
+        return {**_branch_fields(branches[0]), "samples": samples, "verified": False}
+
+    groups = sorted(group_equivalent([v[0] for v in votes]), key=len, reverse=True)
+    top = [votes[i] for i in groups[0]]
+    top_cot = [v for v in top if v[2] == "cot"]
+    # 최종 답은 가능하면 CoT 쪽 표기(LaTeX)를 사용
+    answer, j, _ = top_cot[0] if top_cot else top[0]
+
+    if 2 * len(top) > len(votes):
+        logger.info(f"   🗳️ Consensus {len(top)}/{len(votes)} votes: {answer}")
+        return {
+            **_branch_fields(branches[j]),
+            "samples": samples,
+            "verified": True,
+            "final_answer": answer,
+            "judge_reasoning": f"Self-consistency: {len(top)}/{len(votes)} votes agree.",
+        }
+
+    # 합의 없음: 최다 득표 CoT branch + 가장 많이 나온 코드 결과로 judge 판정
+    update = {**_branch_fields(branches[j]), "samples": samples, "verified": False}
+    code_votes = [votes[i] for group in groups for i in group if votes[i][2] == "code"]
+    if code_votes:
+        code_branch = branches[code_votes[0][1]]
+        update.update(code=code_branch["code"], code_result=code_branch["code_result"], code_error=None)
+    logger.info(f"   🗳️ No consensus ({len(top)}/{len(votes)} votes for {answer}). Escalating to judge.")
+    return update
+
+
+# ----------------------------------------------------------------------
+# 노드 (sync)
+# ----------------------------------------------------------------------
+def cot_reasoner(state: ReasoningState):
+    """
+    Step 1: CoT 추론
+    LLM에게 문제를 단계별로 풀게 한다.
+    재시도 시에는 이전 코드 검증 결과를 힌트로 제공한다.
+    """
+    response = llm.invoke(_cot_prompt(state)).content
+    return _cot_update(state, response)
+
+
+def code_verifier(state: ReasoningState, sandbox: AgentSandbox):
+    """
+    Step 2: 코드 검증
+    CoT 추론 결과를 검증하는 Python 코드를 생성하고 실행한다.
+    """
+    # ```python 블록이 닫히면 생성을 멈춤 (블록 뒤 설명은 쓰지 않음)
+    response = invoke_until(llm, _verifier_prompt(state), "python_block")
+    code = _extract_verifier_code(response)
+
+    # 코드 실행
+    try:
+        result = sandbox.run_code(code, mode="temporary")
+        sandbox.cleanup_test_kernel()
+        return _verifier_update(code, result)
+    except Exception as e:
+        return _verifier_error(code, e)
+
+
+def judge(state: ReasoningState):
+    """
+    Step 3: Judge
+    CoT 답과 코드 결과를 비교하여 최종 답을 결정한다.
+    """
+    shortcut = _judge_shortcut(state)
+    if shortcut is not None:
+        return shortcut
+    fast = _judge_fast_path(state)
+    if fast is not None:
+        return fast
+    response = judge_llm.invoke(_judge_prompt(state)).content
+    return _judge_update(state, response)
+
+
+def self_consistency(state: ReasoningState, sandbox: AgentSandbox, k=SELF_CONSISTENCY_K):
+    """
+    Self-consistency 모드 (cot_reasoner + code_verifier 대신 첫 단계로 사용)
+    CoT k개를 동시에 샘플링하고, 각 CoT의 검증 코드 k개를 격리된 커널에서 동시에 실행한다.
+    다수결로 합의되면 바로 종료, 합의가 없을 때만 judge로 넘긴다.
+    """
+    logger.info(f"🎲 Self-consistency: sampling {k} branches...")
+    responses = llm.batch([_cot_prompt(state)] * k)
+    branches = [{**state, **_cot_update(state, r.content)} for r in responses]
+
+    responses = batch_until(llm, [_verifier_prompt(b) for b in branches], "python_block")
+    codes = [_extract_verifier_code(r) for r in responses]
+
+    async def run_all():
+        return await asyncio.gather(
+            *[sandbox.run_code_async(code, mode="temporary") for code in codes], return_exceptions=True
+        )
+
+    results = asyncio.run(run_all())
+    sandbox.cleanup_test_kernel()
+    branches = [{**b, **_branch_update(code, result)} for b, code, result in zip(branches, codes, results)]
+    return _vote(branches)
+
+
+# ----------------------------------------------------------------------
+# 노드 (async): app.ainvoke 용. LLM 응답/코드 실행을 기다리는 동안 이벤트 루프가 다른 문제를 진행
+# ----------------------------------------------------------------------
+async def cot_reasoner_async(state: ReasoningState):
+    response = (await llm.ainvoke(_cot_prompt(state))).content
+    return _cot_update(state, response)
+
+
+async def code_verifier_async(state: ReasoningState, sandbox: AgentSandbox):
+    response = await ainvoke_until(llm, _verifier_prompt(state), "python_block")
+    code = _extract_verifier_code(response)
+
+    try:
+        result = await sandbox.run_code_async(code, mode="temporary")
+        await asyncio.to_thread(sandbox.cleanup_test_kernel)
+        return _verifier_update(code, result)
+    except Exception as e:
+        return _verifier_error(code, e)
+
+
+async def judge_async(state: ReasoningState):
+    shortcut = _judge_shortcut(state)
+    if shortcut is not None:
+        return shortcut
+    # sympy simplify가 필요한 경우도 있으므로 이벤트 루프를 막지 않도록 스레드에서
+    fast = await asyncio.to_thread(_judge_fast_path, state)
+    if fast is not None:
+        return fast
+    response = (await judge_llm.ainvoke(_judge_prompt(state))).content
+    return _judge_update(state, response)
+
+
+async def _branch_async(state: ReasoningState, sandbox: AgentSandbox, prompt):
+    """CoT 하나 → 검증 코드 → 실행. branch마다 독립적으로 진행되어 먼저 끝난 CoT의 코드가 바로 실행됨"""
+    response = (await llm.ainvoke(prompt)).content
+    branch = {**state, **_cot_update(state, response)}
+    code = _extract_verifier_code(await ainvoke_until(llm, _verifier_prompt(branch), "python_block"))
+    try:
+        result = await sandbox.run_code_async(code, mode="temporary")
+    except Exception as e:
+        return {**branch, **_verifier_error(code, e)}
+    return {**branch, **_verifier_update(code, result)}
+
+
+async def self_consistency_async(state: ReasoningState, sandbox: AgentSandbox, k=SELF_CONSISTENCY_K):
+    logger.info(f"🎲 Self-consistency: sampling {k} branches...")
+    prompt = _cot_prompt(state)
+    branches = await asyncio.gather(*[_branch_async(state, sandbox, prompt) for _ in range(k)])
+    await asyncio.to_thread(sandbox.cleanup_test_kernel)
+    # 답 묶기에 sympy가 쓰일 수 있으므로 스레드에서
+    return await asyncio.to_thread(_vote, branches)
@@ -1,4 +1,4 @@
-from typing import TypedDict, Optional
+from typing import TypedDict, Optional, List, Dict, Any
 
 
 class ReasoningState(TypedDict):
@@ -14,6 +14,9 @@ class ReasoningState(TypedDict):
     code_result: str            # 코드 실행 결과
     code_error: Optional[str]   # 코드 실행 에러 (있으면)
 
+    # --- Self-consistency (--self-consistency 모드에서만 사용) ---
+    samples: List[Dict[str, Any]]  # branch별 CoT 답 / 코드 결과 / 코드 에러
+
     # --- Judge ---
     verified: bool              # CoT 답과 코드 결과 일치 여부
     attempt: int                # 현재 시도 횟수
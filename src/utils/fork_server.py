@@ -0,0 +1,445 @@
+"""
+Fork-server 실행기.
+
+Zygote 프로세스가 무거운 라이브러리(pandas, numpy, sympy, sklearn ...)를 한 번만 import 해두고,
+격리 실행 요청이 올 때마다 os.fork()로 자식을 만들어 copy-on-write로 코드를 실행한다.
+자식은 매번 새 네임스페이스에서 시작하므로 실행 간 상태가 섞이지 않고,
+커널 시작/재시작 비용(수 초)이 fork 비용(수 ms)으로 줄어든다.
+
+ForkServerKernel은 SingleKernel과 같은 인터페이스(execute/reset/restart/cleanup)와
+같은 {"stdout", "stderr"} 반환 형식을 가지므로 AgentSandbox의 Tester 백엔드로 바로 쓸 수 있다.
+
+주의: zygote 쪽 코드(_zygote_main 이하)는 이 파일을 스크립트로 직접 실행하므로 stdlib만 사용한다.
+"""
+import os
+import sys
+import json
+import atexit
+import asyncio
+import time
+import errno
+import types
+import select
+import signal
+import logging
+import tempfile
+import threading
+import itertools
+import subprocess
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRELOAD = ("numpy", "pandas", "sympy", "sklearn")
+INTERRUPT_GRACE_S = 10  # SIGINT 후 이 시간 안에 끝나지 않으면 SIGKILL
+
+
+# ======================================================================
+# Zygote (별도 프로세스에서 실행)
+# ======================================================================
+def _cpu_exceeded(signum, frame):
+    raise KeyboardInterrupt("CPU time limit exceeded")
+
+
+def _run_child(code, cwd, out_fd, err_fd, cpu_s=None, prelude=None):
+    """fork된 자식 프로세스: 출력 리다이렉트 후 코드 실행, 절대 return 하지 않음."""
+    try:
+        if cpu_s:
+            # soft limit에서 SIGXCPU -> KeyboardInterrupt, 그래도 안 끝나면 hard limit에서 커널이 종료
+            import resource
+            signal.signal(signal.SIGXCPU, _cpu_exceeded)
+            soft = max(1, int(cpu_s + 0.999))
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, soft + INTERRUPT_GRACE_S))
+        os.dup2(out_fd, 1)
+        os.dup2(err_fd, 2)
+        # 줄 단위로 flush해야 zygote가 출력 파일 크기로 '출력 없음' 시간을 잴 수 있음 (Jupyter stream과 같은 효과)
+        sys.stdout = open(1, "w", closefd=False, buffering=1)
+        sys.stderr = open(2, "w", closefd=False, buffering=1)
+        os.makedirs(cwd, exist_ok=True)
+        os.chdir(cwd)
+        if cwd not in sys.path:
+            sys.path.insert(0, cwd)
+
+        # Jupyter처럼 실행 네임스페이스를 __main__ 모듈로 둬야 unittest.main() 등이 테스트를 찾음
+        main_module = types.ModuleType("__main__")
+        main_module.__builtins__ = __builtins__
+        sys.modules["__main__"] = main_module
+        try:
+            if prelude:
+                # 사용자 코드 전에 실행할 설정 코드 (공유 데이터 로더 설치 등)
+                exec(compile(prelude, "<prelude>", "exec"), {"__builtins__": __builtins__})
+            exec(compile(code, "<cell>", "exec"), main_module.__dict__)
+        except SystemExit:
+            pass
+        except BaseException as e:
+            # SingleKernel(Jupyter error 메시지)과 같은 "ename: evalue" 형식
+            sys.stdout.flush()
+            sys.stderr.write(f"{type(e).__name__}: {e}")
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(0)
+
+
+def _zygote_main(preload):
+    # 프로토콜용 fd는 따로 복제해두고, 0/1번은 devnull로 돌려서
+    # import 중 라이브러리가 print해도 프로토콜이 깨지지 않게 함
+    proto_in = os.dup(0)
+    proto_out = os.fdopen(os.dup(1), "w")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    sys.stdout = open(1, "w", closefd=False)
+
+    loaded = []
+    for name in preload:
+        try:
+            __import__(name)
+            loaded.append(name)
+        except Exception:
+            pass
+
+    proto_out.write(json.dumps({"ready": True, "preloaded": loaded, "pid": os.getpid()}) + "\n")
+    proto_out.flush()
+
+    children = {}  # pid -> 요청별 상태 (req_id, 출력 파일, wall deadline, 출력 없음 timeout, 출력/자원 제한)
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    buf = b""
+    eof = False
+
+    def reply(msg):
+        proto_out.write(json.dumps(msg) + "\n")
+        proto_out.flush()
+
+    def read_bounded(f, head, tail):
+        """출력 파일에서 head/tail만 읽어옴. (text, dropped_bytes)"""
+        size = os.fstat(f.fileno()).st_size
+        f.seek(0)
+        if size <= head + tail:
+            return f.read().decode("utf-8", errors="replace"), 0
+        head_text = f.read(head).decode("utf-8", errors="replace")
+        f.seek(size - tail)
+        tail_text = f.read(tail).decode("utf-8", errors="replace")
+        dropped = size - head - tail
+        return f"{head_text}\n... [{dropped} chars dropped] ...\n{tail_text}", dropped
+
+    def rss_mb(pid):
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                return int(f.read().split()[1]) * page_size / (1024 * 1024)
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def finish(pid, stop_reason=None, rusage=None):
+        child = children.pop(pid)
+        output_chars = os.fstat(child["out"].fileno()).st_size + os.fstat(child["err"].fileno()).st_size
+        stdout, stdout_dropped = read_bounded(child["out"], child["head"], child["tail"])
+        stderr, stderr_dropped = read_bounded(child["err"], child["head"], child["tail"])
+        child["out"].close()
+        child["err"].close()
+
+        cpu_s = peak_rss_mb = None
+        if rusage is not None:
+            cpu_s = rusage.ru_utime + rusage.ru_stime
+            peak_rss_mb = max(rusage.ru_maxrss / 1024, child["peak_rss_mb"] or 0.0)  # ru_maxrss: KB
+            # RLIMIT_CPU는 초 단위 + 틱 오차가 있으므로 약간의 여유를 둠
+            if stop_reason is None and child["cpu_s"] and cpu_s + 0.05 >= child["cpu_s"]:
+                stop_reason = "cpu"
+        if stop_reason == "timeout":
+            stderr += "Timeout"
+        elif stop_reason:
+            stderr += f"\n[Execution interrupted: {stop_reason}]"
+        reply({
+            "id": child["id"],
+            "stdout": stdout,
+            "stderr": stderr,
+            "stdout_dropped": stdout_dropped,
+            "stderr_dropped": stderr_dropped,
+            "usage": {
+                "wall_s": round(time.time() - child["start"], 3),
+                "cpu_s": round(cpu_s, 3) if cpu_s is not None else None,
+                "peak_rss_mb": round(peak_rss_mb, 1) if peak_rss_mb is not None else None,
+                "output_chars": output_chars,
+                "limit_hit": stop_reason if stop_reason in ("wall", "cpu", "memory", "output", "output_limit", "timeout") else None,
+            },
+        })
+
+    def interrupt(pid, child, reason):
+        # SIGINT -> 자식에서 KeyboardInterrupt (Jupyter interrupt와 동일한 효과)
+        child["stop_reason"] = reason
+        child["interrupted_at"] = time.time()
+        try:
+            os.kill(pid, signal.SIGINT)
+        except OSError:
+            pass
+
+    while not (eof and not children):
+        # 자식이 있으면 회수/점검을 위해 최대 10ms만 대기
+        wait = 0.01 if children else 1.0
+        if not eof:
+            readable, _, _ = select.select([proto_in], [], [], wait)
+        else:
+            readable = []
+            time.sleep(wait)
+
+        if readable:
+            data = os.read(proto_in, 65536)
+            if not data:
+                eof = True
+            buf += data
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                if not line.strip():
+                    continue
+                req = json.loads(line)
+                out_f = tempfile.TemporaryFile()
+                err_f = tempfile.TemporaryFile()
+                pid = os.fork()
+                if pid == 0:
+                    os.close(proto_in)
+                    _run_child(req["code"], req["cwd"], out_f.fileno(), err_f.fileno(), req.get("cpu_s"), req.get("prelude"))
+                start = time.time()
+                wall_s = req.get("wall_s")
+                children[pid] = {
+                    "id": req["id"],
+                    "out": out_f,
+                    "err": err_f,
+                    "start": start,
+                    # SingleKernel과 같은 의미: wall_s는 총 실행 시간, timeout은 출력 없이 기다리는 최대 시간
+                    "deadline": start + wall_s if wall_s else None,
+                    "timeout": req.get("timeout", 30),
+                    "written": 0,
+                    "last_output": start,
+                    "head": req.get("head", 20000),
+                    "tail": req.get("tail", 20000),
+                    "max_output": req.get("max_output"),
+                    "cpu_s": req.get("cpu_s"),
+                    "rss_mb": req.get("rss_mb"),
+                    "peak_rss_mb": None,
+                    "stop_reason": None,
+                    "interrupted_at": None,
+                }
+
+        # 끝난 자식 회수
+        while children:
+            try:
+                pid, _, rusage = os.wait4(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid in children:
+                finish(pid, children[pid]["stop_reason"], rusage)
+
+        # 시간 초과 / 출력 폭주 / 메모리 초과 자식 정리
+        now = time.time()
+        for pid, child in list(children.items()):
+            expired = child["deadline"] is not None and now > child["deadline"]
+            unresponsive = child["interrupted_at"] and now - child["interrupted_at"] > INTERRUPT_GRACE_S
+            if expired or unresponsive:
+                rusage = None
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                    _, _, rusage = os.wait4(pid, 0)
+                except OSError as e:
+                    if e.errno not in (errno.ESRCH, errno.ECHILD):
+                        raise
+                finish(pid, child["stop_reason"] or "wall", rusage)
+                continue
+            if child["stop_reason"] is not None:
+                continue
+
+            written = os.fstat(child["out"].fileno()).st_size + os.fstat(child["err"].fileno()).st_size
+            if written != child["written"]:
+                child["written"], child["last_output"] = written, now
+            elif now - child["last_output"] > child["timeout"]:
+                # SingleKernel처럼 출력 없이 timeout이 지나면 interrupt (응답 없으면 grace 후 SIGKILL)
+                interrupt(pid, child, "timeout")
+                continue
+            if child["max_output"] and written > child["max_output"]:
+                interrupt(pid, child, "output_limit")
+                continue
+            if child["rss_mb"]:
+                rss = rss_mb(pid)
+                if rss is not None:
+                    child["peak_rss_mb"] = max(child["peak_rss_mb"] or 0.0, rss)
+                    if rss > child["rss_mb"]:
+                        interrupt(pid, child, "memory")
+
+
+# ======================================================================
+# Client (에이전트 프로세스)
+# ======================================================================
+class ForkServer:
+    """Zygote 프로세스 하나를 관리. 여러 요청을 동시에 보낼 수 있다 (요청마다 별도 fork)."""
+
+    def __init__(self, preload=DEFAULT_PRELOAD):
+        self.preload = tuple(preload)
+        self._ids = itertools.count()
+        self._pending = {}
+        self._write_lock = threading.Lock()
+        self.preloaded = []
+
+        start = time.time()
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--zygote", ",".join(self.preload)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        ready = self.proc.stdout.readline()
+        if not ready:
+            raise RuntimeError("Fork server failed to start")
+        self.preloaded = json.loads(ready)["preloaded"]
+        logger.info(f"🧬 Fork server ready in {time.time() - start:.1f}s (preloaded: {self.preloaded})")
+
+        self._reader = threading.Thread(target=self._read_loop, name="ForkServerReader", daemon=True)
+        self._reader.start()
+
+    def _read_loop(self):
+        for line in self.proc.stdout:
+            msg = json.loads(line)
+            future = self._pending.pop(msg.pop("id"), None)
+            if future is not None:
+                future.set_result(msg)
+        # zygote 종료: 대기 중인 요청 모두 실패 처리
+        for future in list(self._pending.values()):
+            future.set_result({"stdout": "", "stderr": "Fork server exited"})
+        self._pending.clear()
+
+    def submit(self, code, cwd, timeout=30, head=20000, tail=20000, max_output=None, budget=None, prelude=None) -> Future:
+        """
+        budget: ResourceBudget 호환 객체 (wall_s / cpu_s / rss_mb / output_chars)
+        prelude: 자식 프로세스에서 code 전에 별도 네임스페이스로 실행할 코드
+        """
+        future = Future()
+        req_id = next(self._ids)
+        self._pending[req_id] = future
+        if budget is not None and budget.output_chars:
+            max_output = min(max_output, budget.output_chars) if max_output else budget.output_chars
+        request = {
+            "id": req_id, "code": code, "cwd": cwd, "timeout": timeout,
+            "head": head, "tail": tail, "max_output": max_output,
+            "wall_s": getattr(budget, "wall_s", None),
+            "cpu_s": getattr(budget, "cpu_s", None),
+            "rss_mb": getattr(budget, "rss_mb", None),
+            "prelude": prelude,
+        }
+        try:
+            with self._write_lock:
+                self.proc.stdin.write(json.dumps(request) + "\n")
+                self.proc.stdin.flush()
+        except Exception as e:
+            self._pending.pop(req_id, None)
+            future.set_result({"stdout": "", "stderr": str(e)})
+        return future
+
+    def is_alive(self):
+        return self.proc.poll() is None
+
+    def shutdown(self):
+        if self.proc.poll() is None:
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=5)
+            except Exception:
+                self.proc.kill()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_fork_server(preload=DEFAULT_PRELOAD) -> ForkServer:
+    """프로세스 전체에서 공유하는 fork server (죽었으면 다시 띄움)."""
+    global _server
+    with _server_lock:
+        if _server is None or not _server.is_alive():
+            _server = ForkServer(preload)
+        return _server
+
+
+def shutdown_fork_server():
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server.shutdown()
+            _server = None
+
+
+class ForkServerKernel:
+    """
+    SingleKernel 대체용 격리 실행기.
+    매 execute가 zygote에서 fork된 새 프로세스에서 실행되므로 항상 깨끗한 상태에서 시작한다.
+    (상태를 유지하지 않으므로 Main 커널 용도로는 쓸 수 없음)
+    """
+
+    def __init__(self, work_dir="./", preload=DEFAULT_PRELOAD, head_chars=20000, tail_chars=20000, max_output=None):
+        self.work_dir = os.path.abspath(work_dir)
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.preload = preload
+        # 출력 제한 (SingleKernel의 OutputBuffer / max_output과 동일한 의미)
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.max_output = max_output
+        # 매 실행 전에 자식에서 실행할 코드 (SingleKernel에 한 번 실행해두는 설정 코드에 해당)
+        self.prelude = None
+        self.server = get_fork_server(preload)
+
+    def set_work_dir(self, work_dir):
+        self.work_dir = os.path.abspath(work_dir)
+        os.makedirs(self.work_dir, exist_ok=True)
+
+    def is_alive(self):
+        return self.server is not None and self.server.is_alive()
+
+    def submit(self, code, timeout=30, budget=None) -> Future:
+        if not self.is_alive():
+            self.server = get_fork_server(self.preload)
+        return self.server.submit(
+            code, self.work_dir, timeout,
+            head=self.head_chars, tail=self.tail_chars, max_output=self.max_output, budget=budget,
+            prelude=self.prelude,
+        )
+
+    @staticmethod
+    def _emit(result, on_output):
+        # fork 실행은 끝난 뒤에 출력을 받으므로 스트림별로 한 번씩 전달
+        if on_output is not None:
+            for name in ("stdout", "stderr"):
+                if result.get(name):
+                    on_output(name, result[name])
+        return result
+
+    def execute(self, code, timeout=30, on_output=None, budget=None):
+        return self._emit(self.submit(code, timeout, budget).result(), on_output)
+
+    async def execute_async(self, code, timeout=30, on_output=None, budget=None):
+        return self._emit(await asyncio.wrap_future(self.submit(code, timeout, budget)), on_output)
+
+    def reset(self):
+        # 매 실행이 새 fork이므로 초기화할 상태가 없음
+        return self.is_alive()
+
+    async def reset_async(self):
+        return self.reset()
+
+    def restart(self):
+        self.server = get_fork_server(self.preload)
+
+    def cleanup(self):
+        # 공유 zygote는 프로세스 종료 시(atexit) 정리
+        self.server = None
+
+
+atexit.register(shutdown_fork_server)
+
+
+if __name__ == "__main__" and len(sys.argv) >= 2 and sys.argv[1] == "--zygote":
+    # 스크립트로 실행되면 sys.path[0]이 src/utils가 되므로, 사용자 코드의 import를 가리지 않게 제거
+    if sys.path and os.path.abspath(sys.path[0]) == os.path.dirname(os.path.abspath(__file__)):
+        sys.path.pop(0)
+    _zygote_main([m for m in (sys.argv[2] if len(sys.argv) > 2 else "").split(",") if m])
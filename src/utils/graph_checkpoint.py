@@ -0,0 +1,118 @@
+"""
+LangGraph 상태 체크포인트 (SQLite, 로컬 파일).
+
+build_graph / build_reasoning_graph를 checkpointer와 함께 compile하면 노드가 끝날 때마다
+그래프 상태가 thread_id(= 태스크 id) 별로 저장된다. 실행이 중간에 죽으면 같은 thread_id로
+invoke_resumable()을 다시 호출해 마지막으로 끝난 노드 다음부터 이어서 실행한다.
+
+노드마다 한 번씩 쓰기가 일어나므로 WAL + synchronous=NORMAL로 fsync 비용을 줄인다
+(OS crash가 아닌 프로세스 crash에는 안전).
+
+async 그래프(app.ainvoke)는 SqliteSaver를 쓸 수 없으므로 이벤트 루프 안에서
+open_async_checkpointer()로 AsyncSqliteSaver를 열고 ainvoke_resumable()을 사용한다.
+"""
+import os
+import inspect
+import sqlite3
+import threading
+import logging
+from langgraph.checkpoint.sqlite import SqliteSaver
+from ..config import GRAPH_CHECKPOINT_DB
+
+logger = logging.getLogger(__name__)
+
+_savers = {}
+_lock = threading.Lock()
+
+
+def get_checkpointer(path=GRAPH_CHECKPOINT_DB):
+    """프로세스마다 하나의 SqliteSaver를 공유 (스레드 간 공유 가능)."""
+    with _lock:
+        saver = _savers.get(path)
+        if saver is None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            saver = SqliteSaver(conn)
+            saver.setup()
+            _savers[path] = saver
+        return saver
+
+
+async def open_async_checkpointer(path=GRAPH_CHECKPOINT_DB):
+    """
+    ainvoke용 AsyncSqliteSaver (같은 DB 파일 사용). 이벤트 루프에 묶이므로 루프마다 하나씩 열고
+    다 쓰면 close_async_checkpointer()로 닫는다.
+    """
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = await aiosqlite.connect(path, timeout=60)
+    await conn.execute("PRAGMA journal_mode=WAL")
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    saver = AsyncSqliteSaver(conn)
+    await saver.setup()
+    return saver
+
+
+async def close_async_checkpointer(saver):
+    await saver.conn.close()
+
+
+def thread_config(thread_id, **config):
+    """invoke에 넘길 config에 thread_id를 넣어 반환"""
+    configurable = dict(config.pop("configurable", {}), thread_id=str(thread_id))
+    return {**config, "configurable": configurable}
+
+
+def invoke_resumable(app, inputs, config, before_resume=None):
+    """
+    체크포인트가 있으면 이어서, 없으면 처음부터 실행.
+    - 중간에 멈춘 thread: before_resume(values)로 외부 상태(커널 등)를 복구한 뒤 invoke(None)으로 재개
+    - 이미 끝까지 실행된 thread: 저장된 최종 상태를 그대로 반환 (LLM 재호출 없음)
+    """
+    snapshot = app.get_state(config)
+    if snapshot.values:
+        thread_id = config["configurable"]["thread_id"]
+        if not snapshot.next:
+            logger.info(f"♻️ Thread {thread_id} already finished. Reusing checkpointed result.")
+            return snapshot.values
+        logger.info(f"♻️ Resuming thread {thread_id} at {list(snapshot.next)}")
+        if before_resume is not None:
+            before_resume(snapshot.values)
+        return app.invoke(None, config)
+    return app.invoke(inputs, config)
+
+
+def clear_thread(checkpointer, thread_id):
+    """결과가 저장된 태스크의 체크포인트를 지워 DB가 계속 커지지 않게 함"""
+    try:
+        checkpointer.delete_thread(str(thread_id))
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to clear checkpoint for thread {thread_id}: {e}")
+
+
+async def ainvoke_resumable(app, inputs, config, before_resume=None):
+    """invoke_resumable()의 async 버전 (before_resume은 일반 함수 또는 코루틴 함수)"""
+    snapshot = await app.aget_state(config)
+    if snapshot.values:
+        thread_id = config["configurable"]["thread_id"]
+        if not snapshot.next:
+            logger.info(f"♻️ Thread {thread_id} already finished. Reusing checkpointed result.")
+            return snapshot.values
+        logger.info(f"♻️ Resuming thread {thread_id} at {list(snapshot.next)}")
+        if before_resume is not None:
+            restored = before_resume(snapshot.values)
+            if inspect.isawaitable(restored):
+                await restored
+        return await app.ainvoke(None, config)
+    return await app.ainvoke(inputs, config)
+
+
+async def aclear_thread(checkpointer, thread_id):
+    try:
+        await checkpointer.adelete_thread(str(thread_id))
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to clear checkpoint for thread {thread_id}: {e}")
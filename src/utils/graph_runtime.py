@@ -0,0 +1,40 @@
+"""
+컴파일된 LangGraph 앱에 실행마다 다른 샌드박스를 넘기기 위한 헬퍼.
+
+그래프는 프로세스당 한 번만 compile하고, 샌드박스는 invoke 시 config["configurable"]["sandbox"]로 전달한다.
+샌드박스가 필요한 노드는 with_sandbox()로 감싸서 등록하면 기존처럼 sandbox 키워드 인자로 받는다.
+(async def 노드도 그대로 감쌀 수 있음)
+"""
+import inspect
+from langchain_core.runnables import RunnableConfig
+
+SANDBOX_KEY = "sandbox"
+
+
+def get_sandbox(config: RunnableConfig):
+    try:
+        return config["configurable"][SANDBOX_KEY]
+    except (KeyError, TypeError):
+        raise ValueError(
+            "No sandbox in config. Pass it with sandbox_config(sandbox) when invoking the graph."
+        ) from None
+
+
+def with_sandbox(node):
+    """node(state, sandbox=...)를 LangGraph 노드(state, config)로 변환"""
+    if inspect.iscoroutinefunction(node):
+        async def wrapper(state, config: RunnableConfig):
+            return await node(state, sandbox=get_sandbox(config))
+    else:
+        def wrapper(state, config: RunnableConfig):
+            return node(state, sandbox=get_sandbox(config))
+    # functools.wraps는 쓰지 않음: __wrapped__가 생기면 LangGraph가 원래 시그니처를 보고 config를 넘기지 않음
+    wrapper.__name__ = node.__name__
+    wrapper.__doc__ = node.__doc__
+    return wrapper
+
+
+def sandbox_config(sandbox, **config):
+    """invoke에 넘길 config에 샌드박스를 넣어 반환 (thread_config 등과 조합 가능)"""
+    configurable = dict(config.pop("configurable", {}), **{SANDBOX_KEY: sandbox})
+    return {**config, "configurable": configurable}
@@ -1,15 +1,232 @@
 import json
 import queue
+import collections
 import atexit
+import asyncio
+import functools
 import logging
 from jupyter_client.manager import KernelManager
-from ..config import TEST_DIR
+from jupyter_client.asynchronous import AsyncKernelClient
+from ..config import (
+    TEST_DIR, TEST_ISOLATION, TEST_BACKEND, FORK_SERVER_PRELOAD, CHECKPOINT_SPILL_DIR, CHECKPOINT_TIMEOUT_S,
+    OUTPUT_HEAD_CHARS, OUTPUT_TAIL_CHARS, MAX_OUTPUT_CHARS,
+    EXEC_WALL_S, EXEC_CPU_S, EXEC_RSS_MB, KERNEL_MEMORY_LIMIT_MB, SHARE_DATA,
+)
+from .fork_server import ForkServerKernel
+from .resource_governor import ResourceBudget, UsageTracker, apply_memory_limit
+from .shared_data import SharedDataStore
 import os
+import time
 import shutil
 import tempfile
 
 logger = logging.getLogger(__name__)
 
+
+async def _in_thread(func, *args):
+    """
+    asyncio.to_thread와 같지만 contextvars를 복사하지 않음.
+    jupyter_client의 동기 API는 스레드의 이벤트 루프를 ContextVar에 보관하므로, 복사된 컨텍스트로 여러 스레드가
+    동시에 커널을 다루면 같은 루프를 함께 돌리려다 'This event loop is already running'으로 실패한다.
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+
+GOVERNOR_POLL_S = 0.5     # 실행 중 자원 점검 주기
+INTERRUPT_GRACE_S = 10    # interrupt 후 이 시간 안에 멈추지 않으면 커널 재시작
+
+# 프로세스 재시작 없이 네임스페이스를 초기화하는 코드 (SingleKernel.reset / reset_async)
+# cwd가 지워진 상태면 %reset -f 자체가 FileNotFoundError로 실패하므로 cwd 복구를 먼저 함
+RESET_CODE = (
+    "import sys as _sys, os as _os\n"
+    "_os.makedirs(_sys._toolgen_baseline['cwd'], exist_ok=True)\n"
+    "_os.chdir(_sys._toolgen_baseline['cwd'])\n"
+    "%reset -f\n"
+    "import sys as _sys, os as _os\n"
+    "_b = _sys._toolgen_baseline\n"
+    "_sys.path[:] = _b['path']\n"
+    "_sys.__dict__.pop('_toolgen_checkpoints', None)\n"
+    "for _m in [m for m in list(_sys.modules) if m not in _b['modules']]:\n"
+    "    if (getattr(_sys.modules[_m], '__file__', None) or '').startswith(_b['cwd']):\n"
+    "        del _sys.modules[_m]\n"
+    "print('__reset_ok__')\n"
+    "del _sys, _os, _b"
+)
+
+# 커널 네임스페이스 체크포인트 / 복구 코드 (SingleKernel.checkpoint / restore)
+# - pickle 가능한 변수: 바이트로 직렬화해 보관 (spill_dir가 있으면 tmpfs 파일로)
+# - pickle 불가능한 변수(모듈, 커넥션, 모델 객체 등): 참조만 보관 (복구 시 같은 객체로 되돌림)
+# 체크포인트는 %reset 이나 사용자 코드에 지워지지 않도록 sys 모듈에 저장한다.
+CHECKPOINT_CODE = """
+def _toolgen_checkpoint(name, spill_dir):
+    import sys, os, json, pickle, types
+    skip = {'In', 'Out', 'get_ipython', 'exit', 'quit', 'open'}
+    snap = {'pickled': {}, 'refs': {}}
+    total = 0
+    for k, v in list(globals().items()):
+        if k.startswith('_') or k in skip:
+            continue
+        if isinstance(v, types.ModuleType):
+            snap['refs'][k] = v
+            continue
+        try:
+            data = pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            snap['refs'][k] = v
+            continue
+        total += len(data)
+        if spill_dir:
+            path = os.path.join(spill_dir, f"{name}__{k}.pkl")
+            with open(path, 'wb') as f:
+                f.write(data)
+            snap['pickled'][k] = path
+        else:
+            snap['pickled'][k] = data
+    if not hasattr(sys, '_toolgen_checkpoints'):
+        sys._toolgen_checkpoints = {}
+    sys._toolgen_checkpoints[name] = snap
+    print(json.dumps({'pickled': len(snap['pickled']), 'refs': len(snap['refs']), 'bytes': total}))
+"""
+
+# 값을 stdout 대신 JSON 파일로 받아오는 코드 (SingleKernel.evaluate_json)
+# 출력 head/tail 버퍼와 max_output 제한을 거치지 않으므로 큰 결과도 잘리지 않는다.
+EVALUATE_JSON_CODE = """
+import json as _toolgen_json
+with open({path!r}, 'w') as _toolgen_f:
+    _toolgen_json.dump({expr}, _toolgen_f, default=str)
+del _toolgen_json, _toolgen_f
+"""
+
+RESTORE_CODE = """
+def _toolgen_restore(name):
+    import sys, pickle
+    skip = {'In', 'Out', 'get_ipython', 'exit', 'quit', 'open'}
+    snap = sys._toolgen_checkpoints[name]
+    g = globals()
+    keep = set(snap['pickled']) | set(snap['refs'])
+    for k in list(g):
+        if not k.startswith('_') and k not in skip and k not in keep:
+            del g[k]
+    g.update(snap['refs'])
+    for k, data in snap['pickled'].items():
+        if isinstance(data, str):
+            with open(data, 'rb') as f:
+                data = f.read()
+        g[k] = pickle.loads(data)
+    print('__restore_ok__')
+"""
+
+DROP_CODE = """
+def _toolgen_drop(name):
+    import sys, os
+    snap = getattr(sys, '_toolgen_checkpoints', {}).pop(name, None)
+    for data in (snap or {}).get('pickled', {}).values():
+        if isinstance(data, str) and os.path.exists(data):
+            os.remove(data)
+    print('__drop_ok__')
+"""
+
+class OutputBuffer:
+    """
+    앞부분(head)과 뒷부분(tail)만 보관하는 출력 버퍼.
+    중간 출력은 버리고 버린 글자 수(dropped)만 기록하여 메모리 사용량을 고정한다.
+    """
+    def __init__(self, head_chars=OUTPUT_HEAD_CHARS, tail_chars=OUTPUT_TAIL_CHARS):
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.head = []
+        self.head_len = 0
+        self.tail = collections.deque()
+        self.tail_len = 0
+        self.total = 0
+        self.dropped = 0
+
+    def append(self, text):
+        self.total += len(text)
+
+        if self.head_len < self.head_chars:
+            take = text[:self.head_chars - self.head_len]
+            self.head.append(take)
+            self.head_len += len(take)
+            text = text[len(take):]
+            if not text:
+                return
+
+        self.tail.append(text)
+        self.tail_len += len(text)
+        # tail 한도를 넘는 오래된 chunk부터 버림
+        while self.tail and self.tail_len - len(self.tail[0]) >= self.tail_chars:
+            self.dropped += len(self.tail[0])
+            self.tail_len -= len(self.tail.popleft())
+        excess = self.tail_len - self.tail_chars
+        if excess > 0:
+            self.tail[0] = self.tail[0][excess:]
+            self.tail_len -= excess
+            self.dropped += excess
+
+    def getvalue(self):
+        head = "".join(self.head)
+        tail = "".join(self.tail)
+        if self.dropped:
+            return f"{head}\n... [{self.dropped} chars dropped] ...\n{tail}"
+        return head + tail
+
+
+class ExecutionSink:
+    """한 번의 execute 동안 iopub 메시지를 받아 출력 버퍼링/스트리밍 콜백/출력 제한을 처리"""
+    def __init__(self, msg_id, on_output=None, max_output=None):
+        self.msg_id = msg_id
+        self.stdout = OutputBuffer()
+        self.stderr = OutputBuffer()
+        self.on_output = on_output
+        self.max_output = max_output
+        self.stop_reason = None   # 'callback' | 'output_limit' | 'timeout' | 'wall' | 'cpu' | 'memory' | 'output'
+        self.interrupted_at = None
+        self.restart_needed = False   # interrupt에 응답하지 않음 -> 실행을 포기하고 커널 재시작
+
+    def feed(self, msg):
+        """iopub 메시지 하나를 처리. 실행이 끝났으면(idle) True 반환."""
+        if msg['parent_header'].get('msg_id') != self.msg_id:
+            return False
+
+        msg_type = msg['msg_type']
+        content = msg['content']
+
+        if msg_type == 'stream':
+            buf = self.stdout if content['name'] == 'stdout' else self.stderr
+            buf.append(content['text'])
+            self._on_chunk(content['name'], content['text'])
+        elif msg_type == 'error':
+            self.stderr.append(f"{content['ename']}: {content['evalue']}")
+        elif msg_type == 'status' and content['execution_state'] == 'idle':
+            return True
+        return False
+
+    def _on_chunk(self, name, text):
+        if self.stop_reason:
+            return
+        if self.on_output is not None and self.on_output(name, text) is False:
+            self.stop_reason = "callback"
+        elif self.max_output and self.stdout.total + self.stderr.total > self.max_output:
+            self.stop_reason = "output_limit"
+
+    @property
+    def output_chars(self):
+        return self.stdout.total + self.stderr.total
+
+    def result(self):
+        if self.stop_reason == "timeout":
+            self.stderr.append("Timeout")
+        elif self.stop_reason:
+            self.stderr.append(f"\n[Execution interrupted: {self.stop_reason}]")
+        return {
+            "stdout": self.stdout.getvalue(),
+            "stderr": self.stderr.getvalue(),
+            "stdout_dropped": self.stdout.dropped,
+            "stderr_dropped": self.stderr.dropped,
+        }
+
+
 class SingleKernel:
     def __init__(self, work_dir="./"):
         self.work_dir = os.path.abspath(work_dir)
@@ -17,31 +234,25 @@ class SingleKernel:
         self.connection_dir = None
         self.km = None
         self.kc = None
+        # execute_async 용 비동기 클라이언트 (이벤트 루프별로 lazy 생성)
+        self.akc = None
+        self._akc_loop = None
         self._start_kernel()
 
     
     def _start_kernel(self):
         """커널을 (재)시작하는 내부 메서드"""
-        # 1. 연결 및 런타임 파일용 안전한 임시 디렉토리 생성
-        self.connection_dir = tempfile.mkdtemp()
-        
-        # 🔥 [핵심 1] Jupyter가 런타임 파일(소켓 등)을 
-        # 절대 작업 폴더에 만들지 않도록 환경변수 강제 설정
-        os.environ["JUPYTER_RUNTIME_DIR"] = self.connection_dir
-        
-        # 2. KernelManager 설정 (TCP 강제)
-        self.km = KernelManager(
-            kernel_name='python3',
-            connection_dir=self.connection_dir,
-            transport='tcp',   # 네트워크 소켓 사용
-            ip='127.0.0.1'     # 로컬호스트 강제
-        )
+        # 1~2. 커널 전용 런타임 디렉토리 + KernelManager 설정
+        self._new_manager()
         
         # 3. 커널 시작 (with retry)
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                self.km.start_kernel()
+                # 🔥 [핵심 1] Jupyter 런타임 파일(소켓 등)이 작업 폴더나 다른 커널과 섞이지 않도록
+                # 커널 프로세스에만 전용 JUPYTER_RUNTIME_DIR을 넘김 (에이전트 프로세스 환경변수는 건드리지 않음)
+                env = dict(os.environ, JUPYTER_RUNTIME_DIR=self.connection_dir)
+                self.km.start_kernel(env=env, cwd=self.work_dir)
                 self.kc = self.km.client()
                 self.kc.start_channels()
                 self.kc.wait_for_ready(timeout=10)
@@ -55,57 +266,283 @@ class SingleKernel:
                     logger.info(f"   Retrying in {wait_time}s...")
                     time.sleep(wait_time)
                     # 재시도를 위해 KernelManager 재생성
-                    self.connection_dir = tempfile.mkdtemp()
-                    os.environ["JUPYTER_RUNTIME_DIR"] = self.connection_dir
-                    self.km = KernelManager(
-                        kernel_name='python3',
-                        connection_dir=self.connection_dir,
-                        transport='tcp',
-                        ip='127.0.0.1'
-                    )
+                    self._new_manager()
                 else:
                     raise RuntimeError(f"Failed to start kernel in {self.work_dir} after {max_retries} attempts")
             except Exception as e:
                 self.cleanup()
                 raise e
         
+        # 메모리 폭주 시 호스트 OOM 대신 커널 안에서 MemoryError가 나도록 상한 설정
+        apply_memory_limit(self.pid, KERNEL_MEMORY_LIMIT_MB)
+
         # 4. 워크스페이스로 이동
         # (Jupyter는 런타임 폴더에서 시작했을 수 있으므로 이동 필요)
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.execute(f"import os; os.chdir('{self.work_dir}')")
+        self._record_baseline()
+
+    def _new_manager(self):
+        # 커널마다 고유한 런타임 디렉토리와 connection file을 사용 (같은 호스트의 다른 샌드박스와 충돌 방지)
+        self.connection_dir = tempfile.mkdtemp(prefix="toolgen_kernel_")
+        self.km = KernelManager(
+            kernel_name='python3',
+            connection_file=os.path.join(self.connection_dir, "kernel.json"),
+            transport='tcp',   # 네트워크 소켓 사용
+            ip='127.0.0.1'     # 로컬호스트 강제
+        )
+
+    def set_work_dir(self, work_dir):
+        """이미 떠 있는 커널의 작업 폴더를 변경 (KernelPool에서 꺼낸 커널용)"""
+        self.work_dir = os.path.abspath(work_dir)
+        os.makedirs(self.work_dir, exist_ok=True)
         self.execute(f"import os; os.chdir('{self.work_dir}')")
+        self._record_baseline()
+
+    def _record_baseline(self):
+        """reset()이 되돌아갈 기준 상태(cwd, sys.path, 로드된 모듈)를 커널 안에 기록.
+        %reset -f 로 지워지지 않도록 사용자 네임스페이스가 아닌 sys 모듈에 저장한다."""
+        self.execute(
+            "import sys as _sys, os as _os\n"
+            "_sys._toolgen_baseline = {'cwd': _os.getcwd(), 'path': list(_sys.path), 'modules': set(_sys.modules)}\n"
+            "del _sys, _os"
+        )
+
+    def reset(self):
+        """
+        프로세스 재시작 없이 깨끗한 네임스페이스를 만든다.
+        - %reset -f 로 사용자 변수/함수 제거
+        - cwd, sys.path 를 기준 상태로 복구
+        - checkpoint()로 저장한 스냅샷 제거 (재사용되는 커널에 이전 사용자의 스냅샷이 남지 않도록)
+        - 작업 폴더에서 새로 import된 로컬 모듈은 sys.modules에서 제거 (다음 import 시 새로 로드)
+        성공하면 True, 커널이 죽었거나 점검에 실패하면 False (호출자가 restart로 fallback).
+        """
+        if not self.is_alive():
+            return False
+        result = self.execute(RESET_CODE, timeout=10)
+        return not result["stderr"] and "__reset_ok__" in result["stdout"]
+
+    async def reset_async(self):
+        if not self.is_alive():
+            return False
+        result = await self.execute_async(RESET_CODE, timeout=10)
+        return not result["stderr"] and "__reset_ok__" in result["stdout"]
+
+    def checkpoint(self, name="default", spill_dir=None):
+        """현재 네임스페이스의 스냅샷을 커널 안에 저장. 성공 시 {'pickled', 'refs', 'bytes'} 반환."""
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        code = CHECKPOINT_CODE + f"_toolgen_checkpoint({name!r}, {spill_dir!r})\ndel _toolgen_checkpoint\n"
+        result = self.execute(code, timeout=CHECKPOINT_TIMEOUT_S)
+        if result["stderr"]:
+            logger.warning(f"⚠️ Checkpoint '{name}' failed: {result['stderr'][:200]}")
+            return None
+        try:
+            return json.loads(result["stdout"].strip().splitlines()[-1])
+        except Exception:
+            return None
+
+    def restore(self, name="default"):
+        """checkpoint()로 저장한 상태로 네임스페이스를 되돌림 (이후 생긴 변수는 삭제)."""
+        code = RESTORE_CODE + f"_toolgen_restore({name!r})\ndel _toolgen_restore\n"
+        result = self.execute(code, timeout=CHECKPOINT_TIMEOUT_S)
+        if result["stderr"] or "__restore_ok__" not in result["stdout"]:
+            logger.warning(f"⚠️ Restore '{name}' failed: {result['stderr'][:200]}")
+            return False
+        return True
+
+    def drop_checkpoint(self, name="default"):
+        """checkpoint()로 저장한 스냅샷을 지움 (커널 메모리 / spill 파일 해제)."""
+        code = DROP_CODE + f"_toolgen_drop({name!r})\ndel _toolgen_drop\n"
+        result = self.execute(code, timeout=CHECKPOINT_TIMEOUT_S)
+        if result["stderr"] or "__drop_ok__" not in result["stdout"]:
+            logger.warning(f"⚠️ Dropping checkpoint '{name}' failed: {result['stderr'][:200]}")
+            return False
+        return True
+
+    def _evaluate_json_code(self, expr, setup):
+        fd, path = tempfile.mkstemp(prefix="toolgen_eval_", suffix=".json")
+        os.close(fd)
+        return path, setup + EVALUATE_JSON_CODE.format(path=path, expr=expr)
+
+    @staticmethod
+    def _read_json_result(path, result):
+        try:
+            if result["stderr"]:
+                logger.error(f"Error evaluating in kernel: {result['stderr'][:200]}")
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read evaluation result: {e}")
+            return None
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def evaluate_json(self, expr, setup=""):
+        """
+        setup 코드를 실행한 뒤 expr(파이썬 식)의 값을 JSON 파일로 받아 반환. 실패하면 None.
+        값이 stdout을 거치지 않으므로 출력 head/tail 잘림이나 max_output 제한에 걸리지 않는다.
+        """
+        path, code = self._evaluate_json_code(expr, setup)
+        return self._read_json_result(path, self.execute(code))
+
+    async def evaluate_json_async(self, expr, setup=""):
+        path, code = self._evaluate_json_code(expr, setup)
+        return self._read_json_result(path, await self.execute_async(code))
+
+    def is_alive(self):
+        if self.km is None or self.kc is None:
+            return False
+        try:
+            return self.km.is_alive()
+        except Exception:
+            return False
     
-    def execute(self, code, timeout=30):
+    def execute(self, code, timeout=30, on_output=None, max_output=MAX_OUTPUT_CHARS, budget=None):
+        """
+        코드를 실행하고 {"stdout", "stderr", "stdout_dropped", "stderr_dropped", "usage"}를 반환.
+        - 출력은 head/tail 버퍼에만 보관 (중간은 버리고 버린 글자 수를 기록)
+        - on_output(name, text): 출력 chunk가 도착할 때마다 호출. False를 반환하면 커널을 interrupt
+        - max_output: 전체 출력이 이 글자 수를 넘으면 커널을 interrupt (폭주 출력 방지)
+        - timeout: 출력 없이 대기하는 최대 시간 (초과 시 interrupt)
+        - budget: ResourceBudget (wall / cpu / rss / 출력 크기). 넘으면 interrupt, 응답 없으면 재시작
+        usage에는 이번 실행의 wall_s, cpu_s, peak_rss_mb, output_chars, limit_hit가 기록된다.
+        커널이 interrupt에 응답하지 않아 재시작했으면 결과의 'restarted'가 True (네임스페이스가 모두 사라짐).
+        """
         try:
             msg_id = self.kc.execute(code)
         except Exception as e:
             return {"stdout": "", "stderr": str(e)}
 
-        stdout, stderr = [], []
+        sink = ExecutionSink(msg_id, on_output=on_output, max_output=max_output)
+        tracker = UsageTracker(self.pid, budget)
+        last_msg = time.time()
         while True:
             try:
-                msg = self.kc.get_iopub_msg(timeout=timeout)
-                if msg['parent_header'].get('msg_id') != msg_id: continue
-                
-                msg_type = msg['msg_type']
-                content = msg['content']
-                
-                if msg_type == 'stream':
-                    if content['name'] == 'stdout': stdout.append(content['text'])
-                    elif content['name'] == 'stderr': stderr.append(content['text'])
-                elif msg_type == 'error':
-                    stderr.append(f"{content['ename']}: {content['evalue']}")
-                elif msg_type == 'status' and content['execution_state'] == 'idle':
+                msg = self.kc.get_iopub_msg(timeout=min(timeout, GOVERNOR_POLL_S))
+            except queue.Empty:
+                msg = None
+            if msg is not None:
+                last_msg = time.time()
+                if sink.feed(msg):
                     break
+            if self._govern(sink, tracker, last_msg, timeout):
+                break
+
+        if sink.restart_needed:
+            self.restart()
+        return self._finish(sink, tracker)
+
+    async def execute_async(self, code, timeout=30, on_output=None, max_output=MAX_OUTPUT_CHARS, budget=None):
+        """execute()의 비동기 버전. iopub 대기 중에 스레드를 점유하지 않는다."""
+        try:
+            akc = self._get_async_client()
+            msg_id = akc.execute(code)
+        except Exception as e:
+            return {"stdout": "", "stderr": str(e)}
+
+        sink = ExecutionSink(msg_id, on_output=on_output, max_output=max_output)
+        tracker = UsageTracker(self.pid, budget)
+        last_msg = time.time()
+        while True:
+            try:
+                msg = await akc.get_iopub_msg(timeout=min(timeout, GOVERNOR_POLL_S))
             except queue.Empty:
-                stderr.append("Timeout")
+                msg = None
+            if msg is not None:
+                last_msg = time.time()
+                if sink.feed(msg):
+                    break
+            if self._govern(sink, tracker, last_msg, timeout):
                 break
-        
-        return {"stdout": "".join(stdout), "stderr": "".join(stderr)}
+
+        if sink.restart_needed:
+            # 재시작(커널 종료 + 새 커널 대기)은 수 초 걸리므로 이벤트 루프를 막지 않도록 스레드에서 실행
+            # async 클라이언트는 이 루프에 묶여 있으므로 여기서 먼저 닫음
+            self._stop_async_client()
+            await _in_thread(self.restart)
+        return self._finish(sink, tracker)
+
+    def _govern(self, sink, tracker, last_msg, timeout):
+        """
+        예산/타임아웃을 점검하고 넘었으면 커널을 interrupt.
+        interrupt 후 INTERRUPT_GRACE_S 안에 idle이 되지 않으면 sink.restart_needed를 켜고 True(루프 종료) 반환.
+        재시작은 호출자(execute / execute_async)가 함.
+        """
+        if not sink.stop_reason:
+            if time.time() - last_msg > timeout:
+                sink.stop_reason = "timeout"
+            else:
+                sink.stop_reason = tracker.check(sink.output_chars)
+
+        if not sink.stop_reason:
+            return False
+
+        if sink.interrupted_at is None:
+            logger.warning(f"⏱️ Execution limit hit ({sink.stop_reason}). Interrupting kernel...")
+            self.interrupt()
+            sink.interrupted_at = time.time()
+            return False
+
+        if time.time() - sink.interrupted_at > INTERRUPT_GRACE_S:
+            logger.error(f"❌ Kernel did not respond to interrupt. Restarting kernel in {self.work_dir} (all variables are lost).")
+            sink.restart_needed = True
+            sink.stderr.append("\n[Kernel restarted: did not respond to interrupt. All variables were lost]")
+            return True
+        return False
+
+    def _finish(self, sink, tracker):
+        result = sink.result()
+        limit_hit = sink.stop_reason if sink.stop_reason in ("wall", "cpu", "memory", "output", "output_limit", "timeout") else None
+        result["usage"] = tracker.usage(sink.output_chars, limit_hit)
+        result["restarted"] = sink.restart_needed
+        return result
+
+    @property
+    def pid(self):
+        """커널 프로세스 PID (자원 측정용). 알 수 없으면 None."""
+        if self.km is None:
+            return None
+        try:
+            provisioner = getattr(self.km, "provisioner", None)
+            if provisioner is not None and getattr(provisioner, "process", None) is not None:
+                return provisioner.process.pid
+            return self.km.kernel.pid
+        except Exception:
+            return None
+
+    def interrupt(self):
+        """실행 중인 코드를 중단 (커널은 살려둠)"""
+        if self.km:
+            try: self.km.interrupt_kernel()
+            except Exception as e: logger.warning(f"⚠️ Kernel interrupt failed: {e}")
+
+    def _get_async_client(self):
+        # zmq.asyncio 소켓은 이벤트 루프에 묶이므로 루프가 바뀌면 클라이언트를 새로 만든다
+        loop = asyncio.get_running_loop()
+        if self.akc is None or self._akc_loop is not loop:
+            self._stop_async_client()
+            akc = AsyncKernelClient()
+            akc.load_connection_info(self.km.get_connection_info())
+            akc.start_channels()
+            self.akc, self._akc_loop = akc, loop
+        return self.akc
+
+    def _stop_async_client(self):
+        if self.akc:
+            try: self.akc.stop_channels()
+            except: pass
+        self.akc = None
+        self._akc_loop = None
 
     def restart(self):
         self.cleanup()
         self._start_kernel()
 
     def cleanup(self):
+        self._stop_async_client()
         if self.kc: 
             try: self.kc.stop_channels()
             except: pass
@@ -123,68 +560,301 @@ class SingleKernel:
 
 
 class AgentSandbox:
-    def __init__(self, work_dir="./"):
+    def __init__(self, work_dir="./", pool=None, test_isolation=TEST_ISOLATION, test_backend=TEST_BACKEND):
         self.work_dir = work_dir
+        # KernelPool이 주어지면 커널을 새로 띄우지 않고 풀에서 빌려 씀
+        self.pool = pool
+        # Tester 커널 격리 방식
+        # - 'restart': 매 실행마다 커널 프로세스 교체 (풀이 있으면 warm 커널로 교체)
+        # - 'reset'  : 프로세스는 유지하고 네임스페이스만 초기화 (실패 시 restart로 fallback)
+        if test_isolation not in ("restart", "reset"):
+            raise ValueError(f"Unknown test_isolation: {test_isolation}")
+        self.test_isolation = test_isolation
+        # Tester 실행 백엔드
+        # - 'kernel'    : Jupyter 커널 (SingleKernel)
+        # - 'forkserver': 라이브러리를 미리 import한 zygote에서 매 실행마다 fork (ForkServerKernel)
+        if test_backend not in ("kernel", "forkserver"):
+            raise ValueError(f"Unknown test_backend: {test_backend}")
+        self.test_backend = test_backend
+
+        # 샌드박스 전용 scratch 폴더 (TEST_DIR 아래 고유 폴더). 같은 프로세스/호스트의 다른 샌드박스와 공유하지 않음
+        os.makedirs(TEST_DIR, exist_ok=True)
+        self.test_dir = tempfile.mkdtemp(prefix="sandbox_", dir=TEST_DIR)
+        self.sandbox_id = os.path.basename(self.test_dir)
+
+        # 작업 폴더의 데이터 파일을 한 번만 파싱해 두 커널이 memory map으로 공유
+        self.shared_data = SharedDataStore() if SHARE_DATA else None
+        if self.shared_data is not None:
+            self.shared_data.publish_dir(work_dir)
         
         # 1. Main Kernel: 데이터와 상태를 계속 유지 (Solver용)
         logger.info("🟢 Starting Main Kernel...")
-        self.main_kernel = SingleKernel(work_dir)
+        self.main_kernel = self._new_kernel(work_dir)
         
         # 2. Tester Kernel: 언제든 버릴 수 있는 검증용 (Tester용)
-        os.makedirs(TEST_DIR, exist_ok=True)
         logger.info("🟡 Starting Tester Kernel...")
-        self.test_kernel = SingleKernel(TEST_DIR)
+        self.test_kernel = self._new_test_kernel()
 
+        # 실행 1회당 기본 자원 예산 (run_code(budget=...)로 호출마다 덮어쓸 수 있음)
+        self.budget = ResourceBudget(wall_s=EXEC_WALL_S, cpu_s=EXEC_CPU_S, rss_mb=EXEC_RSS_MB)
 
-    def copy_files_to_tester(self, file_names: list):
-        """
-        Main 폴더의 파일들을 Tester 폴더로 복사합니다. (데이터 파일 등)
-        """
-        for fname in file_names:
-            src = os.path.join(self.work_dir, fname)
-            dst = os.path.join(TEST_DIR, fname)
-            
-            if os.path.exists(src):
-                if os.path.isdir(src):
-                    shutil.copytree(src, dst, dirs_exist_ok=True)
-                else:
-                    shutil.copy2(src, dst)
-                logger.info(f"📂 Copied {fname} to test env.")
-            else:
-                logger.warning(f"⚠️ File not found in Main: {fname}")
+        # reset 모드에서 초기화에 실패해 restart로 fallback한 횟수 (0이 아니면 reset 경로가 동작하지 않는 것)
+        self.reset_fallbacks = 0
 
+        # run_code_async 용: 동시에 실행되는 temporary 코드마다 별도 커널을 빌려 씀
+        self._async_idle_kernels = []
+        self._main_lock = None
+        self._main_lock_loop = None
+
+    def _new_kernel(self, work_dir):
+        if self.pool is not None:
+            kernel = self.pool.acquire(work_dir)
+        else:
+            kernel = SingleKernel(work_dir)
+        self._install_shared_data(kernel)
+        return kernel
 
-    def run_code(self, code: str, mode: str = "permanent") -> dict:
+    def _new_test_kernel(self):
+        if self.test_backend == "forkserver":
+            kernel = ForkServerKernel(
+                self.test_dir, preload=FORK_SERVER_PRELOAD,
+                head_chars=OUTPUT_HEAD_CHARS, tail_chars=OUTPUT_TAIL_CHARS, max_output=MAX_OUTPUT_CHARS,
+            )
+            self._install_shared_data(kernel)
+            return kernel
+        return self._new_kernel(self.test_dir)
+
+    def _install_shared_data(self, kernel):
+        """공유 데이터 로더(pd.read_csv / read_excel 캐시, load_shared)를 커널에 설치"""
+        if self.shared_data is None or not self.shared_data.manifest:
+            return
+        code = self.shared_data.loader_code()
+        if isinstance(kernel, ForkServerKernel):
+            kernel.prelude = code
+            return
+        result = kernel.execute(code)
+        if result["stderr"]:
+            logger.warning(f"⚠️ Failed to install shared data loader: {result['stderr'][:200]}")
+
+    def share_data(self, paths):
+        """데이터 파일을 공유 캐시에 추가하고 현재 커널들에 다시 설치"""
+        if self.shared_data is None:
+            return
+        for path in paths:
+            self.shared_data.publish(path)
+        for kernel in (self.main_kernel, self.test_kernel, *self._async_idle_kernels):
+            if kernel is not None:
+                self._install_shared_data(kernel)
+
+    def _release_kernel(self, kernel, recycle=False):
+        if kernel is None:
+            return
+        if isinstance(kernel, ForkServerKernel):
+            kernel.cleanup()
+        elif self.pool is not None:
+            self.pool.release(kernel, recycle=recycle)
+        else:
+            kernel.cleanup()
+
+    def _fresh_test_kernel(self):
+        """Tester 커널을 깨끗한 상태로 준비 (reset 모드면 재시작 없이 초기화)"""
+        if self.test_backend == "forkserver":
+            # 매 실행이 zygote에서 새로 fork되므로 항상 깨끗함
+            if self.test_kernel is None:
+                self.test_kernel = self._new_test_kernel()
+            return
+
+        if self.test_isolation == "reset" and self.test_kernel is not None:
+            if self.test_kernel.reset():
+                return
+            logger.warning("⚠️ Tester kernel reset failed. Falling back to restart.")
+            self.reset_fallbacks += 1
+
+        if self.pool is not None:
+            self._release_kernel(self.test_kernel)
+            self.test_kernel = self._new_kernel(self.test_dir)
+        else:
+            self.test_kernel.restart()
+            self._install_shared_data(self.test_kernel)
+
+
+    def checkpoint_main(self, name="default"):
+        """Main 커널 네임스페이스를 체크포인트 (실패한 시도를 되돌리기 위함)"""
+        spill_dir = os.path.join(CHECKPOINT_SPILL_DIR, f"ckpt_{self.sandbox_id}") if CHECKPOINT_SPILL_DIR else None
+        info = self.main_kernel.checkpoint(name, spill_dir=spill_dir)
+        if info:
+            logger.info(f"📸 Checkpoint '{name}': {info['pickled']} pickled ({info['bytes'] / 1e6:.1f}MB), {info['refs']} by reference")
+        return info is not None
+
+    def restore_main(self, name="default"):
+        """Main 커널을 checkpoint_main() 시점으로 롤백 (데이터 재로드 없이)"""
+        ok = self.main_kernel.restore(name)
+        if ok:
+            logger.info(f"⏪ Restored MAIN Kernel to checkpoint '{name}'")
+        return ok
+
+    def drop_main_checkpoint(self, name="default"):
+        """더 이상 되돌아갈 일이 없는 Main 커널 체크포인트를 지움"""
+        return self.main_kernel.drop_checkpoint(name)
+
+    def inspect_main(self, expr, setup=""):
+        """Main 커널에서 expr의 값을 JSON으로 받아옴 (출력 잘림 없이). 실패하면 None"""
+        return self.main_kernel.evaluate_json(expr, setup)
+
+    async def inspect_main_async(self, expr, setup=""):
+        async with self._get_main_lock():
+            return await self.main_kernel.evaluate_json_async(expr, setup)
+
+    def run_code(self, code: str, mode: str = "permanent", on_output=None, budget=None) -> dict:
         """
         mode에 따라 실행할 커널을 선택합니다.
         - 'permanent': Main Kernel에서 실행 (상태 저장됨)
         - 'temporary': Test Kernel에서 실행 (격리됨)
+        on_output(name, text)을 주면 출력이 도착하는 대로 스트리밍 (False 반환 시 실행 중단)
+        budget(ResourceBudget)을 주면 기본 예산(self.budget) 대신 사용. 결과의 'usage'에 사용량 기록
         """
+        budget = budget or self.budget
         
         if mode == "temporary":
             # 🔥 Tester 커널에서 실행
             # 옵션: 매 테스트마다 커널을 재시작해서 '완전 순수 상태'를 보장할 수도 있음
-            self.test_kernel.restart() # 너무 느리면 생략 가능
+            self._fresh_test_kernel() # 너무 느리면 생략 가능
             
             logger.info("🧪 Running in TESTER Kernel (Isolated)")
-            return self.test_kernel.execute(code)
+            result = self.test_kernel.execute(code, on_output=on_output, budget=budget)
+            if self._kernel_restarted(result, "TESTER"):
+                self._install_shared_data(self.test_kernel)
+            return result
             
         else: # permanent
             # 🔥 Main 커널에서 실행
             logger.info("💾 Running in MAIN Kernel (Stateful)")
-            return self.main_kernel.execute(code)
+            result = self.main_kernel.execute(code, on_output=on_output, budget=budget)
+            if self._kernel_restarted(result, "MAIN"):
+                self._install_shared_data(self.main_kernel)
+            return result
+
+    @staticmethod
+    def _kernel_restarted(result, role):
+        """
+        실행 중 커널이 재시작됐는지 (interrupt에 응답하지 않은 경우). 결과의 'restarted'로 호출자에게도 전달됨.
+        재시작된 커널은 변수 / 체크포인트 / 공유 데이터 로더가 모두 사라진 상태.
+        """
+        if not result.get("restarted"):
+            return False
+        logger.error(f"♻️ {role} Kernel was restarted during execution: its variables and checkpoints are gone")
+        return True
+
+    # ------------------------------------------------------------------
+    # 비동기 실행 API
+    # ------------------------------------------------------------------
+    async def run_code_async(self, code: str, mode: str = "permanent", on_output=None, budget=None) -> dict:
+        """
+        run_code()의 비동기 버전.
+        - 'permanent': Main Kernel에서 실행 (상태 공유이므로 한 번에 하나씩 순서대로)
+        - 'temporary': 호출마다 격리된 커널을 따로 빌려 실행하므로 여러 개를 동시에 await 할 수 있음
+        """
+        budget = budget or self.budget
+        if mode == "temporary":
+            if self.test_backend == "forkserver":
+                logger.info("🧪 Running in TESTER fork (Isolated, async)")
+                return await self.test_kernel.execute_async(code, on_output=on_output, budget=budget)
+
+            kernel = await self._lease_test_kernel()
+            try:
+                logger.info("🧪 Running in TESTER Kernel (Isolated, async)")
+                result = await kernel.execute_async(code, on_output=on_output, budget=budget)
+                if self._kernel_restarted(result, "TESTER"):
+                    await _in_thread(self._install_shared_data, kernel)
+                return result
+            finally:
+                await self._return_test_kernel(kernel)
+
+        else: # permanent
+            async with self._get_main_lock():
+                logger.info("💾 Running in MAIN Kernel (Stateful, async)")
+                result = await self.main_kernel.execute_async(code, on_output=on_output, budget=budget)
+                if self._kernel_restarted(result, "MAIN"):
+                    await _in_thread(self._install_shared_data, self.main_kernel)
+                return result
+
+    async def run_codes_async(self, codes: list, mode: str = "temporary") -> list:
+        """여러 코드를 동시에 실행하고 입력 순서대로 결과를 반환."""
+        return await asyncio.gather(*[self.run_code_async(c, mode=mode) for c in codes])
+
+    def _get_main_lock(self):
+        loop = asyncio.get_running_loop()
+        if self._main_lock is None or self._main_lock_loop is not loop:
+            self._main_lock = asyncio.Lock()
+            self._main_lock_loop = loop
+        return self._main_lock
+
+    async def _lease_test_kernel(self):
+        # 동시에 도는 테스트가 같은 fixture 파일(test.csv 등)을 덮어쓰지 않도록 대여마다 전용 scratch 폴더를 줌
+        lease_dir = tempfile.mkdtemp(prefix="lease_", dir=self.test_dir)
+        if self._async_idle_kernels:
+            kernel = self._async_idle_kernels.pop()
+            await _in_thread(kernel.set_work_dir, lease_dir)
+            return kernel
+        # 커널 시작(또는 풀에서 대여)만 스레드에서 수행; 실행 대기는 이벤트 루프에서 처리
+        return await _in_thread(self._new_kernel, lease_dir)
+
+    async def _return_test_kernel(self, kernel):
+        lease_dir = kernel.work_dir
+        # reset 모드면 초기화 후 재사용, 아니면 폐기 (다음 대여 때 새 커널)
+        if self.test_isolation == "reset" and await kernel.reset_async():
+            self._async_idle_kernels.append(kernel)
+        else:
+            if self.test_isolation == "reset":
+                logger.warning("⚠️ Tester kernel reset failed. Discarding it.")
+                self.reset_fallbacks += 1
+            await _in_thread(self._release_kernel, kernel)
+        shutil.rmtree(lease_dir, ignore_errors=True)
 
     def cleanup(self):
-        self.main_kernel.cleanup()
-        self.test_kernel.cleanup()
-        shutil.rmtree(TEST_DIR, ignore_errors=True)
+        if CHECKPOINT_SPILL_DIR:
+            shutil.rmtree(os.path.join(CHECKPOINT_SPILL_DIR, f"ckpt_{self.sandbox_id}"), ignore_errors=True)
+        for kernel in self._async_idle_kernels:
+            self._release_kernel(kernel, recycle=self.test_isolation == "reset")
+        self._async_idle_kernels = []
+        self._release_kernel(self.main_kernel)
+        # Tester 커널은 reset 모드라면 초기화 후 풀에서 재사용 가능
+        self._release_kernel(self.test_kernel, recycle=self.test_isolation == "reset")
+        self.main_kernel = None
+        self.test_kernel = None
+        shutil.rmtree(self.test_dir, ignore_errors=True)
 
     def cleanup_main_kernel(self):
         self.main_kernel.cleanup()
 
     def cleanup_test_kernel(self):
-        self.test_kernel.cleanup()
-        shutil.rmtree(TEST_DIR, ignore_errors=True)
+        if self.test_isolation == "reset" or self.test_backend == "forkserver":
+            # reset/forkserver: 커널은 살려두고 다음 temporary 실행 직전에 네임스페이스만 초기화
+            self._clear_test_dir()
+            return
+        if self.pool is not None:
+            # 풀 모드: 다 쓴 커널은 풀에 반납하고, 다음 temporary 실행 때 새로 빌림
+            self._release_kernel(self.test_kernel)
+            self.test_kernel = None
+        else:
+            self.test_kernel.cleanup()
+        self._clear_test_dir()
+
+    def _clear_test_dir(self):
+        """
+        Tester가 만든 파일만 지움.
+        폴더 자체는 Tester 커널의 cwd이므로 지우지 않고 내용만 비움 (지우면 다음 reset이 실패함).
+        """
+        os.makedirs(self.test_dir, exist_ok=True)
+        for name in os.listdir(self.test_dir):
+            path = os.path.join(self.test_dir, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
 
     def __enter__(self):
         return self
@@ -201,13 +871,15 @@ class AgentSandbox:
         - DataFrame/Series: 요약 정보만 가져옴 (답변의 근거용)
         - Model/Others: 존재 여부만 확인
         """
+        # pandas/numpy는 커널에 이미 로드된 경우에만 참조 (매 호출마다 import하지 않음)
         inspection_code = """
 import json
-import pandas as pd
-import numpy as np
+import sys
 import types
 
 def _get_final_context():
+    np = sys.modules.get('numpy')
+    number_types = (int, float, np.number) if np is not None else (int, float)
     context = {
         "answers": {},   # 최종 답안 후보 (int, float, str)
         "evidence": {}   # 증거 자료 (DataFrame, Plot 등)
@@ -220,7 +892,7 @@ def _get_final_context():
             continue
 
         # 1. 🎯 Answers: 스칼라 값 (숫자, 짧은 문자열) -> 직접적인 정답일 확률 99%
-        if isinstance(val, (int, float, np.number)):
+        if isinstance(val, number_types):
             context['answers'][name] = val
         elif isinstance(val, str) and len(val) < 200: # 너무 긴 문자열은 제외
             context['answers'][name] = val
@@ -243,19 +915,8 @@ def _get_final_context():
                 'type': type(val).__name__
             }
             
-    return json.dumps(context, default=str)
-
-print(_get_final_context())
+    return context
 """
-        result = self.main_kernel.execute(inspection_code)
-        
-        if result['stderr']:
-            logger.error(f"Error inspecting variables: {result['stderr']}")
-            return {}
-            
-        try:
-            return json.loads(result['stdout'])
-        except Exception as e:
-            logger.error(f"Failed to parse inspection result: {e}")
-            logger.debug(f"Raw stdout: {result['stdout']}")
-            return {}
\ No newline at end of file
+        # stdout으로 받으면 큰 컨텍스트가 head/tail 버퍼에서 잘려 JSON이 깨지므로 파일로 받음
+        context = self.main_kernel.evaluate_json("_get_final_context()", setup=inspection_code)
+        return context if context is not None else {}
\ No newline at end of file
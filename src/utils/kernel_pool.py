@@ -0,0 +1,189 @@
+import atexit
+import logging
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+from .jupyter_sandbox import SingleKernel
+
+logger = logging.getLogger(__name__)
+
+
+class KernelPool:
+    """
+    미리 띄워둔(Warm) Jupyter 커널 풀.
+
+    - 백그라운드 스레드가 항상 `size`개의 준비된 커널을 유지한다.
+    - acquire(): 준비된 커널이 있으면 바로 꺼내 작업 폴더만 바꿔서 반환 (hit),
+      비어 있으면 기존처럼 그 자리에서 커널을 새로 띄운다 (miss).
+    - release(): 다 쓴 커널은 상태가 오염되어 있으므로 백그라운드에서 종료하고,
+      빈 자리는 새 커널로 채운다. recycle=True면 네임스페이스 reset 후 풀에 되돌린다.
+    """
+
+    def __init__(self, size=2):
+        self.size = size
+        # 대기 중인 커널은 아무 데이터도 없는 빈 폴더에서 기다림
+        self.idle_dir = tempfile.mkdtemp(prefix="toolgen_pool_")
+
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._starting = 0
+        self._closed = False
+        self._discard_threads = []
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "acquire_wait_s": 0.0,
+            "started": 0,
+            "start_failures": 0,
+            "discarded": 0,
+            "recycled": 0,
+        }
+
+        self._filler = threading.Thread(target=self._fill_loop, name="KernelPoolFiller", daemon=True)
+        self._filler.start()
+        atexit.register(self.shutdown)
+
+    # ------------------------------------------------------------------
+    # 백그라운드 충전
+    # ------------------------------------------------------------------
+    def _fill_loop(self):
+        while not self._closed:
+            with self._lock:
+                need = self.size - self._ready.qsize() - self._starting
+                if need > 0:
+                    self._starting += 1
+
+            if need <= 0:
+                self._wakeup.wait(timeout=1.0)
+                self._wakeup.clear()
+                continue
+
+            try:
+                kernel = SingleKernel(self.idle_dir)
+            except Exception as e:
+                logger.warning(f"⚠️ KernelPool: failed to pre-start kernel: {e}")
+                with self._lock:
+                    self._starting -= 1
+                    self.stats["start_failures"] += 1
+                # 연속 실패 시 CPU를 태우지 않도록 잠깐 쉼
+                self._wakeup.wait(timeout=5.0)
+                self._wakeup.clear()
+                continue
+
+            with self._lock:
+                self._starting -= 1
+                self.stats["started"] += 1
+                closed = self._closed
+                if not closed:
+                    self._ready.put(kernel)
+            if closed:
+                kernel.cleanup()
+
+    # ------------------------------------------------------------------
+    # 대여 / 반납
+    # ------------------------------------------------------------------
+    def acquire(self, work_dir="./"):
+        """work_dir에서 바로 쓸 수 있는 커널을 반환. 풀이 비어 있으면 on-demand로 시작."""
+        start = time.time()
+        kernel = None
+
+        while True:
+            try:
+                candidate = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            if candidate.is_alive():
+                kernel = candidate
+                break
+            # 대기 중에 죽은 커널은 버리고 다음 후보 확인
+            self._discard(candidate)
+
+        self._wakeup.set()
+
+        if kernel is not None:
+            try:
+                kernel.set_work_dir(work_dir)
+                hit = True
+            except Exception as e:
+                logger.warning(f"⚠️ KernelPool: pooled kernel unusable ({e}), starting on demand.")
+                self._discard(kernel)
+                kernel = None
+
+        if kernel is None:
+            hit = False
+            kernel = SingleKernel(work_dir)
+
+        waited = time.time() - start
+        with self._lock:
+            self.stats["hits" if hit else "misses"] += 1
+            self.stats["acquire_wait_s"] += waited
+
+        logger.info(f"🏊 KernelPool {'hit' if hit else 'miss'} ({waited:.2f}s) -> {work_dir}")
+        return kernel
+
+    def release(self, kernel, recycle=False):
+        """사용이 끝난 커널을 반납. 기본은 폐기 후 새 커널로 보충, recycle=True면 reset 후 재사용."""
+        if kernel is None:
+            return
+        if recycle and not self._closed and self._ready.qsize() < self.size:
+            try:
+                if kernel.reset():
+                    kernel.set_work_dir(self.idle_dir)
+                    with self._lock:
+                        self.stats["recycled"] += 1
+                    self._ready.put(kernel)
+                    return
+            except Exception as e:
+                logger.warning(f"⚠️ KernelPool: recycle failed ({e}), discarding kernel.")
+        self._discard(kernel)
+        self._wakeup.set()
+
+    def _discard(self, kernel):
+        t = threading.Thread(target=kernel.cleanup, name="KernelPoolDiscard", daemon=True)
+        t.start()
+        with self._lock:
+            self.stats["discarded"] += 1
+            self._discard_threads = [d for d in self._discard_threads if d.is_alive()] + [t]
+
+    # ------------------------------------------------------------------
+    # 통계 / 종료
+    # ------------------------------------------------------------------
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        stats["avg_acquire_wait_s"] = stats["acquire_wait_s"] / total if total else 0.0
+        stats["ready"] = self._ready.qsize()
+        return stats
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._filler.join(timeout=30)
+
+        while True:
+            try:
+                kernel = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            kernel.cleanup()
+
+        for t in list(self._discard_threads):
+            t.join(timeout=10)
+
+        shutil.rmtree(self.idle_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+        return False
@@ -0,0 +1,192 @@
+"""
+LLM 응답 캐시 (SQLite, 내용 기반 키, 크기 제한 LRU).
+
+모든 ChatOpenAI(agent / reasoning 노드)가 cache=get_llm_cache()로 공유한다.
+키 = sha256(모델 설정 문자열 + 프롬프트 + 같은 요청의 몇 번째 호출인지).
+- 모델 설정 문자열(llm_string)은 LangChain이 만들어 줌: 모델명, temperature, 호출 파라미터 포함
+- 같은 프롬프트를 여러 번 부르는 경우(planner 파싱 재시도, creator 재시도, self-consistency 샘플)는
+  n번째 호출이 n번째로 저장된 응답을 받으므로 재시도가 같은 응답에 갇히지 않고, 재실행 시 같은 순서로 재생됨
+- 모드 (LLM_CACHE_MODE): "off" | "readwrite" (없으면 API 호출 후 저장) | "replay" (없으면 LLMCacheMiss, 네트워크 호출 없음)
+- 여러 프로세스가 같은 DB를 써도 됨 (WAL + busy timeout), 스레드 간 공유 가능
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import logging
+import warnings
+from collections import defaultdict
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+from ..config import LLM_CACHE_DB, LLM_CACHE_MODE, LLM_CACHE_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+_EVICT_EVERY = 64  # update 몇 번마다 크기 제한을 확인할지
+CACHE_HIT_KEY = "llm_cache_hit"
+
+def _load_generations(data):
+    # langchain_core 버전에 따라 loads()가 hit마다 beta / deprecation 경고를 남기므로 끔
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        generations = [loads(g) for g in json.loads(data)]
+    # 콜백(llm_ledger)이 캐시 hit을 구분할 수 있도록 표시
+    for generation in generations:
+        generation.generation_info = {**(generation.generation_info or {}), CACHE_HIT_KEY: True}
+    return generations
+
+
+def is_cache_hit(response):
+    """on_llm_end에 들어온 LLMResult가 캐시에서 나온 것인지"""
+    try:
+        return bool((response.generations[0][0].generation_info or {}).get(CACHE_HIT_KEY))
+    except (IndexError, AttributeError):
+        return False
+
+
+class LLMCacheMiss(RuntimeError):
+    """replay 모드에서 캐시에 없는 요청이 들어옴"""
+
+
+class LLMCache(BaseCache):
+    def __init__(self, path=LLM_CACHE_DB, max_mb=LLM_CACHE_MAX_MB, replay=False):
+        """
+        path: SQLite 파일 경로
+        max_mb: 저장된 응답 크기 합의 상한 (MB, None이면 제한 없음). 넘으면 오래 안 쓴 것부터 삭제
+        replay: True면 캐시에 없는 요청은 LLMCacheMiss를 던짐
+        """
+        self.path = path
+        self.max_bytes = max_mb * 1024 * 1024 if max_mb else None
+        self.replay = replay
+        self._lock = threading.Lock()
+        self._seen = defaultdict(int)       # 요청 해시 -> 이번 프로세스에서 lookup한 횟수
+        self._pending = defaultdict(list)   # 요청 해시 -> 아직 응답을 저장하지 않은 호출 순번
+        self._updates = 0
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+
+    @staticmethod
+    def _request_hash(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+
+    @staticmethod
+    def _key(request_hash, occurrence):
+        return f"{request_hash}:{occurrence}"
+
+    def lookup(self, prompt, llm_string):
+        request_hash = self._request_hash(prompt, llm_string)
+        with self._lock:
+            occurrence = self._seen[request_hash]
+            self._seen[request_hash] += 1
+            key = self._key(request_hash, occurrence)
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+                self.stats["hits"] += 1
+                return _load_generations(row[0])
+            self.stats["misses"] += 1
+            if self.replay:
+                raise LLMCacheMiss(f"Replay mode: no cached response for request {request_hash[:12]} (call #{occurrence})")
+            self._pending[request_hash].append(occurrence)
+            return None
+
+    def update(self, prompt, llm_string, return_val):
+        request_hash = self._request_hash(prompt, llm_string)
+        data = json.dumps([dumps(g) for g in return_val])
+        with self._lock:
+            pending = self._pending.get(request_hash)
+            if pending:
+                # 실패한 호출이 남긴 순번도 있으므로 가장 앞 순번부터 채움 (재실행 시 같은 순서로 재생)
+                occurrence = min(pending)
+                pending.remove(occurrence)
+                if not pending:
+                    del self._pending[request_hash]
+            else:
+                occurrence = max(self._seen[request_hash] - 1, 0)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (self._key(request_hash, occurrence), data, len(data), time.time()),
+            )
+            self._updates += 1
+            if self._updates % _EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 최근에 쓴 것부터 누적해서 상한을 넘는 나머지를 삭제
+        deleted = self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC) AS running FROM llm_cache)"
+            " WHERE running > ?)", (self.max_bytes,)
+        ).rowcount
+        self.stats["evicted"] += deleted
+        logger.info(f"🧹 LLM cache: evicted {deleted} least recently used responses")
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._seen.clear()
+            self._pending.clear()
+
+    def reset_replay(self):
+        """호출 순번을 처음부터 다시 셈 (같은 프로세스에서 같은 태스크를 다시 재생할 때)"""
+        with self._lock:
+            self._seen.clear()
+            self._pending.clear()
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / total, 3) if total else 0.0
+        stats["mode"] = "replay" if self.replay else "readwrite"
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._evict()
+                self._conn.close()
+                self._conn = None
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    프로세스 전체에서 공유하는 LLM 캐시. LLM_CACHE_MODE가 "off"면 None (ChatOpenAI 기본 동작).
+    """
+    global _default_cache
+    if LLM_CACHE_MODE == "off":
+        return None
+    if LLM_CACHE_MODE not in ("readwrite", "replay"):
+        raise ValueError(f"Unknown LLM_CACHE_MODE: {LLM_CACHE_MODE} (off | readwrite | replay)")
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache(replay=LLM_CACHE_MODE == "replay")
+        return _default_cache
+
+
+def llm_cache_report():
+    return _default_cache.report() if _default_cache is not None else {"mode": "off"}
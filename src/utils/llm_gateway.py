@@ -0,0 +1,367 @@
+"""
+프로세스 전체가 공유하는 LLM 게이트웨이.
+
+agent / reasoning 노드와 채점(grade_math LLM judge)의 ChatOpenAI를 모두 여기서 만든다.
+- HTTP 커넥션 풀: httpx Client / AsyncClient 하나씩을 모든 클라이언트가 공유 (keep-alive 재사용)
+- AdaptiveRateLimiter: 초당 요청 수 + 분당 토큰 수 token bucket
+  429 응답이 오면 Retry-After 동안 모든 호출을 멈추고 요청 속도를 절반으로 낮춘 뒤, 성공이 이어지면 서서히 회복
+- 우선순위 lane: 높은 lane("high", judge 등 짧은 호출)의 대기자가 있으면 낮은 lane은 통과하지 않음
+- 호출자별 사용량 (호출 수, 토큰, 지연, 에러): usage_report()
+"""
+import json
+import time
+import asyncio
+import threading
+import logging
+from email.utils import parsedate_to_datetime
+from collections import defaultdict
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from ..config import (
+    BASE_URL, API_KEY, MODEL_NAME,
+    LLM_REQUESTS_PER_SECOND, LLM_MAX_BURST, LLM_TOKENS_PER_MINUTE,
+    LLM_MAX_RETRIES, LLM_REQUEST_TIMEOUT, LLM_HTTP_MAX_CONNECTIONS, LLM_HTTP_MAX_KEEPALIVE,
+)
+from .llm_cache import get_llm_cache, is_cache_hit
+from .llm_ledger import get_ledger, is_estimated
+
+logger = logging.getLogger(__name__)
+
+LANES = ("high", "normal", "low")
+
+
+class AdaptiveRateLimiter(BaseRateLimiter):
+    """
+    요청 수 / 토큰 수 token bucket + 429 적응 + 우선순위 lane.
+    requests_per_second가 None이면 요청 수 제한 없이 429 대기 / 토큰 제한만 적용.
+    토큰은 응답을 받은 뒤 실제 사용량만큼 차감하므로 잔량이 음수가 되면 회복될 때까지 새 요청을 막는다.
+    """
+
+    def __init__(self, requests_per_second=None, max_burst=1, tokens_per_minute=None,
+                 check_every_n_seconds=0.05, min_rate_fraction=0.1, recovery_fraction=0.05):
+        self.max_rate = requests_per_second
+        self.rate = requests_per_second
+        self.max_burst = max_burst
+        self.tokens_per_minute = tokens_per_minute
+        self.check_every_n_seconds = check_every_n_seconds
+        self.min_rate_fraction = min_rate_fraction
+        self.recovery_fraction = recovery_fraction
+
+        self._requests = float(max_burst)
+        self._tokens = float(tokens_per_minute) if tokens_per_minute else None
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = {lane: 0 for lane in LANES}
+        self._lock = threading.Lock()
+        self.stats = {"rate_limited": 0, "paused_s": 0.0}
+
+    # ------------------------------------------------------------------
+    # bucket
+    # ------------------------------------------------------------------
+    def _refill(self, now):
+        elapsed = now - self._last
+        self._last = now
+        if self.rate:
+            self._requests = min(self.max_burst, self._requests + elapsed * self.rate)
+        if self._tokens is not None:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _try_take(self, lane):
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            if now < self._paused_until:
+                return False
+            # 더 높은 lane에 대기자가 있으면 양보
+            if any(self._waiting[higher] for higher in LANES[:LANES.index(lane)]):
+                return False
+            if self.rate and self._requests < 1:
+                return False
+            if self._tokens is not None and self._tokens <= 0:
+                return False
+            if self.rate:
+                self._requests -= 1
+            return True
+
+    def _set_waiting(self, lane, delta):
+        with self._lock:
+            self._waiting[lane] += delta
+
+    def acquire(self, *, blocking=True, lane="normal"):
+        if self._try_take(lane):
+            return True
+        if not blocking:
+            return False
+        self._set_waiting(lane, 1)
+        try:
+            while not self._try_take(lane):
+                time.sleep(self.check_every_n_seconds)
+        finally:
+            self._set_waiting(lane, -1)
+        return True
+
+    async def aacquire(self, *, blocking=True, lane="normal"):
+        if self._try_take(lane):
+            return True
+        if not blocking:
+            return False
+        self._set_waiting(lane, 1)
+        try:
+            while not self._try_take(lane):
+                await asyncio.sleep(self.check_every_n_seconds)
+        finally:
+            self._set_waiting(lane, -1)
+        return True
+
+    def lane(self, name):
+        """ChatOpenAI(rate_limiter=...)에 넘길 lane 전용 limiter"""
+        if name not in LANES:
+            raise ValueError(f"Unknown lane: {name} (one of {LANES})")
+        return _LaneLimiter(self, name)
+
+    # ------------------------------------------------------------------
+    # 응답 피드백 (httpx response hook에서 호출)
+    # ------------------------------------------------------------------
+    def record_tokens(self, tokens):
+        if self._tokens is None or not tokens:
+            return
+        with self._lock:
+            self._tokens -= tokens
+
+    def on_rate_limited(self, retry_after=None):
+        """429: retry_after초(없으면 1초) 동안 전체 정지 + 요청 속도 절반"""
+        wait = retry_after if retry_after is not None else 1.0
+        with self._lock:
+            now = time.monotonic()
+            until = now + wait
+            if until > self._paused_until:
+                self.stats["paused_s"] += until - max(now, self._paused_until)
+                self._paused_until = until
+            if self.max_rate:
+                self.rate = max(self.max_rate * self.min_rate_fraction, self.rate / 2)
+            self.stats["rate_limited"] += 1
+            rate = self.rate
+        logger.warning(f"⏳ LLM rate limited (429). Pausing {wait:.1f}s, rate -> {rate}")
+
+    def on_success(self):
+        if not self.max_rate or self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery_fraction)
+
+    def report(self):
+        with self._lock:
+            return dict(
+                self.stats,
+                rate=self.rate,
+                tokens_left=None if self._tokens is None else int(self._tokens),
+                waiting=dict(self._waiting),
+            )
+
+
+class _LaneLimiter(BaseRateLimiter):
+    def __init__(self, limiter, lane):
+        self.limiter = limiter
+        self.lane = lane
+
+    def acquire(self, *, blocking=True):
+        return self.limiter.acquire(blocking=blocking, lane=self.lane)
+
+    async def aacquire(self, *, blocking=True):
+        return await self.limiter.aacquire(blocking=blocking, lane=self.lane)
+
+
+# ----------------------------------------------------------------------
+# 호출자별 사용량
+# ----------------------------------------------------------------------
+_usage = defaultdict(lambda: {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_s": 0.0})
+_usage_lock = threading.Lock()
+
+
+def record_usage(caller, prompt_tokens=0, completion_tokens=0, latency=0.0, error=False):
+    with _usage_lock:
+        entry = _usage[caller]
+        entry["calls"] += 1
+        entry["errors"] += int(error)
+        entry["prompt_tokens"] += prompt_tokens or 0
+        entry["completion_tokens"] += completion_tokens or 0
+        entry["latency_s"] += latency
+
+
+def usage_report():
+    """{caller: {calls, errors, prompt_tokens, completion_tokens, latency_s, avg_latency_s}} + limiter 상태"""
+    with _usage_lock:
+        report = {caller: dict(entry) for caller, entry in _usage.items()}
+    for entry in report.values():
+        entry["latency_s"] = round(entry["latency_s"], 2)
+        entry["avg_latency_s"] = round(entry["latency_s"] / entry["calls"], 2) if entry["calls"] else 0.0
+    if _limiter is not None:
+        report["_limiter"] = _limiter.report()
+    return report
+
+
+def _message_usage(response):
+    """LLMResult에서 (prompt_tokens, completion_tokens)"""
+    try:
+        usage = response.generations[0][0].message.usage_metadata or {}
+    except (IndexError, AttributeError):
+        usage = {}
+    return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+
+
+class UsageCallback(BaseCallbackHandler):
+    """ChatOpenAI에 붙여 호출자별 사용량과 호출별 장부(llm_ledger)를 기록"""
+
+    def __init__(self, caller):
+        self.caller = caller
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._started[run_id] = (time.perf_counter(), metadata or {})
+
+    def _finish(self, run_id):
+        started, metadata = self._started.pop(run_id, (None, {}))
+        latency = time.perf_counter() - started if started is not None else 0.0
+        return latency, {
+            "node": metadata.get("langgraph_node") or self.caller,
+            "task": metadata.get("thread_id"),
+            "model": metadata.get("ls_model_name"),
+            "caller": self.caller,
+        }
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        latency, where = self._finish(run_id)
+        prompt_tokens, completion_tokens = _message_usage(response)
+        cache_hit = is_cache_hit(response)
+        if not cache_hit:
+            record_usage(self.caller, prompt_tokens, completion_tokens, latency)
+        get_ledger().record(
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+            latency=latency, cache_hit=cache_hit, estimated=is_estimated(response), **where,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        latency, where = self._finish(run_id)
+        record_usage(self.caller, latency=latency, error=True)
+        get_ledger().record(latency=latency, error=True, **where)
+
+
+# ----------------------------------------------------------------------
+# 공유 HTTP 클라이언트 / limiter
+# ----------------------------------------------------------------------
+_limiter = None
+_http_client = None
+_http_async_client = None
+_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    global _limiter
+    with _lock:
+        if _limiter is None:
+            _limiter = AdaptiveRateLimiter(
+                requests_per_second=LLM_REQUESTS_PER_SECOND,
+                max_burst=LLM_MAX_BURST,
+                tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+            )
+        return _limiter
+
+
+def _retry_after(headers):
+    """Retry-After(-ms) 헤더를 초 단위로 (없거나 해석 못 하면 None)"""
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _on_response(response, body=None):
+    limiter = get_rate_limiter()
+    if response.status_code == 429:
+        limiter.on_rate_limited(_retry_after(response.headers))
+        return
+    if response.status_code >= 400:
+        return
+    limiter.on_success()
+    if body:
+        try:
+            limiter.record_tokens((json.loads(body).get("usage") or {}).get("total_tokens", 0))
+        except (ValueError, AttributeError):
+            pass
+
+
+def _is_json(response):
+    return response.headers.get("content-type", "").startswith("application/json")
+
+
+def _response_hook(response):
+    # 스트리밍(SSE) 응답은 본문을 미리 읽으면 안 되므로 JSON 응답만 읽어서 토큰 사용량을 차감
+    body = response.read() if _is_json(response) and response.status_code < 400 else None
+    _on_response(response, body)
+
+
+async def _aresponse_hook(response):
+    body = await response.aread() if _is_json(response) and response.status_code < 400 else None
+    _on_response(response, body)
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=60,
+    )
+
+
+def get_http_clients():
+    """(httpx.Client, httpx.AsyncClient): 모든 LLM 클라이언트가 공유하는 keep-alive 커넥션 풀"""
+    global _http_client, _http_async_client
+    with _lock:
+        if _http_client is None:
+            timeout = httpx.Timeout(LLM_REQUEST_TIMEOUT, connect=10)
+            _http_client = httpx.Client(
+                limits=_limits(), timeout=timeout, event_hooks={"response": [_response_hook]},
+            )
+            _http_async_client = httpx.AsyncClient(
+                limits=_limits(), timeout=timeout, event_hooks={"response": [_aresponse_hook]},
+            )
+        return _http_client, _http_async_client
+
+
+def get_chat_model(caller, lane="normal", model=MODEL_NAME, **kwargs):
+    """
+    공유 커넥션 풀 / rate limiter / 응답 캐시를 쓰는 ChatOpenAI (llm_stream의 조기 종료 지원).
+    caller: 사용량 집계 이름 (예: "agent", "reasoning.judge")
+    lane: "high" | "normal" | "low"
+    """
+    from .llm_stream import EarlyStopChatOpenAI
+
+    http_client, http_async_client = get_http_clients()
+    return EarlyStopChatOpenAI(
+        base_url=BASE_URL,
+        api_key=API_KEY,
+        model=model,
+        max_retries=kwargs.pop("max_retries", LLM_MAX_RETRIES),
+        request_timeout=kwargs.pop("request_timeout", LLM_REQUEST_TIMEOUT),
+        rate_limiter=get_rate_limiter().lane(lane),
+        cache=get_llm_cache(),
+        http_client=http_client,
+        http_async_client=http_async_client,
+        callbacks=[UsageCallback(caller)],
+        **kwargs,
+    )
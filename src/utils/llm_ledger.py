@@ -0,0 +1,174 @@
+"""
+LLM 호출 장부 (노드별 토큰 / 지연 / 비용).
+
+게이트웨이(llm_gateway.get_chat_model)가 만든 모든 ChatOpenAI 호출이 한 줄씩 기록된다.
+- node: LangGraph 노드 이름 (metadata["langgraph_node"], 그래프 밖 호출이면 caller 이름)
+- task: thread_id (태스크 id), attempt: 같은 태스크에서 이 노드의 몇 번째 LLM 호출인지
+- prompt / completion 토큰, 지연, 캐시 hit 여부, 비용 (LLM_PRICES_PER_MTOK에 단가가 있을 때)
+- estimated: 토큰 수가 API 보고값이 아니라 추정값인지 (llm_stream 조기 종료로 사용량 chunk를 받지 못한 호출)
+실행이 끝나면 export()로 호출별 CSV + 노드별 요약 JSON을 남기고 summary_table()로 시간 / 토큰 순위를 출력한다.
+여러 프로세스(main.py 워커)가 남긴 CSV는 LLMLedger.from_csv()로 합쳐서 요약할 수 있다.
+"""
+import os
+import csv
+import json
+import threading
+from collections import defaultdict
+
+from ..config import LLM_LEDGER_DIR, LLM_PRICES_PER_MTOK
+
+FIELDS = [
+    "node", "task", "attempt", "caller", "model",
+    "prompt_tokens", "completion_tokens", "estimated", "latency_s", "cache_hit", "error", "cost_usd",
+]
+ESTIMATED_KEY = "usage_estimated"
+
+
+def is_estimated(response):
+    """on_llm_end에 들어온 LLMResult의 사용량이 추정값인지 (generation_info에 표시됨)"""
+    try:
+        return bool((response.generations[0][0].generation_info or {}).get(ESTIMATED_KEY))
+    except (IndexError, AttributeError):
+        return False
+
+
+def _cost(model, prompt_tokens, completion_tokens, cache_hit):
+    price = LLM_PRICES_PER_MTOK.get(model)
+    if price is None:
+        return None
+    if cache_hit:
+        return 0.0
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+class LLMLedger:
+    def __init__(self):
+        self._records = []
+        self._attempts = defaultdict(int)  # (task, node) -> 호출 수
+        self._lock = threading.Lock()
+
+    def record(self, node, task=None, caller=None, model=None, prompt_tokens=0, completion_tokens=0,
+               latency=0.0, cache_hit=False, error=False, estimated=False):
+        prompt_tokens, completion_tokens = prompt_tokens or 0, completion_tokens or 0
+        with self._lock:
+            self._attempts[(task, node)] += 1
+            self._records.append({
+                "node": node,
+                "task": task,
+                "attempt": self._attempts[(task, node)],
+                "caller": caller,
+                "model": model,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "estimated": bool(estimated),
+                "latency_s": round(latency, 3),
+                "cache_hit": bool(cache_hit),
+                "error": bool(error),
+                "cost_usd": _cost(model, prompt_tokens, completion_tokens, cache_hit),
+            })
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
+
+    # ------------------------------------------------------------------
+    # 집계
+    # ------------------------------------------------------------------
+    def by_node(self):
+        """노드별 합계 (총 지연 시간 내림차순)"""
+        groups = defaultdict(list)
+        for r in self.records():
+            groups[r["node"]].append(r)
+
+        rows = []
+        for node, records in groups.items():
+            latencies = [r["latency_s"] for r in records if not r["cache_hit"]]
+            costs = [r["cost_usd"] for r in records if r["cost_usd"] is not None]
+            rows.append({
+                "node": node,
+                "calls": len(records),
+                "cache_hits": sum(r["cache_hit"] for r in records),
+                "estimated": sum(r["estimated"] and not r["cache_hit"] for r in records),
+                "errors": sum(r["error"] for r in records),
+                "prompt_tokens": sum(r["prompt_tokens"] for r in records if not r["cache_hit"]),
+                "completion_tokens": sum(r["completion_tokens"] for r in records if not r["cache_hit"]),
+                "avg_prompt_tokens": round(sum(r["prompt_tokens"] for r in records) / len(records)),
+                "latency_s": round(sum(latencies), 2),
+                "p95_latency_s": round(_percentile(latencies, 0.95), 2),
+                "cost_usd": round(sum(costs), 4) if costs else None,
+            })
+        total_latency = sum(r["latency_s"] for r in rows) or 1.0
+        total_tokens = sum(r["prompt_tokens"] + r["completion_tokens"] for r in rows) or 1
+        for row in rows:
+            row["latency_share"] = round(row["latency_s"] / total_latency, 3)
+            row["token_share"] = round((row["prompt_tokens"] + row["completion_tokens"]) / total_tokens, 3)
+        rows.sort(key=lambda r: r["latency_s"], reverse=True)
+        return rows
+
+    def summary_table(self):
+        """노드별 요약을 고정폭 표로 (지연 시간 순). 토큰은 캐시 hit을 뺀 사용량, est는 토큰이 추정값인 호출 수"""
+        rows = self.by_node()
+        header = f"{'node':<24}{'calls':>7}{'hits':>6}{'est':>6}{'prompt_tok':>12}{'compl_tok':>11}{'avg_prompt':>12}" \
+                 f"{'time_s':>10}{'p95_s':>8}{'time%':>7}{'tok%':>7}{'cost$':>9}"
+        lines = [header, "-" * len(header)]
+        for r in rows:
+            cost = f"{r['cost_usd']:.3f}" if r["cost_usd"] is not None else "-"
+            lines.append(
+                f"{r['node'][:23]:<24}{r['calls']:>7}{r['cache_hits']:>6}{r['estimated']:>6}{r['prompt_tokens']:>12}"
+                f"{r['completion_tokens']:>11}{r['avg_prompt_tokens']:>12}{r['latency_s']:>10.1f}"
+                f"{r['p95_latency_s']:>8.1f}{r['latency_share'] * 100:>6.1f}%{r['token_share'] * 100:>6.1f}%{cost:>9}"
+            )
+        return "\n".join(lines)
+
+    # ------------------------------------------------------------------
+    # 저장 / 불러오기
+    # ------------------------------------------------------------------
+    def export(self, name, directory=LLM_LEDGER_DIR):
+        """{name}.csv (호출별) + {name}.json (노드별 요약)을 쓰고 경로를 반환"""
+        os.makedirs(directory, exist_ok=True)
+        csv_path = os.path.join(directory, f"{name}.csv")
+        json_path = os.path.join(directory, f"{name}.json")
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(self.records())
+        with open(json_path, "w") as f:
+            json.dump({"calls": len(self), "nodes": self.by_node()}, f, indent=2)
+        return csv_path, json_path
+
+    @classmethod
+    def from_csv(cls, paths):
+        """여러 프로세스가 export()한 CSV를 합친 장부"""
+        ledger = cls()
+        for path in paths:
+            with open(path, newline="") as f:
+                for row in csv.DictReader(f):
+                    ledger._records.append({
+                        **row,
+                        "attempt": int(row["attempt"]),
+                        "prompt_tokens": int(row["prompt_tokens"]),
+                        "completion_tokens": int(row["completion_tokens"]),
+                        "estimated": row.get("estimated") == "True",
+                        "latency_s": float(row["latency_s"]),
+                        "cache_hit": row["cache_hit"] == "True",
+                        "error": row["error"] == "True",
+                        "cost_usd": float(row["cost_usd"]) if row["cost_usd"] else None,
+                    })
+        return ledger
+
+
+_ledger = LLMLedger()
+
+
+def get_ledger():
+    """프로세스 전체에서 공유하는 장부"""
+    return _ledger
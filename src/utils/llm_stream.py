@@ -0,0 +1,151 @@
+"""
+코드를 만드는 LLM 호출의 조기 종료 (streaming).
+
+코드 블록만 쓰는 노드(reasoning code_verifier, agent solver / tester / creator)는 응답에서
+```python 블록(또는 <main_func> / <description> 태그)만 꺼내 쓰므로, 그 뒤에 모델이 쓰는 설명은
+기다릴 필요도 토큰을 낼 필요도 없다.
+
+invoke_until(llm, prompt, until)은 llm.invoke(prompt, stream=True, until=...)로 호출한다.
+- LangChain의 일반 invoke 경로(_generate_with_cache) 안에서 스트리밍하므로 응답 캐시 / rate limiter / 장부 콜백이 그대로 적용됨
+- EarlyStopChatOpenAI._stream이 chunk를 받을 때마다 until 규칙을 확인하고, 만족하면 스트림을 닫아 생성을 멈춤
+- until은 문자열 이름이라 캐시 키(llm_string)에 그대로 들어감 (조기 종료된 응답과 전체 응답이 섞이지 않음)
+"""
+import re
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_openai import ChatOpenAI
+
+from ..config import LLM_EARLY_STOP
+from .llm_gateway import get_rate_limiter
+from .llm_ledger import ESTIMATED_KEY
+
+_PYTHON_BLOCK = re.compile(r"```python(.*?)```", re.DOTALL)
+
+
+def _tool_complete(text):
+    return "</main_func>" in text and "</description>" in text and _PYTHON_BLOCK.search(text) is not None
+
+
+# until 이름 -> (응답이 완성됐는지 판정, 판정이 바뀔 수 있는 문자)
+STOP_RULES = {
+    # 첫 번째 ```python 블록 (reasoning _extract_verifier_code, agent _extract_code_block)
+    # 언어 표시 없는 ``` 블록만 쓰는 응답은 멈추지 않고 끝까지 받음 (파서의 fallback과 같은 결과)
+    "python_block": (lambda text: _PYTHON_BLOCK.search(text) is not None, "`"),
+    # Creator: <main_func>, <description> 태그 + ```python 블록 (_parse_tool)
+    "tool": (_tool_complete, "`>"),
+}
+
+
+def _estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+class EarlyStopChatOpenAI(ChatOpenAI):
+    """until 규칙이 만족되면 스트림을 닫고 거기까지의 응답을 돌려주는 ChatOpenAI"""
+
+    @staticmethod
+    def _stopper(until):
+        if until is None:
+            return None
+        if until not in STOP_RULES:
+            raise ValueError(f"Unknown early-stop rule: {until} (one of {list(STOP_RULES)})")
+        return STOP_RULES[until]
+
+    @staticmethod
+    def _stopped_chunk(messages, text):
+        # 사용량은 스트림 마지막 chunk에 오므로 중간에 끊으면 받을 수 없음 -> 글자 수로 추정해서 남기고
+        # 장부에 추정값으로 표시되도록 generation_info에 표시
+        prompt_tokens = sum(_estimate_tokens(str(m.content)) for m in messages)
+        completion_tokens = _estimate_tokens(text)
+        return ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="",
+                usage_metadata={
+                    "input_tokens": prompt_tokens,
+                    "output_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+                response_metadata={"finish_reason": "early_stop"},
+            ),
+            generation_info={ESTIMATED_KEY: True},
+        )
+
+    @staticmethod
+    def _check(stopper, text, chunk, messages):
+        """(누적 텍스트, 조기 종료면 사용량 추정 chunk 아니면 None)"""
+        if stopper is None:
+            return text, None
+        piece = chunk.text
+        text += piece
+        done, triggers = stopper
+        if any(c in piece for c in triggers) and done(text):
+            return text, EarlyStopChatOpenAI._stopped_chunk(messages, text)
+        return text, None
+
+    @staticmethod
+    def _record_tokens(chunk):
+        # SSE 응답은 httpx hook에서 본문을 읽지 않으므로 토큰 bucket 차감을 여기서 함
+        usage = chunk.message.usage_metadata if chunk is not None else None
+        if usage:
+            get_rate_limiter().record_tokens(usage.get("total_tokens", 0))
+
+    def _stream(self, messages, stop=None, run_manager=None, *, until=None, **kwargs):
+        stopper = self._stopper(until)
+        text, usage_chunk = "", None
+        stream = super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        try:
+            for chunk in stream:
+                yield chunk
+                if chunk.message.usage_metadata:
+                    usage_chunk = chunk
+                text, stopped = self._check(stopper, text, chunk, messages)
+                if stopped is not None:
+                    usage_chunk = stopped
+                    yield stopped
+                    break
+        finally:
+            # 조기 종료면 HTTP 스트림을 닫아 생성을 멈춤
+            stream.close()
+        self._record_tokens(usage_chunk)
+
+    async def _astream(self, messages, stop=None, run_manager=None, *, until=None, **kwargs):
+        stopper = self._stopper(until)
+        text, usage_chunk = "", None
+        stream = super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        try:
+            async for chunk in stream:
+                yield chunk
+                if chunk.message.usage_metadata:
+                    usage_chunk = chunk
+                text, stopped = self._check(stopper, text, chunk, messages)
+                if stopped is not None:
+                    usage_chunk = stopped
+                    yield stopped
+                    break
+        finally:
+            await stream.aclose()
+        self._record_tokens(usage_chunk)
+
+
+def _early_stop_kwargs(llm, until):
+    if not LLM_EARLY_STOP or not isinstance(llm, EarlyStopChatOpenAI):
+        return {}
+    # custom base_url이면 stream_usage 기본값이 False라서 끝까지 받은 응답의 사용량이 빠지므로 켬
+    return {"stream": True, "stream_usage": True, "until": until}
+
+
+def invoke_until(llm, prompt, until):
+    """llm.invoke(prompt)와 같지만 until 규칙이 만족되면 생성을 멈춤. 응답 텍스트 반환"""
+    return llm.invoke(prompt, **_early_stop_kwargs(llm, until)).content
+
+
+async def ainvoke_until(llm, prompt, until):
+    return (await llm.ainvoke(prompt, **_early_stop_kwargs(llm, until))).content
+
+
+def batch_until(llm, prompts, until):
+    return [r.content for r in llm.batch(prompts, **_early_stop_kwargs(llm, until))]
+
+
+async def abatch_until(llm, prompts, until):
+    return [r.content for r in await llm.abatch(prompts, **_early_stop_kwargs(llm, until))]
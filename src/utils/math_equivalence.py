@@ -0,0 +1,566 @@
+"""
+수학 정답 동치 판정 (LLM 없이 결정적으로).
+
+grade_math의 LLM judge 앞단에서 쓰는 규칙 기반 레이어.
+1. LaTeX 정규화: $, \\left/\\right, \\dfrac, 단위(\\text{ cm}), 도/퍼센트 기호, 천 단위 콤마, "x = ..." 등 제거
+2. 정규화된 문자열이 같으면 바로 동치
+3. 구간 / 튜플 / 집합 / 나열된 답은 원소별로 비교 (괄호 종류까지 비교, 집합과 나열은 순서 무시)
+4. 원소는 sympy 식으로 파싱해서
+   - 상수끼리: 유리수 / ±무한대면 정확히, 아니면 상대 오차 tol 이내면 동치 (0 근처는 아주 작은 절대 오차만 허용)
+   - 변수가 있으면: simplify(a - b) == 0, 또는 임의의 점 몇 개(0, 음수 포함)에서 값이 모두 같으면 동치
+
+is_equivalent()는 True / False / None을 반환한다.
+- True: 규칙으로 같다고 확인됨
+- False: 양쪽이 모두 평범한 숫자(정수 / 소수, 예: "12", "-0.5", "1e-4")이고 값이 다를 때만
+- None: 그 외 모두 (다르게 보여도 표기 차이일 수 있으므로 LLM judge로 넘김)
+
+답 하나의 파싱 결과(srepr, 유리수 값, 수치 값)는 ParseCache에 저장되어 재채점 시 다시 파싱하지 않는다.
+상수끼리의 비교는 캐시된 값만으로 끝나고, sympy 식은 변수가 있는 답을 비교할 때만 srepr에서 복원한다.
+정규화 / 파싱 규칙을 바꾸면 math_parse_cache.PARSER_VERSION을 올려 예전 파싱 결과를 버린다.
+"""
+import re
+import random
+import cmath
+from functools import lru_cache
+
+import sympy
+from sympy.parsing.sympy_parser import (
+    parse_expr, standard_transformations, implicit_multiplication, implicit_application,
+    function_exponentiation, convert_xor,
+)
+
+from .math_parse_cache import get_parse_cache
+
+# split_symbols는 넣지 않음 (log8 -> l*o*g*8 처럼 여러 글자 이름을 곱으로 쪼개지 않도록)
+_TRANSFORMS = standard_transformations + (
+    implicit_multiplication, implicit_application, function_exponentiation, convert_xor,
+)
+_MAX_EXPR_CHARS = 200   # 이보다 긴 식은 파싱하지 않음 (LLM judge로)
+_MAX_SIMPLIFY_OPS = 60  # 이보다 복잡한 식은 simplify 대신 수치 비교만
+_SPOT_CHECKS = 4
+_ABS_TOL = 1e-12        # 0과 비교할 때의 절대 오차 하한
+_MAX_EXPONENT = 1000    # 2^{2^{100}} 같은 식을 정수로 계산하다 멈추지 않도록 지수 크기 제한
+# sympy 파싱 전 허용 문자 (parse_expr는 내부적으로 eval을 쓰므로 그 외 문자가 있으면 파싱하지 않음)
+_SAFE_EXPR = re.compile(r"^[0-9A-Za-z+\-*/().,\s]+$")
+_IDENTIFIER = re.compile(r"[A-Za-z]+")
+_LOCALS = {"pi": sympy.pi, "oo": sympy.oo, "I": sympy.I, "E": sympy.E,
+           "sqrt": sympy.sqrt, "log": sympy.log, "exp": sympy.exp,
+           "sin": sympy.sin, "cos": sympy.cos, "tan": sympy.tan}
+# parse_expr가 eval할 때 쓰는 전역 이름 (builtins 없음, 변환 결과가 쓰는 sympy 이름만)
+_GLOBALS = {"__builtins__": {}, "Symbol": sympy.Symbol, "Integer": sympy.Integer, "Float": sympy.Float,
+            "Rational": sympy.Rational, "Add": sympy.Add, "Mul": sympy.Mul, "Pow": sympy.Pow}
+# False를 확정할 수 있는 평범한 숫자 (정수 / 소수 / 지수 표기)
+_PLAIN_NUMBER = re.compile(r"-?\d+(\.\d+)?(e-?\d+)?")
+_FUNCTIONS = ("ln", "log", "exp", "sin", "cos", "tan")
+
+
+# ----------------------------------------------------------------------
+# 문자열 정규화
+# ----------------------------------------------------------------------
+def _find_brace_group(s, start):
+    """s[start] == '{' 일 때 짝이 맞는 '}'의 위치를 반환 (없으면 -1)"""
+    depth = 0
+    for i in range(start, len(s)):
+        if s[i] == "{":
+            depth += 1
+        elif s[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def _unwrap_command(s, command):
+    """\\command{...} 를 안쪽 내용으로 바꿈"""
+    token = "\\" + command + "{"
+    while token in s:
+        start = s.index(token)
+        end = _find_brace_group(s, start + len(token) - 1)
+        if end < 0:
+            break
+        s = s[:start] + s[start + len(token):end] + s[end + 1:]
+    return s
+
+
+@lru_cache(maxsize=16384)
+def normalize_answer(text):
+    """LaTeX 답을 비교하기 쉬운 모양으로 정규화 (공백 없는 문자열)"""
+    s = str(text).strip()
+    s = s.replace("\n", " ")
+
+    # 수식 구분자
+    for left, right in (("$$", "$$"), ("$", "$"), ("\\(", "\\)"), ("\\[", "\\]")):
+        if s.startswith(left) and s.endswith(right) and len(s) >= len(left) + len(right):
+            s = s[len(left):len(s) - len(right)].strip()
+
+    # 단위 (MATH 데이터셋 관례: "\text{ cm}" 처럼 공백으로 시작하는 \text 이후는 단위)
+    if "\\text{ " in s:
+        s = s[:s.index("\\text{ ")]
+    for command in ("text", "textbf", "mbox", "mathrm", "mathbf", "operatorname"):
+        s = _unwrap_command(s, command)
+
+    s = s.replace("\\dfrac", "\\frac").replace("\\tfrac", "\\frac")
+    s = s.replace("\\left", "").replace("\\right", "")
+    s = s.replace("\\displaystyle", "")
+    for spacing in ("\\!", "\\,", "\\;", "\\:", "\\ ", "~"):
+        s = s.replace(spacing, "")
+    s = re.sub(r"\^\s*\{?\\circ\}?", "", s)
+    s = s.replace("\\circ", "").replace("\\degree", "")
+    s = s.replace("\\%", "").replace("%", "").replace("\\$", "")
+    s = re.sub(r"\\(le|ge)(q|qq)?(?![A-Za-z])", r"\\\1q", s)
+
+    s = re.sub(r"\s+", "", s)
+    s = s.rstrip(".")
+
+    # "x=5" -> "5" (좌변이 변수 하나이고 등호가 하나뿐일 때)
+    m = re.fullmatch(r"[A-Za-z](?:_\{?\w+\}?)?=([^=]+)", s)
+    if m:
+        s = m.group(1)
+
+    # 천 단위 콤마
+    if re.fullmatch(r"-?\d{1,3}(,\d{3})+(\.\d+)?", s):
+        s = s.replace(",", "")
+
+    # \frac12 -> \frac{1}{2}, \sqrt2 -> \sqrt{2}
+    s = re.sub(r"\\frac(\d)(\d)", r"\\frac{\1}{\2}", s)
+    s = re.sub(r"\\frac\{([^{}]*)\}(\d)", r"\\frac{\1}{\2}", s)
+    s = re.sub(r"\\sqrt(\d)", r"\\sqrt{\1}", s)
+
+    # .5 -> 0.5, 012 -> 12
+    s = re.sub(r"(^|[^\d])\.(\d)", r"\g<1>0.\2", s)
+    s = re.sub(r"(?<![\d.])0+(?=\d)", "", s)
+    return s
+
+
+# ----------------------------------------------------------------------
+# 구간 / 튜플 / 집합 분리
+# ----------------------------------------------------------------------
+def _split_top_level(s, sep=","):
+    """괄호 밖의 sep 기준으로 분리"""
+    parts, depth, current = [], 0, []
+    i = 0
+    while i < len(s):
+        ch = s[i]
+        if ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth -= 1
+        if depth == 0 and s.startswith(sep, i):
+            parts.append("".join(current))
+            current = []
+            i += len(sep)
+            continue
+        current.append(ch)
+        i += 1
+    parts.append("".join(current))
+    return parts
+
+
+def _outer_brackets_match(s):
+    """s의 첫 글자 괄호가 마지막 글자에서 닫히는지 (\"(1,2)+(3,4)\" 같은 경우 제외)"""
+    depth = 0
+    for i, ch in enumerate(s):
+        if ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth -= 1
+            if depth == 0 and i != len(s) - 1:
+                return False
+    return depth == 0
+
+
+def split_collection(s):
+    """
+    정규화된 답을 (kind, items)로 분리. 여러 값으로 된 답이 아니면 None.
+    - ('union', [구간...])      : A\\cupB
+    - ('set', [원소...])        : \\{1,2\\}  (순서 무시)
+    - ('list', [원소...])       : 1,2,3     (순서 무시)
+    - ('(]' 등, [원소...])      : 구간/튜플 (괄호 종류 포함, 순서 유지)
+    """
+    if "\\cup" in s:
+        return "union", _split_top_level(s, "\\cup")
+    if s.startswith("\\{") and s.endswith("\\}"):
+        return "set", _split_top_level(s[2:-2])
+    if len(s) >= 2 and s[0] in "([" and s[-1] in ")]" and _outer_brackets_match(s):
+        items = _split_top_level(s[1:-1])
+        if len(items) > 1:
+            return s[0] + s[-1], items
+    items = _split_top_level(s)
+    if len(items) > 1:
+        return "list", items
+    return None
+
+
+# ----------------------------------------------------------------------
+# sympy 변환
+# ----------------------------------------------------------------------
+def _replace_frac(s):
+    """\\frac{a}{b} -> ((a)/(b)) (중첩 포함)"""
+    while "\\frac{" in s:
+        start = s.index("\\frac{")
+        num_end = _find_brace_group(s, start + 5)
+        if num_end < 0 or num_end + 1 >= len(s) or s[num_end + 1] != "{":
+            return None
+        den_end = _find_brace_group(s, num_end + 1)
+        if den_end < 0:
+            return None
+        num = s[start + 6:num_end]
+        den = s[num_end + 2:den_end]
+        s = s[:start] + f"(({num})/({den}))" + s[den_end + 1:]
+    return s
+
+
+def _replace_sqrt(s):
+    """\\sqrt[n]{x} -> ((x)**(1/(n))), \\sqrt{x} -> sqrt(x)"""
+    while "\\sqrt" in s:
+        start = s.index("\\sqrt")
+        i = start + 5
+        root = None
+        if i < len(s) and s[i] == "[":
+            close = s.find("]", i)
+            if close < 0:
+                return None
+            root = s[i + 1:close]
+            i = close + 1
+        if i >= len(s) or s[i] != "{":
+            return None
+        end = _find_brace_group(s, i)
+        if end < 0:
+            return None
+        body = s[i + 1:end]
+        repl = f"sqrt({body})" if root is None else f"(({body})**(1/({root})))"
+        s = s[:start] + repl + s[end + 1:]
+    return s
+
+
+def _replace_mixed_numbers(s):
+    """대분수: 1\\frac{1}{2} -> (1+\\frac{1}{2}) (정수 바로 뒤의 숫자 분수만, 뒤에 변수 / 괄호가 오면 그대로)"""
+    return re.sub(
+        r"(?<![\w.}^)])(\d+)\\frac\{(\d+)\}\{(\d+)\}(?![A-Za-z\\({])",
+        r"(\1+\\frac{\2}{\3})", s,
+    )
+
+
+def _replace_functions(s):
+    """
+    \\log8 -> log(8), \\sinx -> sin(x) (괄호 없는 인자는 숫자 / 글자 하나 / \\pi 뒤에 식이 끝날 때만)
+    \\log(x), \\sin{x} 처럼 괄호가 있으면 이름만 바꿈. 그 외(\\sin^2x, \\log_28, \\log2x 등)는 None.
+    """
+    # 공백이 지워져 \\sin h 와 \\sinh 를 구분할 수 없음
+    if re.search(r"\\(sinh|cosh|tanh)", s):
+        return None
+    pattern = re.compile(r"\\(%s)" % "|".join(_FUNCTIONS))
+    out = []
+    i = 0
+    for m in pattern.finditer(s):
+        name = "log" if m.group(1) == "ln" else m.group(1)
+        rest = s[m.end():]
+        if rest[:1] in ("(", "{"):
+            out.append(s[i:m.start()] + name)
+            i = m.end()
+            continue
+        arg = re.match(r"\d+(?:\.\d+)?|\\pi|[A-Za-z]", rest)
+        if arg is None:
+            return None
+        after = rest[arg.end():arg.end() + 1]
+        if after and after not in "+-),]}=":
+            return None
+        out.append(s[i:m.start()] + f"{name}({arg.group(0)})")
+        i = m.end() + arg.end()
+    out.append(s[i:])
+    return "".join(out)
+
+
+def latex_to_sympy_str(s):
+    """정규화된 LaTeX 식을 parse_expr가 읽을 수 있는 문자열로. 변환할 수 없으면 None."""
+    s = _replace_mixed_numbers(s)
+    s = _replace_frac(s)
+    if s is None:
+        return None
+    s = _replace_sqrt(s)
+    if s is None:
+        return None
+    s = _replace_functions(s)
+    if s is None:
+        return None
+    for latex, py in (("\\pi", "pi"), ("\\infty", "oo"), ("\\cdot", "*"), ("\\times", "*"), ("\\div", "/")):
+        s = s.replace(latex, py)
+    if "\\" in s:
+        return None
+    s = s.replace("{", "(").replace("}", ")").replace("^", "**")
+    # 허수 단위: 3+4i, 2i, i
+    s = re.sub(r"(?<![A-Za-z])i(?![A-Za-z])", "I", s)
+    # 변수 뒤 괄호는 곱셈 (x(x+1)), 함수 이름은 여러 글자라 해당 없음
+    s = re.sub(r"(?<![A-Za-z])([A-Za-z])\(", r"\1*(", s)
+    return s
+
+
+def _known_identifiers(expr_str):
+    """식의 이름이 모두 아는 함수 / 상수이거나 글자 하나짜리 변수인지"""
+    return all(len(name) == 1 or name in _LOCALS for name in _IDENTIFIER.findall(expr_str))
+
+
+def parse_math(s):
+    """정규화된 답 하나를 sympy 식으로 파싱. 실패하면 None."""
+    if not s or len(s) > _MAX_EXPR_CHARS:
+        return None
+    expr_str = latex_to_sympy_str(s)
+    if expr_str is None or "__" in expr_str or not _SAFE_EXPR.match(expr_str):
+        return None
+    # 모르는 이름(print, input, 여러 글자 변수 등)이 있으면 파싱하지 않음
+    if not _known_identifiers(expr_str):
+        return None
+    try:
+        # 먼저 계산하지 않고 파싱해서 지수가 너무 큰 식은 거름
+        raw = _parse(expr_str, evaluate=False)
+        for power in raw.atoms(sympy.Pow):
+            if power.exp.is_number and abs(complex(power.exp.evalf())) > _MAX_EXPONENT:
+                return None
+        return _parse(expr_str, evaluate=True)
+    except Exception:
+        return None
+
+
+def _parse(expr_str, evaluate):
+    return parse_expr(
+        expr_str, local_dict=dict(_LOCALS), global_dict=dict(_GLOBALS),
+        transformations=_TRANSFORMS, evaluate=evaluate,
+    )
+
+
+# ----------------------------------------------------------------------
+# 동치 판정
+# ----------------------------------------------------------------------
+def _numeric(expr, subs=None):
+    value = expr.evalf(30, subs=subs) if subs else expr.evalf(30)
+    return complex(value)
+
+
+def _close(a, b, tol):
+    """상대 오차 tol 이내인지 (0 근처는 _ABS_TOL)"""
+    return abs(a - b) <= max(tol * max(abs(a), abs(b)), _ABS_TOL)
+
+
+def is_plain_number(s):
+    """정규화된 답이 평범한 숫자(정수 / 소수 / 지수 표기)인지"""
+    return _PLAIN_NUMBER.fullmatch(s) is not None
+
+
+def analyze(s, cache=None):
+    """
+    정규화된 답 하나의 파싱 결과 (캐시에 저장되는 모양).
+    {'ok', 'srepr', 'symbols', 'exact', 'value'} — ok=False면 파싱 불가
+    exact: 유리수 / ±oo면 그 문자열 (정확히 비교), value: 그 외 상수의 수치 값 [실수부, 허수부]
+    cache: ParseCache (None이면 프로세스 공유 캐시, False면 캐시 안 씀)
+    """
+    if cache is None:
+        cache = get_parse_cache()
+    # ParseCache는 __len__이 있어 비어 있으면 falsy이므로 False와 명시적으로 비교
+    if cache is not False:
+        entry = cache.get(s)
+        if entry is not None:
+            return entry
+
+    expr = parse_math(s)
+    if expr is None:
+        entry = {"ok": False}
+    else:
+        entry = {
+            "ok": True,
+            "srepr": sympy.srepr(expr),
+            "symbols": sorted(str(sym) for sym in expr.free_symbols),
+            "exact": None,
+            "value": None,
+            "_expr": expr,
+        }
+        if not expr.free_symbols:
+            if expr.is_Rational or expr in (sympy.oo, -sympy.oo):
+                entry["exact"] = str(expr)
+            else:
+                try:
+                    value = _numeric(expr)
+                    if cmath.isfinite(value):
+                        entry["value"] = [value.real, value.imag]
+                except Exception:
+                    pass
+    if cache is not False:
+        cache.put(s, entry)
+    return entry
+
+
+def _expr(entry):
+    """캐시 항목에서 sympy 식 복원 (메모리 항목에는 복원한 식을 붙여 둠)"""
+    expr = entry.get("_expr")
+    if expr is None:
+        expr = entry["_expr"] = sympy.sympify(entry["srepr"])
+    return expr
+
+
+def _constant(entry):
+    """상수 항목의 수치 값 (±oo나 값이 없으면 None)"""
+    if entry["value"] is not None:
+        return complex(*entry["value"])
+    if entry["exact"] is not None and "oo" not in entry["exact"]:
+        return complex(sympy.Rational(entry["exact"]))
+    return None
+
+
+def _entries_equivalent(ea, eb, tol):
+    """파싱 결과 두 개의 값 비교. True / False / None(판정 불가)"""
+    if ea["symbols"] or eb["symbols"]:
+        if ea["symbols"] != eb["symbols"]:
+            return None
+        return _symbolic_equivalent(_expr(ea), _expr(eb))
+
+    if ea["exact"] is not None and eb["exact"] is not None:
+        return ea["exact"] == eb["exact"]
+    va, vb = _constant(ea), _constant(eb)
+    if va is None or vb is None:
+        return None
+    return _close(va, vb, tol)
+
+
+def _symbolic_equivalent(a, b):
+    """같은 변수를 가진 sympy 식 두 개 비교"""
+    try:
+        if sympy.count_ops(a) + sympy.count_ops(b) <= _MAX_SIMPLIFY_OPS and sympy.simplify(a - b) == 0:
+            return True
+        # 임의의 점에서 값 비교 (결정적이도록 시드 고정, 0과 음수 포함: sqrt(x^2) != x)
+        rng = random.Random(0)
+        symbols = sorted(a.free_symbols, key=str)
+        checked = 0
+        for k in range(_SPOT_CHECKS):
+            subs = {sym: sympy.Float(0 if k == 0 else rng.uniform(-2.5, 2.5)) for sym in symbols}
+            va, vb = _numeric(a, subs), _numeric(b, subs)
+            if not (cmath.isfinite(va) and cmath.isfinite(vb)):
+                continue  # 정의역 밖 (1/x at 0 등)
+            if abs(va - vb) > 1e-8 * max(1.0, abs(vb)):
+                return False
+            checked += 1
+        return True if checked else None
+    except Exception:
+        return None
+
+
+def _all_plain_numbers(*item_lists):
+    return all(is_plain_number(item) for items in item_lists for item in items)
+
+
+def _items_equivalent(xs, ys, tol, ordered, cache):
+    if len(xs) != len(ys):
+        return False if _all_plain_numbers(xs, ys) else None
+    if ordered:
+        verdicts = [_atom_equivalent(x, y, tol, cache) for x, y in zip(xs, ys)]
+        if False in verdicts:
+            return False
+        return None if None in verdicts else True
+
+    # 순서 무시: 모든 원소가 짝을 찾으면 True
+    unmatched = list(ys)
+    undecided = False
+    for x in xs:
+        for j, y in enumerate(unmatched):
+            verdict = _atom_equivalent(x, y, tol, cache)
+            if verdict:
+                del unmatched[j]
+                break
+            if verdict is None:
+                undecided = True
+        else:
+            return None if undecided else False
+    return True
+
+
+def _atom_equivalent(x, y, tol, cache):
+    if x == y:
+        return True
+    ea, eb = analyze(x, cache), analyze(y, cache)
+    if not ea["ok"] or not eb["ok"]:
+        return None
+    verdict = _entries_equivalent(ea, eb, tol)
+    # 다르다는 판정은 양쪽이 평범한 숫자일 때만 확정 (그 외는 파서가 표기를 잘못 읽었을 수 있음)
+    if verdict is False and not (is_plain_number(x) and is_plain_number(y)):
+        return None
+    return verdict
+
+
+def is_equivalent(ground_truth, answer, tol=1e-4, cache=None):
+    """
+    두 답이 수학적으로 같은지 판정.
+    True / False: 규칙으로 확정 (False는 양쪽이 평범한 숫자일 때만), None: 판정 불가 (LLM judge 필요)
+    tol: 상수끼리 비교할 때의 상대 오차
+    cache: 파싱 결과 캐시 (None이면 프로세스 공유 ParseCache, False면 캐시 안 씀)
+    """
+    if ground_truth is None or answer is None:
+        return None
+    gt, ans = normalize_answer(ground_truth), normalize_answer(answer)
+    if not gt or not ans:
+        return None
+    if gt == ans:
+        return True
+
+    gt_items, ans_items = split_collection(gt), split_collection(ans)
+    if gt_items is None and ans_items is None:
+        return _atom_equivalent(gt, ans, tol, cache)
+    if gt_items is None or ans_items is None:
+        return None
+
+    (gt_kind, xs), (ans_kind, ys) = gt_items, ans_items
+    if gt_kind == "union" or ans_kind == "union":
+        if gt_kind != ans_kind:
+            return None
+        return _items_equivalent(xs, ys, tol, ordered=False, cache=cache) if len(xs) == len(ys) else None
+    if gt_kind in ("set", "list") or ans_kind in ("set", "list"):
+        # "{1,2}" 와 "1,2" 는 같은 답으로 봄
+        if {gt_kind, ans_kind} <= {"set", "list"}:
+            return _items_equivalent(xs, ys, tol, ordered=False, cache=cache)
+        return None
+    # 구간 / 튜플: 괄호 종류가 다르면 다른 답 ([1,2) vs [1,2])
+    if gt_kind != ans_kind:
+        return False if _all_plain_numbers(xs, ys) else None
+    return _items_equivalent(xs, ys, tol, ordered=True, cache=cache)
+
+
+def _round_significant(x, digits):
+    return float(f"{x:.{digits - 1}e}") if abs(x) > _ABS_TOL else 0.0
+
+
+def _group_key(s, digits, cache):
+    """정규화된 답 하나의 다수결용 키 (같은 키 = 같은 답)"""
+    items = split_collection(s)
+    if items is not None:
+        kind, xs = items
+        keys = [_group_key(x, digits, cache) for x in xs]
+        if kind in ("set", "list", "union"):
+            # "{1,2}" 와 "2,1" 은 같은 답
+            return ("union" if kind == "union" else "set", tuple(sorted(keys, key=repr)))
+        return (kind, tuple(keys))
+
+    entry = analyze(s, cache)
+    if not entry["ok"]:
+        return ("text", s)
+    if entry["symbols"]:
+        return ("expr", entry["srepr"])
+    value = _constant(entry)
+    if value is None:
+        return ("exact", entry["exact"]) if entry["exact"] is not None else ("text", s)
+    # 유리수와 소수가 같은 키가 되도록 유효숫자 digits자리 수치 값으로 비교
+    return ("number", _round_significant(value.real, digits), _round_significant(value.imag, digits))
+
+
+def group_equivalent(answers, digits=6, cache=None):
+    """
+    답 목록을 서로 같은 답끼리 묶음 (self-consistency 다수결용).
+    각 묶음은 answers의 인덱스 리스트이며 처음 나온 순서를 유지한다.
+    쌍마다 is_equivalent를 부르는 대신 답마다 키(상수는 유효숫자 digits자리 값, 식은 sympy srepr, 그 외 정규화된 문자열)를
+    만들어 같은 키끼리 묶으므로, 답이 들어온 순서와 관계없이 같은 묶음이 나온다.
+    """
+    groups = {}
+    for i, answer in enumerate(answers):
+        normalized = normalize_answer(answer) if answer is not None else ""
+        try:
+            key = _group_key(normalized, digits, cache)
+        except Exception:
+            key = ("text", normalized)
+        groups.setdefault(key, []).append(i)
+    return list(groups.values())
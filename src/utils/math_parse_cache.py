@@ -0,0 +1,149 @@
+"""
+수학 답 파싱 결과 캐시 (메모리 LRU + SQLite, 크기 제한).
+
+같은 정답 문자열이 재채점 / 모델별 채점 / reasoning judge에서 계속 다시 파싱되므로
+정규화된 답 문자열을 키로 파싱 결과(sympy srepr, 수치 값 등)를 저장해 둔다.
+- get(): 메모리 LRU -> SQLite 순서로 조회. SQLite에서 읽은 항목은 last_used를 갱신 (LRU 근사)
+- put(): 바로 SQLite에 기록. 항목 수가 max_entries를 넘으면 오래 안 쓴 것부터 삭제
+- 여러 프로세스가 같은 DB를 써도 됨 (WAL + busy timeout), 스레드 간 공유 가능
+- 행마다 PARSER_VERSION을 저장하고 다른 버전의 행은 읽지 않음 (파서를 고친 뒤 예전 파싱 결과가 남지 않도록)
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+
+from ..config import MATH_PARSE_CACHE_DB, MATH_PARSE_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+_EVICT_EVERY = 256  # put 몇 번마다 크기 제한을 확인할지
+# math_equivalence의 정규화 / 파싱 / 저장 형식을 바꾸면 올릴 것
+PARSER_VERSION = 2
+
+
+class ParseCache:
+    def __init__(self, path=MATH_PARSE_CACHE_DB, max_entries=MATH_PARSE_CACHE_SIZE, memory_entries=4096,
+                 version=PARSER_VERSION):
+        """
+        path: SQLite 파일 경로 (None이면 메모리에만 저장)
+        max_entries: SQLite에 남길 최대 항목 수
+        memory_entries: 메모리 LRU 크기
+        version: 파서 버전 (같은 버전으로 저장된 행만 읽음)
+        """
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evicted": 0}
+
+        self._conn = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " version INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(parse_cache)")]
+            if "version" not in columns:
+                # version 열이 생기기 전의 DB: 기존 행은 버전 0 (읽지 않음)
+                self._conn.execute("ALTER TABLE parse_cache ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS parse_cache_last_used ON parse_cache (last_used)")
+            stale = self._conn.execute("DELETE FROM parse_cache WHERE version < ?", (version,)).rowcount
+            if stale:
+                logger.info(f"🧹 Parse cache: dropped {stale} entries from older parser versions")
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry
+            if self._conn is None:
+                self.stats["misses"] += 1
+                return None
+            row = self._conn.execute(
+                "SELECT value FROM parse_cache WHERE key = ? AND version = ?", (key, self.version)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE parse_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            entry = json.loads(row[0])
+            self._remember(key, entry)
+            self.stats["disk_hits"] += 1
+            return entry
+
+    def put(self, key, entry):
+        """entry: JSON으로 저장할 수 있는 dict ('_'로 시작하는 키는 메모리에만 둠)"""
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is None:
+                return
+            data = json.dumps({k: v for k, v in entry.items() if not k.startswith("_")})
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parse_cache (key, value, last_used, version) VALUES (?, ?, ?, ?)",
+                (key, data, time.time(), self.version),
+            )
+            self._puts += 1
+            if self._puts % _EVICT_EVERY == 0:
+                self._evict()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM parse_cache").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM parse_cache WHERE key IN "
+                "(SELECT key FROM parse_cache ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            self.stats["evicted"] += excess
+            logger.info(f"🧹 Parse cache: evicted {excess} least recently used entries")
+
+    def __len__(self):
+        with self._lock:
+            if self._conn is None:
+                return len(self._memory)
+            return self._conn.execute("SELECT COUNT(*) FROM parse_cache").fetchone()[0]
+
+    def report(self):
+        return dict(self.stats, memory=len(self._memory))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._evict()
+                self._conn.close()
+                self._conn = None
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_parse_cache():
+    """프로세스 전체에서 공유하는 기본 캐시 (grade_math, grade_reasoning, reasoning judge)"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ParseCache()
+        return _default_cache
@@ -0,0 +1,108 @@
+"""
+샌드박스 실행 자원 관리 (Wall time / CPU time / RSS / 출력 크기).
+
+커널 프로세스의 CPU, 메모리는 /proc에서 직접 읽는다 (Linux 전용, 다른 OS에서는 측정값이 None).
+예산을 넘으면 SingleKernel이 커널을 interrupt 하고, 응답이 없으면 재시작한다.
+"""
+import os
+import time
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+@dataclass
+class ResourceBudget:
+    """실행 1회에 허용되는 자원. None이면 제한 없음."""
+    wall_s: Optional[float] = None        # 실행 시작부터의 총 시간
+    cpu_s: Optional[float] = None         # 커널 프로세스가 이번 실행 동안 쓴 CPU 시간
+    rss_mb: Optional[float] = None        # 커널 프로세스 RSS 상한
+    output_chars: Optional[int] = None    # stdout + stderr 총 글자 수
+
+
+def read_cpu_seconds(pid):
+    """/proc/<pid>/stat의 utime + stime (초). 읽을 수 없으면 None."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # comm 필드에 공백이 있을 수 있으므로 마지막 ')' 이후부터 파싱
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / _CLK_TCK
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def read_rss_mb(pid):
+    """/proc/<pid>/statm의 resident pages (MB). 읽을 수 없으면 None."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def apply_memory_limit(pid, limit_mb):
+    """커널 프로세스에 RLIMIT_AS를 걸어 메모리 폭주 시 호스트 OOM 대신 MemoryError가 나게 함."""
+    if not limit_mb or pid is None:
+        return False
+    try:
+        import resource
+        limit = int(limit_mb * 1024 * 1024)
+        resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+        return True
+    except (ImportError, AttributeError, OSError, ValueError) as e:
+        logger.warning(f"⚠️ Failed to apply memory limit to pid {pid}: {e}")
+        return False
+
+
+class UsageTracker:
+    """한 번의 실행 동안 커널 프로세스의 자원 사용량을 추적하고 예산 초과 여부를 판정"""
+
+    def __init__(self, pid, budget: Optional[ResourceBudget] = None):
+        self.pid = pid
+        self.budget = budget
+        self.start = time.time()
+        self.cpu_start = read_cpu_seconds(pid) if pid else None
+        self.cpu_s = 0.0 if self.cpu_start is not None else None
+        self.peak_rss_mb = read_rss_mb(pid) if pid else None
+        self.limit_hit = None
+
+    def poll(self):
+        if not self.pid:
+            return
+        cpu = read_cpu_seconds(self.pid)
+        if cpu is not None and self.cpu_start is not None:
+            self.cpu_s = cpu - self.cpu_start
+        rss = read_rss_mb(self.pid)
+        if rss is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0.0, rss)
+
+    def check(self, output_chars=0):
+        """예산을 넘은 항목 이름('wall' | 'cpu' | 'memory' | 'output')을 반환, 없으면 None."""
+        self.poll()
+        b = self.budget
+        if b is None:
+            return None
+        if b.wall_s and time.time() - self.start > b.wall_s:
+            self.limit_hit = "wall"
+        elif b.cpu_s and self.cpu_s is not None and self.cpu_s > b.cpu_s:
+            self.limit_hit = "cpu"
+        elif b.rss_mb and self.peak_rss_mb is not None and self.peak_rss_mb > b.rss_mb:
+            self.limit_hit = "memory"
+        elif b.output_chars and output_chars > b.output_chars:
+            self.limit_hit = "output"
+        return self.limit_hit
+
+    def usage(self, output_chars=0, limit_hit=None):
+        self.poll()
+        return {
+            "wall_s": round(time.time() - self.start, 3),
+            "cpu_s": round(self.cpu_s, 3) if self.cpu_s is not None else None,
+            "peak_rss_mb": round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+            "output_chars": output_chars,
+            "limit_hit": limit_hit or self.limit_hit,
+        }
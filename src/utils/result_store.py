@@ -0,0 +1,147 @@
+"""
+실행/채점 결과 저장소 (SQLite, WAL 모드).
+
+결과 JSON 전체를 매번 다시 쓰는 대신 레코드 하나를 row 하나로 저장한다.
+- put(): 레코드마다 바로 commit (프로세스가 죽어도 그 전까지의 결과는 남음)
+- has() / get(): PRIMARY KEY 조회라 resume 확인이 O(1)
+- 여러 프로세스가 같은 DB에 동시에 써도 됨 (WAL + busy timeout)
+- export_json(): 기존 스크립트들이 쓰던 JSON 모양 그대로 내보냄
+  (flat: {key: value}, nested: {key: {sub_key: value}})
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ResultStore:
+    def __init__(self, path, legacy_json=None, nested=False):
+        """
+        path: SQLite 파일 경로
+        legacy_json: 예전 실행이 남긴 결과 JSON. DB가 비어 있으면 한 번 가져와서 resume을 이어감
+        nested: True면 {key: {sub_key: value}} 모양으로 import/export
+        """
+        self.path = path
+        self.nested = nested
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT NOT NULL,"
+            " sub_key TEXT NOT NULL DEFAULT '',"
+            " value TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (key, sub_key))"
+        )
+        if legacy_json and len(self) == 0 and os.path.exists(legacy_json):
+            self.import_json(legacy_json)
+
+    # ------------------------------------------------------------------
+    # 쓰기 / 읽기
+    # ------------------------------------------------------------------
+    def put(self, key, value, sub_key=""):
+        """레코드 하나를 저장 (같은 key/sub_key가 있으면 덮어씀)"""
+        data = json.dumps(value, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, sub_key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (str(key), str(sub_key), data, time.time()),
+            )
+
+    def put_many(self, records):
+        """[(key, value)] 또는 [(key, sub_key, value)]를 한 트랜잭션으로 저장"""
+        rows = []
+        now = time.time()
+        for record in records:
+            key, sub_key, value = record if len(record) == 3 else (record[0], "", record[1])
+            rows.append((str(key), str(sub_key), json.dumps(value, default=str), now))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO results (key, sub_key, value, updated_at) VALUES (?, ?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, key, sub_key="", default=None):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM results WHERE key = ? AND sub_key = ?", (str(key), str(sub_key))
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def has(self, key, sub_key=""):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM results WHERE key = ? AND sub_key = ?", (str(key), str(sub_key))
+            ).fetchone()
+        return row is not None
+
+    def __contains__(self, key):
+        return self.has(key)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def items(self):
+        """flat 저장소의 (key, value) 목록 (저장 순서)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM results WHERE sub_key = '' ORDER BY rowid").fetchall()
+        return [(k, json.loads(v)) for k, v in rows]
+
+    def values(self):
+        return [v for _, v in self.items()]
+
+    def to_dict(self):
+        """기존 JSON과 같은 모양의 dict"""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, sub_key, value FROM results ORDER BY rowid").fetchall()
+        if not self.nested:
+            return {k: json.loads(v) for k, s, v in rows if s == ""}
+        result = {}
+        for k, s, v in rows:
+            result.setdefault(k, {})[s] = json.loads(v)
+        return result
+
+    # ------------------------------------------------------------------
+    # JSON 호환
+    # ------------------------------------------------------------------
+    def export_json(self, path, indent=2):
+        """현재 결과를 기존 JSON 모양으로 내보냄 (임시 파일에 쓰고 교체)"""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f, indent=indent, default=str)
+        os.replace(tmp, path)
+        return path
+
+    def import_json(self, path):
+        with open(path) as f:
+            data = json.load(f)
+        if self.nested:
+            records = [(k, s, v) for k, sub in data.items() for s, v in sub.items()]
+        else:
+            records = list(data.items())
+        self.put_many(records)
+        logger.info(f"📥 Imported {len(records)} records from {path} into {self.path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
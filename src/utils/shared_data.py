@@ -0,0 +1,216 @@
+"""
+Main / Tester 커널이 같은 데이터 파일을 공유하는 캐시 레이어.
+
+작업 폴더의 CSV/Excel 파일을 에이전트 프로세스에서 한 번만 파싱해
+Arrow IPC(압축 없음) 파일로 SHARED_DATA_DIR에 저장한다.
+커널은 이 파일을 memory map으로 열기 때문에 파싱을 다시 하지 않고, 여러 커널이
+OS page cache의 같은 페이지를 공유한다 (Tester 폴더로 파일을 복사할 필요도 없음).
+돌려주는 DataFrame은 매번 새로 만든 쓰기 가능한 사본이다 (pd.read_csv 결과처럼 in-place 수정 가능).
+
+- 캐시 키는 (실제 경로, mtime, size) 이므로 원본이 바뀌면 자동으로 다시 파싱한다.
+- 커널 안에서는 pd.read_csv(path) / pd.read_excel(path[, sheet_name]) 처럼 경로만 넘긴 호출을
+  캐시에서 바로 돌려준다. 다른 옵션이 붙은 호출은 원래 함수로 그대로 읽는다.
+- pyarrow가 없거나 Arrow로 변환할 수 없는 DataFrame(혼합 타입 object 컬럼 등)은
+  pickle로 저장한다 (zero-copy는 아니지만 파싱은 한 번만).
+"""
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+from ..config import SHARED_DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+SHAREABLE_EXTS = (".csv", ".xlsx", ".xlsm", ".xls")
+
+# 커널 안에 공유 데이터 로더를 설치하는 코드.
+# %reset -f 에 지워지지 않도록 상태는 sys 모듈에, load_shared는 builtins에 둔다.
+SHARED_LOADER_CODE = """
+def _toolgen_share(manifest):
+    import sys, os, builtins, functools
+    state = getattr(sys, '_toolgen_shared', None)
+    if state is None:
+        state = sys._toolgen_shared = {'manifest': {}, 'tables': {}, 'hits': 0}
+    state['manifest'].update(manifest)
+
+    def _frame(path):
+        if path.endswith('.arrow'):
+            table = state['tables'].get(path)
+            if table is None:
+                import pyarrow.feather as feather
+                table = state['tables'][path] = feather.read_table(path, memory_map=True)
+            # split_blocks / zero-copy 변환은 memory map을 그대로 가리키는 읽기 전용 배열을 만들어
+            # df.loc[...] = ... 같은 in-place 수정이 실패함 -> 기본 변환(block 통합)으로 사본을 만듦
+            return table.to_pandas()
+        import pandas as pd
+        return pd.read_pickle(path)
+
+    def load_shared(path, sheet_name=0, kind=None):
+        \"\"\"공유 캐시에 있는 파일이면 DataFrame(sheet_name=None이면 dict)을, 아니면 None을 반환\"\"\"
+        try:
+            real = os.path.realpath(os.fspath(path))
+            entry = state['manifest'].get(real)
+            if entry is None or (kind and entry['kind'] != kind):
+                return None
+            st = os.stat(real)
+        except (TypeError, OSError):
+            return None
+        if st.st_mtime_ns != entry['mtime_ns'] or st.st_size != entry['size']:
+            return None
+        sheets, tables = entry['sheets'], entry['tables']
+        if entry['kind'] == 'csv':
+            idx = 0
+        elif sheet_name is None:
+            state['hits'] += 1
+            return {s: _frame(t) for s, t in zip(sheets, tables)}
+        elif isinstance(sheet_name, int) and not isinstance(sheet_name, bool) and -len(tables) <= sheet_name < len(tables):
+            idx = sheet_name
+        elif isinstance(sheet_name, str) and sheet_name in sheets:
+            idx = sheets.index(sheet_name)
+        else:
+            return None
+        state['hits'] += 1
+        return _frame(tables[idx])
+
+    builtins.load_shared = load_shared
+
+    try:
+        import pandas as pd
+    except ImportError:
+        return
+    if getattr(pd.read_csv, '_toolgen_shared', False):
+        return
+    orig_csv, orig_excel = pd.read_csv, pd.read_excel
+
+    @functools.wraps(orig_csv)
+    def read_csv(filepath_or_buffer, *args, **kwargs):
+        if not args and not kwargs:
+            df = load_shared(filepath_or_buffer, kind='csv')
+            if df is not None:
+                return df
+        return orig_csv(filepath_or_buffer, *args, **kwargs)
+
+    @functools.wraps(orig_excel)
+    def read_excel(io, *args, **kwargs):
+        if not args and set(kwargs) <= {'sheet_name'}:
+            df = load_shared(io, kwargs.get('sheet_name', 0), kind='excel')
+            if df is not None:
+                return df
+        return orig_excel(io, *args, **kwargs)
+
+    read_csv._toolgen_shared = read_excel._toolgen_shared = True
+    pd.read_csv, pd.read_excel = read_csv, read_excel
+"""
+
+
+class SharedDataStore:
+    """데이터 파일을 한 번만 파싱해 캐시하고, 커널에 설치할 manifest를 관리"""
+
+    def __init__(self, cache_dir=SHARED_DATA_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # 실제 경로 -> {'kind', 'mtime_ns', 'size', 'sheets', 'tables'}
+        self.manifest = {}
+        self.stats = {"parsed": 0, "cache_hits": 0, "failed": 0}
+
+    def publish(self, path):
+        """파일 하나를 캐시에 올림 (이미 같은 버전이 있으면 재사용). 실패하면 None."""
+        real = os.path.realpath(path)
+        try:
+            st = os.stat(real)
+        except OSError:
+            return None
+        key = hashlib.sha1(f"{real}|{st.st_mtime_ns}|{st.st_size}".encode()).hexdigest()[:20]
+        meta_path = os.path.join(self.cache_dir, f"{key}.json")
+
+        entry = None
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path) as f:
+                    entry = json.load(f)
+                if not all(os.path.exists(t) for t in entry["tables"]):
+                    entry = None
+            except (OSError, ValueError, KeyError):
+                entry = None
+
+        if entry is not None:
+            self.stats["cache_hits"] += 1
+        else:
+            try:
+                entry = self._parse(real, key, st)
+            except Exception as e:
+                logger.warning(f"⚠️ Shared data: failed to parse {os.path.basename(real)}: {e}")
+                self.stats["failed"] += 1
+                return None
+            self._atomic_write(meta_path, json.dumps(entry).encode())
+            self.stats["parsed"] += 1
+            logger.info(f"📦 Shared data: parsed {os.path.basename(real)} ({len(entry['tables'])} table(s))")
+
+        self.manifest[real] = entry
+        return entry
+
+    def publish_dir(self, directory):
+        """폴더 최상위의 CSV/Excel 파일을 모두 캐시에 올림"""
+        if not os.path.isdir(directory):
+            return
+        for fname in sorted(os.listdir(directory)):
+            path = os.path.join(directory, fname)
+            if fname.lower().endswith(SHAREABLE_EXTS) and os.path.isfile(path):
+                self.publish(path)
+
+    def loader_code(self):
+        """커널에서 실행할 로더 설치 코드 (현재 manifest 포함)"""
+        manifest = json.dumps(self.manifest)
+        return SHARED_LOADER_CODE + f"_toolgen_share(__import__('json').loads({manifest!r}))\ndel _toolgen_share\n"
+
+    def report(self):
+        return dict(self.stats, files=len(self.manifest))
+
+    # ------------------------------------------------------------------
+    def _parse(self, real, key, st):
+        import pandas as pd
+
+        if real.lower().endswith(".csv"):
+            kind = "csv"
+            frames = {None: pd.read_csv(real)}
+        else:
+            kind = "excel"
+            frames = pd.read_excel(real, sheet_name=None)
+
+        sheets, tables = [], []
+        for i, (sheet, df) in enumerate(frames.items()):
+            sheets.append(sheet)
+            tables.append(self._write_frame(df, f"{key}_{i}"))
+        return {"kind": kind, "mtime_ns": st.st_mtime_ns, "size": st.st_size, "sheets": sheets, "tables": tables}
+
+    def _write_frame(self, df, stem):
+        try:
+            import pyarrow.feather as feather
+            path = os.path.join(self.cache_dir, f"{stem}.arrow")
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            os.close(fd)
+            try:
+                feather.write_feather(df, tmp, compression="uncompressed")
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            return path
+        except Exception as e:
+            logger.debug(f"Arrow export failed for {stem} ({e}), falling back to pickle")
+
+        path = os.path.join(self.cache_dir, f"{stem}.pkl")
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        df.to_pickle(tmp)
+        os.replace(tmp, path)
+        return path
+
+    def _atomic_write(self, path, data):
+        # 여러 프로세스가 같은 파일을 동시에 올려도 반쯤 쓰인 파일을 읽지 않도록 rename으로 교체
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
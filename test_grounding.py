@@ -2,10 +2,13 @@ import os
 import json
 import time
 from src.agent.graph import build_graph
+from src.utils.graph_runtime import sandbox_config
 from src.logger import get_logger
 from dsbench_loader import DSBenchLoader
 from langfuse.langchain import CallbackHandler
 from src.utils.jupyter_sandbox import AgentSandbox
+from src.utils.kernel_pool import KernelPool
+from src.config import KERNEL_POOL_SIZE
 
 logger = get_logger("GroundingTest")
 
@@ -20,6 +23,9 @@ def main():
     logger.info(f"Testing {total} DSBench tasks with Grounding Node")
 
     results = {}
+    pool = KernelPool(size=KERNEL_POOL_SIZE)
+    # 그래프는 한 번만 compile (샌드박스는 invoke config로 전달)
+    app = build_graph()
     total_start = time.time()
 
     for i in range(total):
@@ -31,8 +37,7 @@ def main():
         task_start = time.time()
 
         try:
-            with AgentSandbox(work_dir=target_dir) as sandbox:
-                app = build_graph(sandbox)
+            with AgentSandbox(work_dir=target_dir, pool=pool) as sandbox:
                 inputs = {
                     "problem": task_data['prompt'],
                     "work_dir": target_dir,
@@ -48,7 +53,7 @@ def main():
                     "error": None
                 }
 
-                result = app.invoke(inputs, config={"recursion_limit": 100, "callbacks": [langfuse_handler]})
+                result = app.invoke(inputs, config=sandbox_config(sandbox, recursion_limit=100, callbacks=[langfuse_handler]))
 
                 elapsed = time.time() - task_start
                 final = result.get("final_answer", "")
@@ -79,6 +84,8 @@ def main():
     times = [v["time_s"] for v in results.values() if "time_s" in v]
     errors = sum(1 for v in results.values() if "error" in v)
     logger.info(f"  Avg time: {sum(times)/len(times):.0f}s | Errors: {errors}/{total}")
+    logger.info(f"  KernelPool: {pool.report()}")
+    pool.shutdown()
     
     for tid, r in results.items():
         status = "❌" if "error" in r else "✅"